@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Dict, Any
 
@@ -66,3 +66,25 @@ async def get_optional_user(
         return None
 
     return payload
+
+
+async def get_stream_user(
+    access_token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+) -> Dict[str, Any]:
+    """
+    Dependency for streaming endpoints (Server-Sent Events).
+    Browser EventSource cannot send headers, so the access token may also be
+    passed as the access_token query parameter.
+    """
+    token = credentials.credentials if credentials else access_token
+    payload = decode_token(token) if token else None
+
+    if payload is None or payload.get("type") != "access":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return payload
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from typing import Callable, List
 import sqlite3
 from pathlib import Path
 from datetime import datetime
@@ -31,6 +31,16 @@ def get_db():
     return conn
 
 
+# Called with (teacher_id, student_id) after a roster change is committed
+# (the app uses it to drop cached data derived from the roster)
+roster_change_listeners: List[Callable[[int, int], None]] = []
+
+
+def notify_roster_change(teacher_id: int, student_id: int) -> None:
+    for listener in roster_change_listeners:
+        listener(teacher_id, student_id)
+
+
 # ============ AUTH ENDPOINTS ============
 
 @router.post("/signup", response_model=AuthResponse)
@@ -470,6 +480,7 @@ async def add_student(
     )
     conn.commit()
     conn.close()
+    notify_roster_change(teacher_id, student_user_id)
 
     return MessageResponse(
         message=f"Student {student['first_name']} {student['last_name']} added successfully"
@@ -536,6 +547,7 @@ async def remove_student(
 
     conn.commit()
     conn.close()
+    notify_roster_change(teacher_id, student_user_id)
 
     return MessageResponse(message="Student removed from roster")
 
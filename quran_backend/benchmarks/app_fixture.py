@@ -0,0 +1,74 @@
+"""
+Shared setup for the benchmarks and tests: point the app at a throwaway
+app.db and create users with access tokens. Run benchmarks from
+quran_backend, e.g. `python benchmarks/sse_fanout.py`.
+
+Without a seeded quran.db (see seed.js), a stand-in with the same tables is
+built from the page files; it has every surah and ayah the app navigates by.
+"""
+
+import json
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import main  # noqa: E402
+import auth.routes  # noqa: E402
+from auth.utils import create_access_token  # noqa: E402
+
+
+def build_quran_db(path: Path) -> None:
+    """surahs and ayahs tables (placeholder names, page-file text) for running without seed.js"""
+    ayahs = {}
+    for page_file in sorted(main.QURAN_PAGES_DIR.glob("*.json")):
+        for word in json.loads(page_file.read_text(encoding="utf-8")):
+            ayahs.setdefault((word["s"], word["a"]), []).append(word["t"])
+    ayah_counts = {}
+    for surah, ayah in ayahs:
+        ayah_counts[surah] = max(ayah_counts.get(surah, 0), ayah)
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE surahs (number INTEGER PRIMARY KEY, name TEXT NOT NULL, englishName TEXT NOT NULL,
+                             englishNameTranslation TEXT, numberOfAyahs INTEGER NOT NULL, revelationType TEXT);
+        CREATE TABLE ayahs (id INTEGER PRIMARY KEY AUTOINCREMENT, surahNumber INTEGER NOT NULL,
+                            ayahNumber INTEGER NOT NULL, text TEXT NOT NULL, UNIQUE(surahNumber, ayahNumber));
+    """)
+    conn.executemany("INSERT INTO surahs VALUES (?, ?, ?, '', ?, '')",
+                     [(surah, f"Surah {surah}", f"Surah {surah}", count) for surah, count in ayah_counts.items()])
+    conn.executemany("INSERT INTO ayahs (surahNumber, ayahNumber, text) VALUES (?, ?, ?)",
+                     [(surah, ayah, " ".join(words)) for (surah, ayah), words in sorted(ayahs.items())])
+    conn.commit()
+    conn.close()
+
+
+def use_temp_app_db(directory: Optional[Path] = None) -> sqlite3.Connection:
+    """Create the schema in a fresh app.db (in a new temp dir by default) and return a connection to it"""
+    directory = directory or Path(tempfile.mkdtemp())
+    if not main.QURAN_DB.exists():
+        main.QURAN_DB = Path(tempfile.mkdtemp()) / "quran.db"
+        build_quran_db(main.QURAN_DB)
+    path = directory / "app.db"
+    main.APP_DB = path
+    auth.routes.APP_DB = path
+    main.init_app_db()
+    main.clear_student_caches()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def create_user(conn: sqlite3.Connection, user_id: int, teacher: bool = False) -> dict:
+    """Insert a user and return Authorization headers for them"""
+    conn.execute("""
+        INSERT INTO users (id, student_id, username, email, password_hash, first_name, last_name, is_verified)
+        VALUES (?, ?, ?, ?, 'x', 'Bench', 'User', ?)
+    """, (user_id, f"STU-{user_id}", f"user{user_id}", f"user{user_id}@bench.test", 1 if teacher else 0))
+    conn.commit()
+    token = create_access_token({"sub": str(user_id), "is_verified": teacher})
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark for GET /api/mistakes/with-occurrences on a large mistake history.
+
+Seeds one student with MISTAKES mistakes spread over CLASSES classes (a few
+occurrences each, some pointing at a deleted class) next to other students'
+histories, and times the endpoint function (no HTTP or JSON encoding) against
+the one-query-per-mistake loop it replaced, checking both return the same
+mistakes and occurrences.
+
+    python benchmarks/mistake_history.py --mistakes 20000 --classes 600
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app_fixture import create_user, main, use_temp_app_db
+
+TEACHER_ID = 1
+STUDENT_ID = 2
+
+
+def seed(conn, mistakes: int, classes: int) -> None:
+    rng = random.Random(7)
+    first_day = date(2020, 1, 1)
+    conn.executemany(
+        "INSERT INTO classes (id, date, day, teacher_id, is_published, class_type) VALUES (?, ?, 'Monday', ?, 1, 'regular')",
+        [(i, (first_day + timedelta(days=i)).isoformat(), TEACHER_ID) for i in range(1, classes + 1)]
+    )
+    conn.execute("INSERT INTO teacher_student_relationships (teacher_id, student_id) VALUES (?, ?)",
+                 (TEACHER_ID, STUDENT_ID))
+    words = set()
+    while len(words) < mistakes:
+        words.add((rng.randint(1, 114), rng.randint(1, 50), rng.randint(0, 20)))
+    conn.executemany("""
+        INSERT INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, error_count)
+        VALUES (?, ?, ?, ?, 'word', 1)
+    """, [(STUDENT_ID, *word) for word in sorted(words)])
+    cursor = conn.execute("SELECT id FROM mistakes WHERE student_id = ?", (STUDENT_ID,))
+    occurrences = [
+        (mistake_id, class_id)
+        for (mistake_id,) in cursor.fetchall()
+        for class_id in rng.sample(range(1, classes + 1), rng.randint(1, 6))
+    ]
+    conn.executemany("INSERT INTO mistake_occurrences (mistake_id, class_id) VALUES (?, ?)", occurrences)
+    # delete_class leaves occurrences behind; they must not come back with empty class info
+    conn.execute("DELETE FROM classes WHERE id = ?", (classes,))
+    conn.commit()
+    # Other students' histories, so the queries have to find this student's rows
+    for other in range(STUDENT_ID + 1, STUDENT_ID + 21):
+        conn.executemany("""
+            INSERT OR IGNORE INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, error_count)
+            VALUES (?, ?, ?, ?, 'word', 1)
+        """, [(other, rng.randint(1, 114), rng.randint(1, 50), rng.randint(0, 20)) for _ in range(mistakes // 4)])
+    conn.execute("""
+        INSERT INTO mistake_occurrences (mistake_id, class_id)
+        SELECT id, 1 + id % ? FROM mistakes WHERE student_id != ?
+    """, (classes - 1, STUDENT_ID))
+    conn.commit()
+    print(f"{mistakes} mistakes, {len(occurrences)} occurrences over {classes} classes")
+
+
+def per_mistake_queries(student_id: int) -> list:
+    """The loop the endpoint used to run: the mistakes, then one occurrence query per mistake"""
+    conn = main.get_app_db()
+    cursor = conn.execute(
+        "SELECT * FROM mistakes WHERE student_id = ? ORDER BY surah_number, ayah_number, word_index", (student_id,)
+    )
+    mistakes = [dict(row) for row in cursor.fetchall()]
+    for mistake in mistakes:
+        cursor = conn.execute("""
+            SELECT mo.class_id, mo.occurred_at, c.date, c.day
+            FROM mistake_occurrences mo
+            JOIN classes c ON mo.class_id = c.id
+            WHERE mo.mistake_id = ?
+            ORDER BY c.date DESC
+        """, (mistake["id"],))
+        mistake["occurrences"] = [
+            {"class_id": row[0], "occurred_at": row[1], "class_date": row[2], "class_day": row[3]}
+            for row in cursor.fetchall()
+        ]
+    conn.close()
+    return mistakes
+
+
+def best_of(runs: int, work):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = work()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mistakes", type=int, default=20000)
+    parser.add_argument("--classes", type=int, default=600)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = use_temp_app_db()
+    create_user(conn, TEACHER_ID, teacher=True)
+    create_user(conn, STUDENT_ID)
+    seed(conn, args.mistakes, args.classes)
+    conn.close()
+
+    teacher = {"sub": str(TEACHER_ID), "is_verified": True}
+
+    def fetch(occurrence_limit=None):
+        return main.get_mistakes_with_occurrences(
+            student_id=STUDENT_ID, occurrence_limit=occurrence_limit, current_user=teacher
+        )["data"]
+
+    baseline_time, baseline = best_of(args.runs, lambda: per_mistake_queries(STUDENT_ID))
+    joined_time, joined = best_of(args.runs, fetch)
+    limited_time, limited = best_of(args.runs, lambda: fetch(3))
+
+    def comparable(mistakes):
+        return [(m["id"], sorted((o["class_id"], o["class_date"], o["class_day"]) for o in m["occurrences"]))
+                for m in mistakes]
+
+    assert comparable(joined) == comparable(baseline), "endpoint differs from per-mistake queries"
+    assert all(o["class_date"] is not None for m in joined for o in m["occurrences"])
+    assert all(len(m["occurrences"]) <= 3 for m in limited)
+
+    print(f"per-mistake queries (baseline)     {baseline_time * 1000:8.1f} ms   {len(baseline) + 1} queries")
+    print(f"endpoint                           {joined_time * 1000:8.1f} ms   2 queries")
+    print(f"endpoint, occurrence_limit=3       {limited_time * 1000:8.1f} ms   2 queries")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Load test for live-event fan-out: hundreds of open /api/events streams on one
+worker, each receiving the class.published event a teacher triggers.
+
+Every student in one class holds an SSE connection; each round the teacher
+toggles the class's visibility and we time how long each stream takes to see
+the event, measured from the moment the PATCH is sent.
+
+    python benchmarks/sse_fanout.py --connections 500 --rounds 20
+
+Needs httpx (not in requirements.txt). Raise the open-file limit first
+(`ulimit -n 4096`) for more than a few hundred connections.
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from app_fixture import create_user, main, use_temp_app_db
+
+TEACHER_ID = 1
+
+
+def seed(connections: int):
+    """A teacher and one class holding `connections` students; returns (class_id, teacher headers, student headers)"""
+    conn = use_temp_app_db()
+    teacher = create_user(conn, TEACHER_ID, teacher=True)
+    students = [create_user(conn, TEACHER_ID + 1 + i) for i in range(connections)]
+    cursor = conn.execute(
+        "INSERT INTO classes (date, day, teacher_id, is_published, class_type) VALUES ('2024-01-01', 'Monday', ?, 0, 'regular')",
+        (TEACHER_ID,)
+    )
+    class_id = cursor.lastrowid
+    student_ids = [TEACHER_ID + 1 + i for i in range(connections)]
+    conn.executemany("INSERT INTO class_students (class_id, student_id) VALUES (?, ?)",
+                     [(class_id, student_id) for student_id in student_ids])
+    conn.executemany("INSERT INTO teacher_student_relationships (teacher_id, student_id) VALUES (?, ?)",
+                     [(TEACHER_ID, student_id) for student_id in student_ids])
+    conn.commit()
+    conn.close()
+    return class_id, teacher, students
+
+
+def start_server() -> tuple:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("server failed to start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def run(base_url: str, class_id: int, teacher: dict, students: list, rounds: int) -> list:
+    ready = 0
+    all_ready = asyncio.Event()
+    round_start = 0.0
+    received = []
+    round_done = asyncio.Event()
+    latencies = []
+
+    async def listen(client: httpx.AsyncClient, headers: dict):
+        nonlocal ready
+        async with client.stream("GET", f"{base_url}/api/events", headers=headers) as response:
+            async for line in response.aiter_lines():
+                if line == "event: ready":
+                    ready += 1
+                    if ready == len(students):
+                        all_ready.set()
+                elif line == "event: class.published":
+                    received.append(time.perf_counter() - round_start)
+                    if len(received) == len(students):
+                        round_done.set()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        listeners = [asyncio.create_task(listen(client, headers)) for headers in students]
+        await asyncio.wait_for(all_ready.wait(), 60)
+        async with httpx.AsyncClient() as teacher_client:
+            for i in range(rounds):
+                received.clear()
+                round_done.clear()
+                round_start = time.perf_counter()
+                response = await teacher_client.patch(
+                    f"{base_url}/api/classes/{class_id}/publish", json={"is_published": i % 2 == 0}, headers=teacher
+                )
+                response.raise_for_status()
+                await asyncio.wait_for(round_done.wait(), 60)
+                latencies.append(sorted(received))
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+    return latencies
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    class_id, teacher, students = seed(args.connections)
+    server, thread, base_url = start_server()
+    try:
+        started = time.perf_counter()
+        latencies = asyncio.run(run(base_url, class_id, teacher, students, args.rounds))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+    every = sorted(value for round_latencies in latencies for value in round_latencies)
+    last = [round_latencies[-1] for round_latencies in latencies]
+    print(f"{args.connections} connections, {args.rounds} rounds, {len(every)} deliveries in {elapsed:.1f} s")
+    print(f"delivery latency   p50 {percentile(every, 0.5) * 1000:7.1f} ms   "
+          f"p95 {percentile(every, 0.95) * 1000:7.1f} ms   max {every[-1] * 1000:7.1f} ms")
+    print(f"last stream served median {statistics.median(last) * 1000:7.1f} ms   max {max(last) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,94 @@
+"""
+Per-student memorization coverage bitsets.
+
+Each assignment a student received is turned into a Python int bitset over
+the 6,236 ayah ordinals (see quran_index.py). Masks are folded per portion
+type and class date, and each type also keeps the running OR up to every
+date. Coverage for any portion type and date window is then one lookup (no
+start date) or an OR over the dates in the window, and percentages, juz
+breakdowns and union/intersection queries are a handful of big-int
+operations instead of range merging over assignment rows.
+
+Entries are built lazily from the database on first read, extended (as a
+copy) when a class is created, and dropped when a student's assignments change
+in any other way. The most recently used MAX_COVERAGE_STUDENTS are kept.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from student_cache import StudentCache
+
+PORTION_TYPES = ("hifz", "sabqi", "revision")
+MAX_COVERAGE_STUDENTS = 256
+
+
+class StudentCoverage:
+    """One student's coverage masks per portion type: sorted class dates, the OR of
+    that date's portions, and the running OR up to and including each date"""
+
+    def __init__(self):
+        self.dates: Dict[str, List[str]] = {}
+        self.masks: Dict[str, List[int]] = {}
+        self.running: Dict[str, List[int]] = {}
+
+    def copy(self) -> "StudentCoverage":
+        coverage = StudentCoverage()
+        coverage.dates = {portion_type: list(dates) for portion_type, dates in self.dates.items()}
+        coverage.masks = {portion_type: list(masks) for portion_type, masks in self.masks.items()}
+        coverage.running = {portion_type: list(running) for portion_type, running in self.running.items()}
+        return coverage
+
+    def add(self, class_date: str, portion_type: str, mask: int) -> None:
+        dates = self.dates.setdefault(portion_type, [])
+        masks = self.masks.setdefault(portion_type, [])
+        running = self.running.setdefault(portion_type, [])
+        i = bisect_left(dates, class_date)
+        if i < len(dates) and dates[i] == class_date:
+            masks[i] |= mask
+        else:
+            dates.insert(i, class_date)
+            masks.insert(i, mask)
+            running.insert(i, 0)
+        # Dates arrive in order when loading, so this usually touches one entry
+        for j in range(i, len(dates)):
+            running[j] = (running[j - 1] if j else 0) | masks[j]
+
+    def union(self, portion_types: Iterable[str] = PORTION_TYPES,
+              since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """OR of the masks for the given types whose class date is within [since, until]"""
+        mask = 0
+        for portion_type in set(portion_types):
+            dates = self.dates.get(portion_type)
+            if not dates:
+                continue
+            end = bisect_right(dates, until) if until else len(dates)
+            start = bisect_left(dates, since) if since else 0
+            if end <= start:
+                continue
+            if start == 0:
+                mask |= self.running[portion_type][end - 1]
+            else:
+                for date_mask in self.masks[portion_type][start:end]:
+                    mask |= date_mask
+        return mask
+
+
+class CoverageCache(StudentCache[StudentCoverage]):
+    """student_id -> StudentCoverage, extended on class creation"""
+
+    def __init__(self, max_entries: int = MAX_COVERAGE_STUDENTS):
+        super().__init__(max_entries)
+
+    def add(self, student_id: int, class_date: str, portion_type: str, mask: int) -> None:
+        """Extend a loaded student's coverage (unloaded students build on next read).
+
+        The extended copy replaces the cached one, so readers never see a half-applied add.
+        """
+        with self._lock:
+            self._bump(student_id)
+            coverage = self._students.get(student_id)
+            if coverage is not None:
+                coverage = coverage.copy()
+                coverage.add(class_date, portion_type, mask)
+                self._students[student_id] = coverage
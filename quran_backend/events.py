@@ -0,0 +1,91 @@
+"""
+In-process pub/sub for live updates over Server-Sent Events.
+
+Each open /api/events stream is a Subscription: an asyncio queue owned by the
+event loop that serves the stream, registered under the user's id. Endpoints
+run in the threadpool and publish to user ids. publish() encodes the SSE frame
+once and hands it to every subscriber's loop with call_soon_threadsafe, so it
+never blocks on slow clients. A subscriber whose queue is full misses events
+and is told to refetch (see Subscription.overflowed).
+
+Events only reach clients connected to this worker process.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Dict, Iterable, Set
+
+QUEUE_SIZE = 256
+
+
+class Subscription:
+    """One open event stream for one user"""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, frame: str) -> None:
+        """Runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBroker:
+    """user_id -> open subscriptions; thread-safe publish"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Register a stream; must be called from the loop that will read it"""
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self) -> bool:
+        """Lets publishers skip building audiences when nobody is listening"""
+        return bool(self._subscribers)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def publish(self, user_ids: Iterable[int], event_type: str, data: dict) -> None:
+        """Send an event to every open stream of the given users (duplicates ignored)"""
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        if not targets:
+            return
+
+        frame = f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, frame)
+            except RuntimeError:
+                # Loop already closed (server shutting down)
+                self.unsubscribe(subscription)
+
+
+def format_comment(text: str) -> str:
+    """SSE comment line (ignored by EventSource, keeps proxies from timing out)"""
+    return f": {text}\n\n"
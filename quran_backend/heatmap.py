@@ -0,0 +1,169 @@
+"""
+Per-student mistake heatmaps over the Mushaf.
+
+A heatmap is three fixed-length count vectors (604 pages, 30 juz, 114 surahs)
+plus the per-word counts, built from one grouped query over a student's
+mistakes. They are cached per student (see student_cache.py) and dropped
+whenever that student's mistakes change, so the heatmap endpoint returns the
+arrays without touching the rows.
+
+A roster heatmap stacks the cached student heatmaps into a page x student
+matrix and ranks the pages, ayahs and words most students stumble on. The
+most recently used MAX_ROSTER_HEATMAPS of them are kept per teacher.
+"""
+
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Tuple
+
+from quran_index import QuranIndex, TOTAL_PAGES
+
+
+class MistakeHeatmap:
+    """Error counts and mistaken-word counts per page, juz and surah (index 0 = first)"""
+
+    def __init__(self):
+        self.page_errors = [0] * TOTAL_PAGES
+        self.page_words = [0] * TOTAL_PAGES
+        self.juz_errors = [0] * 30
+        self.surah_errors = [0] * 114
+        self.words = {}  # (surah, ayah, word_index) -> (errors, word_text)
+        self.total_errors = 0
+        self.total_words = 0
+
+    def add_word(self, index: QuranIndex, surah: int, ayah: int, word_index: int, errors: int, word_text: str) -> None:
+        self.words[(surah, ayah, word_index)] = (errors, word_text)
+        page = index.word_page(surah, ayah, word_index)
+        self.page_errors[page - 1] += errors
+        self.page_words[page - 1] += 1
+        self.juz_errors[index.juz_of(surah, ayah) - 1] += errors
+        self.surah_errors[surah - 1] += errors
+        self.total_errors += errors
+        self.total_words += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "pages": self.page_errors,
+            "page_words": self.page_words,
+            "juz": self.juz_errors,
+            "surahs": self.surah_errors,
+            "max_page": max(self.page_errors),
+            "total_errors": self.total_errors,
+            "total_words": self.total_words
+        }
+
+
+MAX_ROSTER_HEATMAPS = 256
+
+
+def build_heatmap(index: QuranIndex, word_rows) -> MistakeHeatmap:
+    """Heatmap from (surah, ayah, word_index, errors, word_text) rows, one per mistaken
+    word. Rows outside the Mushaf (bad positions from old clients) are skipped."""
+    heatmap = MistakeHeatmap()
+    for surah, ayah, word_index, errors, word_text in word_rows:
+        if index.word_id(surah, ayah, word_index) is None:
+            continue
+        heatmap.add_word(index, surah, ayah, word_index, errors or 0, word_text)
+    return heatmap
+
+
+class RosterHeatmap:
+    """Page x student matrix and common weak spots over a set of student heatmaps.
+
+    Built from the cached per-student heatmaps; `sources` keeps those exact
+    objects, so the aggregate stays valid until any student's heatmap is rebuilt.
+    """
+
+    def __init__(self, heatmaps: List[Tuple[int, MistakeHeatmap]]):
+        self.sources = heatmaps
+        self.student_ids = [student_id for student_id, _ in heatmaps]
+        self.matrix = [heatmap.page_errors for _, heatmap in heatmaps]
+
+        columns = list(zip(*self.matrix)) if self.matrix else [()] * TOTAL_PAGES
+        self.page_errors = [sum(column) for column in columns]
+        self.page_students = [sum(1 for errors in column if errors) for column in columns]
+
+        # Per word and per ayah: students who made the mistake, and total errors
+        self.word_students = Counter()
+        self.word_errors = Counter()
+        self.word_text = {}
+        self.ayah_students = Counter()
+        self.ayah_errors = Counter()
+        for _, heatmap in heatmaps:
+            student_ayahs = Counter()
+            for key, (errors, word_text) in heatmap.words.items():
+                self.word_students[key] += 1
+                self.word_errors[key] += errors
+                self.word_text.setdefault(key, word_text)
+                student_ayahs[key[:2]] += errors
+            self.ayah_students.update(student_ayahs.keys())
+            self.ayah_errors.update(student_ayahs)
+
+    def is_current(self, heatmaps: List[Tuple[int, MistakeHeatmap]]) -> bool:
+        return len(heatmaps) == len(self.sources) and all(
+            student_id == source_id and heatmap is source
+            for (student_id, heatmap), (source_id, source) in zip(heatmaps, self.sources)
+        )
+
+    def weak_spots(self, limit: int) -> dict:
+        """Top pages, ayahs and words by number of students, then total errors"""
+        weak_pages = heapq.nlargest(
+            limit, (page for page in range(TOTAL_PAGES) if self.page_students[page]),
+            key=lambda page: (self.page_students[page], self.page_errors[page])
+        )
+        weak_ayahs = heapq.nlargest(
+            limit, self.ayah_students, key=lambda key: (self.ayah_students[key], self.ayah_errors[key])
+        )
+        weak_words = heapq.nlargest(
+            limit, self.word_students, key=lambda key: (self.word_students[key], self.word_errors[key])
+        )
+        return {
+            "pages": [
+                {"page": page + 1, "students": self.page_students[page], "errors": self.page_errors[page]}
+                for page in weak_pages
+            ],
+            "ayahs": [
+                {"surah_number": surah, "ayah_number": ayah,
+                 "students": self.ayah_students[(surah, ayah)], "errors": self.ayah_errors[(surah, ayah)]}
+                for surah, ayah in weak_ayahs
+            ],
+            "words": [
+                {"surah_number": key[0], "ayah_number": key[1], "word_index": key[2],
+                 "word_text": self.word_text[key],
+                 "students": self.word_students[key], "errors": self.word_errors[key]}
+                for key in weak_words
+            ]
+        }
+
+
+class RosterHeatmapCache:
+    """teacher_id -> RosterHeatmap, reused while every student's heatmap is unchanged.
+
+    Least recently used teachers are dropped past MAX_ROSTER_HEATMAPS.
+    """
+
+    def __init__(self, max_entries: int = MAX_ROSTER_HEATMAPS):
+        self._rosters: "OrderedDict[int, RosterHeatmap]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get_or_build(self, teacher_id: int, heatmaps: List[Tuple[int, MistakeHeatmap]]) -> RosterHeatmap:
+        with self._lock:
+            roster = self._rosters.get(teacher_id)
+            if roster is not None:
+                self._rosters.move_to_end(teacher_id)
+        if roster is not None and roster.is_current(heatmaps):
+            return roster
+
+        roster = RosterHeatmap(heatmaps)
+        with self._lock:
+            self._rosters[teacher_id] = roster
+            self._rosters.move_to_end(teacher_id)
+            while len(self._rosters) > self._max_entries:
+                self._rosters.popitem(last=False)
+        return roster
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rosters.clear()
@@ -0,0 +1,165 @@
+"""
+Live state for tests being taken, and group-commit writes for mistake taps.
+
+A LiveTest holds what every mistake tap used to re-read from the database:
+the owning teacher, the student and who follows them, who may see the running
+score (the student only once the class is published), the scoring rubric,
+which questions are open, and the running deductions. It is loaded once and then kept current
+by the tap endpoints; any other change to the test (question start/end,
+completion, class deletion or publishing) just drops it and the next tap reloads it.
+
+Tap writes go through GroupCommitWriter: one background thread drains every
+queued write into a single transaction (one savepoint each) and commits once.
+A request only returns after the commit that contains its write, so nothing
+is acknowledged before it is durable, while concurrent taps share one fsync.
+
+Both are per process: run a single worker, or the sessions of one worker
+will not see question changes made through another.
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Set
+
+from scoring import ScoringRubric
+
+
+class LiveTest:
+    """In-memory state of one test; guard changes with `lock`"""
+
+    def __init__(self, test: dict, open_questions: Set[int], question_deductions: Dict[int, float], audience: list,
+                 score_audience: list, rubric: ScoringRubric):
+        self.test_id = test["id"]
+        self.class_id = test["class_id"]
+        self.student_id = test["student_id"]
+        self.teacher_id = test["teacher_id"]
+        self.open_questions = open_questions
+        self.question_deductions = question_deductions
+        self.audience = audience  # user ids that receive live events (student + teachers)
+        self.score_audience = score_audience  # user ids that receive running scores (teachers; student once published)
+        self.rubric = rubric
+        self.lock = threading.Lock()
+
+    @property
+    def total_deductions(self) -> float:
+        return sum(self.question_deductions.values())
+
+    def add_deduction(self, question_id: int, points: float) -> None:
+        self.question_deductions[question_id] = self.question_deductions.get(question_id, 0) + points
+
+
+class LiveTestRegistry:
+    """test_id -> LiveTest, loaded on first use.
+
+    Every drop bumps a generation, so a load that raced with a drop is
+    returned to its caller but never stored.
+    """
+
+    def __init__(self):
+        self._tests: Dict[int, LiveTest] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, test_id: int, load: Callable[[], Optional[LiveTest]]) -> Optional[LiveTest]:
+        with self._lock:
+            live = self._tests.get(test_id)
+            generation = self._generation
+        if live is not None:
+            return live
+        live = load()
+        if live is not None:
+            with self._lock:
+                if self._generation == generation:
+                    live = self._tests.setdefault(test_id, live)
+        return live
+
+    def drop(self, test_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._tests.pop(test_id, None)
+
+    def drop_class(self, class_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for test_id in [tid for tid, live in self._tests.items() if live.class_id == class_id]:
+                del self._tests[test_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._tests.clear()
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued work in batches.
+
+    run(work) queues `work(conn)`, blocks until the batch holding it has
+    committed, and returns its result (or raises its exception; a failing
+    work item is rolled back to its savepoint without affecting the batch).
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = 64):
+        self._connect = connect
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def run(self, work: Callable[[sqlite3.Connection], object]):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((work, future))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list) -> None:
+        outcomes = []
+        conn = None
+        try:
+            # A fresh connection per batch follows database swaps (restore)
+            conn = self._connect()
+            conn.isolation_level = None  # transactions are managed explicitly below
+            conn.execute("BEGIN IMMEDIATE")
+            for work, future in batch:
+                conn.execute("SAVEPOINT work")
+                try:
+                    result = work(conn)
+                    conn.execute("RELEASE work")
+                    outcomes.append((future, result, None))
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO work")
+                    conn.execute("RELEASE work")
+                    outcomes.append((future, None, exc))
+            conn.execute("COMMIT")
+        except Exception as exc:
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(future, None, exc) for _, future in batch]
+        finally:
+            if conn is not None:
+                conn.close()
+
+        for future, result, exc in outcomes:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
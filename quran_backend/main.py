@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 import sqlite3
 import shutil
+import asyncio
+import threading
 from pathlib import Path
-from datetime import date, datetime
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
 
 # Import auth routers and dependencies
-from auth.routes import router as auth_router, students_router, teachers_router
-from auth.dependencies import get_current_user, get_current_verified_user
+from auth.routes import router as auth_router, students_router, teachers_router, roster_change_listeners
+from auth.dependencies import get_current_user, get_current_verified_user, get_stream_user
+from quran_index import QuranIndex, build_quran_index
+from coverage import CoverageCache, StudentCoverage, PORTION_TYPES
+from heatmap import MistakeHeatmap, RosterHeatmapCache, build_heatmap
+from student_cache import StudentCache
+from events import EventBroker, format_comment
+from live_tests import GroupCommitWriter, LiveTest, LiveTestRegistry
+from scoring import ScoringRubric, STANDARD_RUBRIC
+from versioned_cache import DataVersions, VersionedCache
+from timeline import BUCKETS, MAX_BUCKETS, bucket_count, bucket_starts, default_start, dense_series
+from sync_stream import PAGE_SIZE, accepts_gzip, change_pages, ndjson_chunks, wants_ndjson
 
 app = FastAPI(title="Quran Logbook API")
 
@@ -39,12 +52,75 @@ def get_quran_db():
     return conn
 
 
-def get_app_db():
-    conn = sqlite3.connect(APP_DB)
+def get_app_db(check_same_thread: bool = True):
+    conn = sqlite3.connect(APP_DB, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def migrate_mistakes_unique_key(conn):
+    """Key mistakes by (student_id, surah, ayah, word_index, char_index) with NULL
+    char_index as its own value, so marking can be a single upsert.
+
+    Older databases had UNIQUE(surah, ayah, word_index, char_index) without the
+    student, which SQLite can only drop by rebuilding the table. Duplicate rows
+    are merged into the oldest one (counts summed, occurrences re-pointed) first.
+    Rows without a student (from before mistakes were per student) are merged
+    the same way: the unique index would accept them, since NULLs never collide
+    in it, but they are still one word marked twice.
+    """
+    cursor = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'mistakes'")
+    if "UNIQUE(surah_number, ayah_number, word_index, char_index)" in cursor.fetchone()["sql"]:
+        conn.executescript("""
+            CREATE TABLE mistakes_rebuilt (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                surah_number INTEGER NOT NULL,
+                ayah_number INTEGER NOT NULL,
+                word_index INTEGER NOT NULL,
+                word_text TEXT NOT NULL,
+                char_index INTEGER,
+                error_count INTEGER DEFAULT 1,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                device_id TEXT,
+                student_id INTEGER REFERENCES users(id)
+            );
+            INSERT INTO mistakes_rebuilt (id, surah_number, ayah_number, word_index, word_text, char_index,
+                                          error_count, updated_at, device_id, student_id)
+            SELECT id, surah_number, ayah_number, word_index, word_text, char_index,
+                   error_count, updated_at, device_id, student_id
+            FROM mistakes;
+            DROP TABLE mistakes;
+            ALTER TABLE mistakes_rebuilt RENAME TO mistakes;
+        """)
+
+    cursor = conn.execute("""
+        SELECT GROUP_CONCAT(id) AS ids, SUM(error_count) AS total
+        FROM mistakes
+        GROUP BY student_id, surah_number, ayah_number, word_index, COALESCE(char_index, -1)
+        HAVING COUNT(*) > 1
+    """)
+    for row in cursor.fetchall():
+        keep_id, *merged_ids = sorted(int(mistake_id) for mistake_id in row["ids"].split(","))
+        placeholders = ",".join("?" * len(merged_ids))
+        conn.execute("UPDATE mistakes SET error_count = ? WHERE id = ?", (row["total"], keep_id))
+        conn.execute(f"UPDATE mistake_occurrences SET mistake_id = ? WHERE mistake_id IN ({placeholders})", (keep_id, *merged_ids))
+        conn.execute(f"UPDATE test_mistakes SET mistake_id = ? WHERE mistake_id IN ({placeholders})", (keep_id, *merged_ids))
+        conn.execute(f"DELETE FROM mistakes WHERE id IN ({placeholders})", merged_ids)
+
+    conn.execute("DROP INDEX IF EXISTS idx_mistakes_student")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mistakes_student_word
+        ON mistakes(student_id, surah_number, ayah_number, word_index, COALESCE(char_index, -1))
+    """)
+
+    # Reverse lookup: which students have mistakes at a Quran position
+    conn.execute("DROP INDEX IF EXISTS idx_mistakes_surah")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mistakes_position ON mistakes(surah_number, ayah_number, word_index, student_id)"
+    )
+    conn.commit()
+
+
 # Initialize app.db tables on startup
 @app.on_event("startup")
 def init_app_db():
@@ -80,8 +156,7 @@ def init_app_db():
             char_index INTEGER,
             error_count INTEGER DEFAULT 1,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            device_id TEXT,
-            UNIQUE(surah_number, ayah_number, word_index, char_index)
+            device_id TEXT
         );
 
         CREATE TABLE IF NOT EXISTS mistake_occurrences (
@@ -93,7 +168,6 @@ def init_app_db():
             FOREIGN KEY (class_id) REFERENCES classes(id) ON DELETE CASCADE
         );
 
-        CREATE INDEX IF NOT EXISTS idx_mistakes_surah ON mistakes(surah_number);
         CREATE INDEX IF NOT EXISTS idx_occurrences_mistake ON mistake_occurrences(mistake_id);
         CREATE INDEX IF NOT EXISTS idx_occurrences_class ON mistake_occurrences(class_id);
         CREATE INDEX IF NOT EXISTS idx_assignments_class ON assignments(class_id);
@@ -287,6 +361,462 @@ def init_app_db():
     """)
     conn.commit()
 
+    # One mistake row per student and word/character (NULL char_index = whole word).
+    # Also serves reads of a student's mistakes in Mushaf order.
+    migrate_mistakes_unique_key(conn)
+
+    # Change tracking for mistakes: every insert/update takes the next value of a
+    # monotonic sequence (and refreshes updated_at), every delete leaves a
+    # tombstone, so clients can ask for changes since a cursor. Triggers cover
+    # every write path (endpoints, sync, admin) without touching them.
+    try:
+        conn.execute("ALTER TABLE mistakes ADD COLUMN change_seq INTEGER")
+        conn.commit()
+    except:
+        pass  # Column already exists
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS change_sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS mistake_tombstones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mistake_id INTEGER NOT NULL,
+            student_id INTEGER,
+            surah_number INTEGER NOT NULL,
+            ayah_number INTEGER NOT NULL,
+            word_index INTEGER NOT NULL,
+            char_index INTEGER,
+            change_seq INTEGER NOT NULL,
+            deleted_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        UPDATE mistakes SET change_seq = id WHERE change_seq IS NULL;
+        INSERT OR IGNORE INTO change_sequences (name, value)
+            SELECT 'mistakes', COALESCE(MAX(change_seq), 0) FROM mistakes;
+
+        CREATE INDEX IF NOT EXISTS idx_mistakes_change ON mistakes(student_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_mistake_tombstones_change ON mistake_tombstones(student_id, change_seq);
+
+        CREATE TRIGGER IF NOT EXISTS trg_mistakes_change_insert AFTER INSERT ON mistakes
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'mistakes';
+            UPDATE mistakes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'mistakes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mistakes_change_update AFTER UPDATE ON mistakes
+        WHEN NEW.change_seq IS OLD.change_seq
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'mistakes';
+            UPDATE mistakes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'mistakes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mistakes_change_delete AFTER DELETE ON mistakes
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'mistakes';
+            INSERT INTO mistake_tombstones (mistake_id, student_id, surah_number, ayah_number, word_index, char_index, change_seq)
+            VALUES (OLD.id, OLD.student_id, OLD.surah_number, OLD.ayah_number, OLD.word_index, OLD.char_index,
+                    (SELECT value FROM change_sequences WHERE name = 'mistakes'));
+        END;
+    """)
+    conn.commit()
+
+    # Change tracking for classes, same scheme as mistakes on its own sequence.
+    # Assignments sync inside their class, so any assignment write moves the class
+    # forward.
+    try:
+        conn.execute("ALTER TABLE classes ADD COLUMN change_seq INTEGER")
+        conn.commit()
+    except:
+        pass  # Column already exists
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS class_tombstones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            teacher_id INTEGER,
+            change_seq INTEGER NOT NULL,
+            deleted_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        UPDATE classes SET change_seq = id WHERE change_seq IS NULL;
+        INSERT OR IGNORE INTO change_sequences (name, value)
+            SELECT 'classes', COALESCE(MAX(change_seq), 0) FROM classes;
+
+        CREATE TRIGGER IF NOT EXISTS trg_classes_change_insert AFTER INSERT ON classes
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_classes_change_update AFTER UPDATE ON classes
+        WHEN NEW.change_seq IS OLD.change_seq
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_classes_change_delete AFTER DELETE ON classes
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            INSERT INTO class_tombstones (class_id, teacher_id, change_seq)
+            VALUES (OLD.id, OLD.teacher_id, (SELECT value FROM change_sequences WHERE name = 'classes'));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_assignments_change_insert AFTER INSERT ON assignments
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.class_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_assignments_change_update AFTER UPDATE ON assignments
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (OLD.class_id, NEW.class_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_assignments_change_delete AFTER DELETE ON assignments
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = OLD.class_id;
+        END;
+    """)
+    conn.commit()
+
+    # Sync is scoped per user: a teacher syncs their classes and their roster's
+    # mistakes, a student their published classes and own mistakes. Changes of
+    # scope are changes too: enrolling or removing a student moves the class
+    # (removal leaves a per-student class tombstone), and roster entries carry
+    # the mistake sequence at which they were added, or leave a roster tombstone.
+    for migration in [
+        "ALTER TABLE class_tombstones ADD COLUMN student_id INTEGER",
+        "ALTER TABLE teacher_student_relationships ADD COLUMN change_seq INTEGER",
+    ]:
+        try:
+            conn.execute(migration)
+            conn.commit()
+        except:
+            pass  # Column already exists
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS roster_tombstones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            change_seq INTEGER NOT NULL,
+            removed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        UPDATE teacher_student_relationships SET change_seq = 0 WHERE change_seq IS NULL;
+
+        DROP INDEX IF EXISTS idx_classes_change;
+        DROP INDEX IF EXISTS idx_class_tombstones_change;
+        DROP INDEX IF EXISTS idx_mistakes_sync;
+        DROP INDEX IF EXISTS idx_mistake_tombstones_sync;
+        CREATE INDEX IF NOT EXISTS idx_classes_teacher_change ON classes(teacher_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_class_tombstones_teacher ON class_tombstones(teacher_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_class_tombstones_student ON class_tombstones(student_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_roster_tombstones_teacher ON roster_tombstones(teacher_id, change_seq);
+
+        CREATE TRIGGER IF NOT EXISTS trg_class_students_change_insert AFTER INSERT ON class_students
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.class_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_class_students_change_delete AFTER DELETE ON class_students
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'classes';
+            UPDATE classes
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'classes'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = OLD.class_id;
+            INSERT INTO class_tombstones (class_id, student_id, change_seq)
+            VALUES (OLD.class_id, OLD.student_id, (SELECT value FROM change_sequences WHERE name = 'classes'));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_roster_change_insert AFTER INSERT ON teacher_student_relationships
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'mistakes';
+            UPDATE teacher_student_relationships
+            SET change_seq = (SELECT value FROM change_sequences WHERE name = 'mistakes')
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_roster_change_delete AFTER DELETE ON teacher_student_relationships
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = 'mistakes';
+            INSERT INTO roster_tombstones (teacher_id, student_id, change_seq)
+            VALUES (OLD.teacher_id, OLD.student_id, (SELECT value FROM change_sequences WHERE name = 'mistakes'));
+        END;
+    """)
+    conn.commit()
+
+    # Tombstones are kept for TOMBSTONE_RETENTION_DAYS (see prune_tombstones).
+    # sync_horizons holds the highest change_seq pruned from each sequence: a
+    # cursor below it may have missed deletions and gets a full sync instead.
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS sync_horizons (
+            name TEXT PRIMARY KEY,
+            change_seq INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO sync_horizons (name, change_seq) VALUES ('classes', 0), ('mistakes', 0);
+    """)
+    conn.commit()
+
+    # Daily mistake rollups per student and per teacher roster for progress charts.
+    # Each occurrence records its student and whether the word had been mistaken
+    # before; triggers on occurrences and the roster keep both tables current.
+    occurrence_migrations = [
+        "ALTER TABLE mistake_occurrences ADD COLUMN student_id INTEGER",
+        "ALTER TABLE mistake_occurrences ADD COLUMN is_repeated BOOLEAN",
+    ]
+    for migration in occurrence_migrations:
+        try:
+            conn.execute(migration)
+            conn.commit()
+        except:
+            pass  # Column already exists
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS mistake_daily_rollups (
+            student_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            occurrences INTEGER NOT NULL DEFAULT 0,
+            new_mistakes INTEGER NOT NULL DEFAULT 0,
+            repeated_mistakes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, day)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS roster_daily_rollups (
+            teacher_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            occurrences INTEGER NOT NULL DEFAULT 0,
+            new_mistakes INTEGER NOT NULL DEFAULT 0,
+            repeated_mistakes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (teacher_id, day)
+        ) WITHOUT ROWID;
+    """)
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_occurrences_rollup_insert'"
+    )
+    if not cursor.fetchone():
+        # First run: classify existing occurrences (repeated = not the mistake's first) and build the rollups
+        conn.executescript("""
+            UPDATE mistake_occurrences
+            SET student_id = m.student_id, is_repeated = r.occurrence_number > 1
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY mistake_id ORDER BY occurred_at, id) AS occurrence_number
+                FROM mistake_occurrences
+            ) AS r, mistakes m
+            WHERE r.id = mistake_occurrences.id AND m.id = mistake_occurrences.mistake_id;
+
+            DELETE FROM mistake_daily_rollups;
+            INSERT INTO mistake_daily_rollups (student_id, day, occurrences, new_mistakes, repeated_mistakes)
+            SELECT student_id, date(occurred_at), COUNT(*), SUM(NOT is_repeated), SUM(is_repeated)
+            FROM mistake_occurrences
+            WHERE student_id IS NOT NULL
+            GROUP BY student_id, date(occurred_at);
+
+            DELETE FROM roster_daily_rollups;
+            INSERT INTO roster_daily_rollups (teacher_id, day, occurrences, new_mistakes, repeated_mistakes)
+            SELECT tsr.teacher_id, r.day, SUM(r.occurrences), SUM(r.new_mistakes), SUM(r.repeated_mistakes)
+            FROM mistake_daily_rollups r
+            JOIN teacher_student_relationships tsr ON tsr.student_id = r.student_id
+            GROUP BY tsr.teacher_id, r.day;
+        """)
+    conn.executescript("""
+        CREATE TRIGGER IF NOT EXISTS trg_occurrences_rollup_insert AFTER INSERT ON mistake_occurrences
+        BEGIN
+            UPDATE mistake_occurrences
+            SET student_id = (SELECT student_id FROM mistakes WHERE id = NEW.mistake_id),
+                is_repeated = (SELECT error_count > 1 FROM mistakes WHERE id = NEW.mistake_id)
+            WHERE id = NEW.id;
+
+            INSERT INTO mistake_daily_rollups (student_id, day, occurrences, new_mistakes, repeated_mistakes)
+            SELECT student_id, date(occurred_at), 1, NOT is_repeated, is_repeated
+            FROM mistake_occurrences
+            WHERE id = NEW.id AND student_id IS NOT NULL
+            ON CONFLICT (student_id, day) DO UPDATE SET
+                occurrences = occurrences + 1,
+                new_mistakes = new_mistakes + excluded.new_mistakes,
+                repeated_mistakes = repeated_mistakes + excluded.repeated_mistakes;
+
+            INSERT INTO roster_daily_rollups (teacher_id, day, occurrences, new_mistakes, repeated_mistakes)
+            SELECT tsr.teacher_id, date(mo.occurred_at), 1, NOT mo.is_repeated, mo.is_repeated
+            FROM mistake_occurrences mo
+            JOIN teacher_student_relationships tsr ON tsr.student_id = mo.student_id
+            WHERE mo.id = NEW.id
+            ON CONFLICT (teacher_id, day) DO UPDATE SET
+                occurrences = occurrences + 1,
+                new_mistakes = new_mistakes + excluded.new_mistakes,
+                repeated_mistakes = repeated_mistakes + excluded.repeated_mistakes;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_occurrences_rollup_delete AFTER DELETE ON mistake_occurrences
+        WHEN OLD.student_id IS NOT NULL
+        BEGIN
+            UPDATE mistake_daily_rollups
+            SET occurrences = occurrences - 1,
+                new_mistakes = new_mistakes - (NOT OLD.is_repeated),
+                repeated_mistakes = repeated_mistakes - OLD.is_repeated
+            WHERE student_id = OLD.student_id AND day = date(OLD.occurred_at);
+
+            UPDATE roster_daily_rollups
+            SET occurrences = occurrences - 1,
+                new_mistakes = new_mistakes - (NOT OLD.is_repeated),
+                repeated_mistakes = repeated_mistakes - OLD.is_repeated
+            WHERE day = date(OLD.occurred_at)
+              AND teacher_id IN (SELECT teacher_id FROM teacher_student_relationships WHERE student_id = OLD.student_id);
+        END;
+
+        -- A student joining or leaving a roster brings their whole history along
+        CREATE TRIGGER IF NOT EXISTS trg_roster_rollup_insert AFTER INSERT ON teacher_student_relationships
+        BEGIN
+            INSERT INTO roster_daily_rollups (teacher_id, day, occurrences, new_mistakes, repeated_mistakes)
+            SELECT NEW.teacher_id, day, occurrences, new_mistakes, repeated_mistakes
+            FROM mistake_daily_rollups
+            WHERE student_id = NEW.student_id
+            ON CONFLICT (teacher_id, day) DO UPDATE SET
+                occurrences = occurrences + excluded.occurrences,
+                new_mistakes = new_mistakes + excluded.new_mistakes,
+                repeated_mistakes = repeated_mistakes + excluded.repeated_mistakes;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_roster_rollup_delete AFTER DELETE ON teacher_student_relationships
+        BEGIN
+            UPDATE roster_daily_rollups
+            SET occurrences = occurrences - (SELECT s.occurrences FROM mistake_daily_rollups s
+                                             WHERE s.student_id = OLD.student_id AND s.day = roster_daily_rollups.day),
+                new_mistakes = new_mistakes - (SELECT s.new_mistakes FROM mistake_daily_rollups s
+                                               WHERE s.student_id = OLD.student_id AND s.day = roster_daily_rollups.day),
+                repeated_mistakes = repeated_mistakes - (SELECT s.repeated_mistakes FROM mistake_daily_rollups s
+                                                         WHERE s.student_id = OLD.student_id AND s.day = roster_daily_rollups.day)
+            WHERE teacher_id = OLD.teacher_id
+              AND day IN (SELECT day FROM mistake_daily_rollups WHERE student_id = OLD.student_id);
+        END;
+    """)
+    conn.commit()
+
+    # Versioned scoring rubrics (see scoring.py); a test is scored with the rubric
+    # pinned when it started, and can be re-scored under any version into test_scores
+    try:
+        conn.execute("ALTER TABLE tests ADD COLUMN rubric_id INTEGER")
+        conn.commit()
+    except:
+        pass  # Column already exists
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS scoring_rubrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher_id INTEGER,
+            version INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            tanbeeh_points REAL NOT NULL,
+            mistake_points REAL NOT NULL,
+            repeat_points REAL NOT NULL,
+            max_mistake_points REAL NOT NULL,
+            max_score REAL NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (teacher_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(teacher_id, version)
+        );
+
+        CREATE TABLE IF NOT EXISTS test_scores (
+            test_id INTEGER NOT NULL,
+            rubric_id INTEGER NOT NULL,
+            total_deductions REAL NOT NULL,
+            total_score REAL NOT NULL,
+            max_score REAL NOT NULL,
+            computed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (test_id, rubric_id),
+            FOREIGN KEY (test_id) REFERENCES tests(id) ON DELETE CASCADE,
+            FOREIGN KEY (rubric_id) REFERENCES scoring_rubrics(id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_test_scores_rubric ON test_scores(rubric_id);
+    """)
+    standard = STANDARD_RUBRIC
+    conn.execute("""
+        INSERT INTO scoring_rubrics (teacher_id, version, name, tanbeeh_points, mistake_points, repeat_points, max_mistake_points, max_score)
+        SELECT NULL, ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM scoring_rubrics WHERE teacher_id IS NULL)
+    """, (standard.version, standard.name, standard.tanbeeh_points, standard.mistake_points,
+          standard.repeat_points, standard.max_mistake_points, standard.max_score))
+    # Tests started before rubrics existed were scored with the Standard rule
+    conn.executescript("""
+        UPDATE tests SET rubric_id = (SELECT MIN(id) FROM scoring_rubrics WHERE teacher_id IS NULL)
+        WHERE rubric_id IS NULL AND status != 'not_started';
+
+        INSERT OR IGNORE INTO test_scores (test_id, rubric_id, total_deductions, total_score, max_score, computed_at)
+        SELECT t.id, t.rubric_id,
+               COALESCE((SELECT SUM(q.points_earned) FROM test_questions q
+                         WHERE q.test_id = t.id AND q.status = 'completed'), 0),
+               t.total_score, t.max_score, t.completed_at
+        FROM tests t
+        WHERE t.status = 'completed' AND t.total_score IS NOT NULL;
+    """)
+    conn.commit()
+
+    # Per-student memorization cursor (kept up to date by class/assignment writes)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS student_progress (
+            student_id INTEGER PRIMARY KEY,
+            last_class_id INTEGER,
+            last_class_date TEXT,
+            last_class_day TEXT,
+            hifz_start_surah INTEGER,
+            hifz_end_surah INTEGER,
+            hifz_start_ayah INTEGER,
+            hifz_end_ayah INTEGER,
+            sabqi_start_surah INTEGER,
+            sabqi_end_surah INTEGER,
+            sabqi_start_ayah INTEGER,
+            sabqi_end_ayah INTEGER,
+            manzil_start_surah INTEGER,
+            manzil_end_surah INTEGER,
+            manzil_start_ayah INTEGER,
+            manzil_end_ayah INTEGER,
+            memorized_ayahs INTEGER DEFAULT 0,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+    conn.commit()
+
+    # Backfill cursors for students enrolled in classes before the table existed
+    cursor = conn.execute("""
+        SELECT DISTINCT cs.student_id FROM class_students cs
+        LEFT JOIN student_progress sp ON sp.student_id = cs.student_id
+        WHERE sp.student_id IS NULL
+    """)
+    missing = [row["student_id"] for row in cursor.fetchall()]
+    if missing:
+        refresh_student_progress(conn, missing)
+        conn.commit()
+
+    prune_tombstones(conn)
     conn.close()
 
 
@@ -343,7 +873,16 @@ class TestMistakeCreate(BaseModel):
     word_index: int
     word_text: str
     char_index: Optional[int] = None
-    is_tanbeeh: bool = False  # True = warning (0.5 pts), False = full mistake (1+ pts)
+    is_tanbeeh: bool = False  # True = warning (rubric's tanbeeh points), False = full mistake (grows with history)
+
+
+class RubricCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    tanbeeh_points: float = Field(..., ge=0)
+    mistake_points: float = Field(..., ge=0)
+    repeat_points: float = Field(..., ge=0)
+    max_mistake_points: float = Field(..., ge=0)
+    max_score: float = Field(100, gt=0)
 
 
 # ============ QURAN ENDPOINTS ============
@@ -351,6 +890,61 @@ class TestMistakeCreate(BaseModel):
 # Directory for QPC word data (code_v1, line_number, etc.)
 QURAN_PAGES_DIR = Path(__file__).parent / "quran-pages"
 
+# Navigation tables (built on first use, read-only afterwards)
+_quran_index: Optional[QuranIndex] = None
+
+
+def get_quran_index() -> QuranIndex:
+    """Get the shared in-memory Quran navigation tables"""
+    global _quran_index
+    if _quran_index is None:
+        quran_conn = get_quran_db()
+        _quran_index = build_quran_index(quran_conn, QURAN_PAGES_DIR)
+        quran_conn.close()
+    return _quran_index
+
+
+# Per-student ayah coverage bitsets (see coverage.py)
+coverage_cache = CoverageCache()
+
+# Per-student mistake heatmaps (see heatmap.py), dropped on any change to the student's mistakes
+heatmap_cache: StudentCache[MistakeHeatmap] = StudentCache()
+
+# Per-student test score history (all tests for teachers, published only for the student),
+# dropped when one of the student's tests completes, is deleted or changes visibility
+test_history_cache: StudentCache[dict] = StudentCache()
+published_test_history_cache: StudentCache[dict] = StudentCache()
+
+
+def forget_test_history(student_ids) -> None:
+    test_history_cache.invalidate(student_ids)
+    published_test_history_cache.invalidate(student_ids)
+
+# teacher_id -> RosterHeatmap, reused while every student's heatmap is unchanged
+roster_heatmaps = RosterHeatmapCache()
+
+# Live update streams (see events.py)
+event_broker = EventBroker()
+
+# Per-user data versions (see versioned_cache.py): bumped after every write to a
+# user's classes, mistakes or roster; dashboard stats are cached against them
+data_versions = DataVersions()
+stats_cache: VersionedCache[dict] = VersionedCache(data_versions)
+roster_change_listeners.append(lambda teacher_id, student_id: data_versions.bump([teacher_id, student_id]))
+
+
+def clear_student_caches() -> None:
+    """Drop all cached per-student data after bulk writes (clear-data, restore, sync)"""
+    coverage_cache.clear()
+    heatmap_cache.clear()
+    roster_heatmaps.clear()
+    test_history_cache.clear()
+    published_test_history_cache.clear()
+    forget_completed_tests()
+    live_tests.clear()
+    data_versions.bump_all()
+
+
 @app.get("/api/quran/page/{page_number}")
 def get_quran_page_words(page_number: int):
     """Get word-by-word data for a specific page (1-604) with QPC glyph codes"""
@@ -368,6 +962,39 @@ def get_quran_page_words(page_number: int):
     return {"data": words, "page": page_number}
 
 
+@app.get("/api/quran/workload")
+def get_portion_workload(
+    start_surah: int,
+    start_ayah: Optional[int] = None,
+    end_surah: Optional[int] = None,
+    end_ayah: Optional[int] = None
+):
+    """Size of an ayah range: ayahs, words, Mushaf lines and page span.
+
+    Takes the same range as an assignment (missing ayahs mean whole surahs) and
+    answers from prefix sums over the page line data in O(1).
+    """
+    for surah in (start_surah, end_surah):
+        if surah is not None and (surah < 1 or surah > 114):
+            raise HTTPException(status_code=404, detail="Surah not found")
+
+    index = get_quran_index()
+    for surah, ayah in ((start_surah, start_ayah), (end_surah or start_surah, end_ayah)):
+        if ayah is not None and (ayah < 1 or ayah > index.ayah_count(surah)):
+            raise HTTPException(status_code=404, detail=f"Ayah {surah}:{ayah} not found")
+
+    first, last = index.range_ordinals(start_surah, start_ayah, end_surah, end_ayah)
+    start = index.ayah_at(first)
+    end = index.ayah_at(last)
+    return {"data": {
+        "start_surah": start[0],
+        "start_ayah": start[1],
+        "end_surah": end[0],
+        "end_ayah": end[1],
+        **index.workload(first, last)
+    }}
+
+
 @app.get("/api/surahs")
 def get_all_surahs():
     """Get list of all 114 surahs"""
@@ -587,6 +1214,104 @@ def get_class(class_id: int, current_user: dict = Depends(get_current_user)):
     return {"data": class_dict}
 
 
+def mistake_in_assignment(mistake: dict, assignment: dict) -> bool:
+    """Check whether a mistake falls inside an assignment's portion.
+
+    Same-surah assignments with an ayah range are matched by ayah, anything
+    else is matched by whole surahs (manzil ranges can run in either direction).
+    """
+    start_surah = assignment["start_surah"]
+    end_surah = assignment["end_surah"] or start_surah
+    start_ayah = assignment.get("start_ayah")
+    end_ayah = assignment.get("end_ayah")
+
+    if start_ayah and end_ayah and start_surah == end_surah:
+        return (mistake["surah_number"] == start_surah
+                and start_ayah <= mistake["ayah_number"] <= end_ayah)
+
+    low, high = min(start_surah, end_surah), max(start_surah, end_surah)
+    return low <= mistake["surah_number"] <= high
+
+
+@app.get("/api/classes/{class_id}/session")
+def get_class_session(class_id: int, current_user: dict = Depends(get_current_verified_user)):
+    """Get everything the live class screen needs in one call (Teacher only)
+
+    Returns the class with its assignments, enrolled students, each student's
+    mistakes inside their portions for this class, and the test state for test
+    classes. Every piece is loaded with a single batched query.
+    """
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
+
+    cursor = conn.execute("SELECT * FROM classes WHERE id = ?", (class_id,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        raise HTTPException(status_code=404, detail="Class not found")
+    if row["teacher_id"] != teacher_id:
+        conn.close()
+        raise HTTPException(status_code=403, detail="Not authorized to access this class")
+
+    class_dict = dict(row)
+
+    cursor = conn.execute(
+        "SELECT id, type, start_surah, end_surah, start_ayah, end_ayah, student_id FROM assignments WHERE class_id = ?",
+        (class_id,)
+    )
+    assignments = [dict(a) for a in cursor.fetchall()]
+    class_dict["assignments"] = assignments
+
+    cursor = conn.execute(
+        """SELECT u.id, u.student_id, u.first_name, u.last_name, cs.performance
+           FROM users u
+           JOIN class_students cs ON u.id = cs.student_id
+           WHERE cs.class_id = ?""",
+        (class_id,)
+    )
+    students = [dict(s) for s in cursor.fetchall()]
+
+    # All students' mistakes in one query, bounded by the surahs the portions touch
+    mistakes_by_student = {s["id"]: [] for s in students}
+    if students and assignments:
+        surahs = [a["start_surah"] for a in assignments] + [a["end_surah"] or a["start_surah"] for a in assignments]
+        placeholders = ",".join("?" for _ in students)
+        cursor = conn.execute(
+            f"""SELECT m.*, COALESCE(occ.count, 0) AS class_occurrences
+                FROM mistakes m
+                LEFT JOIN (
+                    SELECT mistake_id, COUNT(*) AS count FROM mistake_occurrences
+                    WHERE class_id = ? GROUP BY mistake_id
+                ) occ ON occ.mistake_id = m.id
+                WHERE m.student_id IN ({placeholders}) AND m.surah_number BETWEEN ? AND ?
+                ORDER BY m.surah_number, m.ayah_number, m.word_index""",
+            (class_id, *mistakes_by_student.keys(), min(surahs), max(surahs))
+        )
+        for m in cursor.fetchall():
+            mistake = dict(m)
+            student_assignments = [
+                a for a in assignments
+                if a["student_id"] is None or a["student_id"] == mistake["student_id"]
+            ]
+            if any(mistake_in_assignment(mistake, a) for a in student_assignments):
+                mistakes_by_student[mistake["student_id"]].append(mistake)
+
+    for student in students:
+        student["mistakes"] = mistakes_by_student[student["id"]]
+    class_dict["students"] = students
+
+    # Test state for test classes (see load_test_aggregate)
+    class_dict["test"] = None
+    if class_dict.get("class_type") == "test":
+        cursor = conn.execute("SELECT id FROM tests WHERE class_id = ?", (class_id,))
+        test = cursor.fetchone()
+        if test:
+            class_dict["test"] = load_test_aggregate(conn, test["id"])
+
+    conn.close()
+    return {"data": class_dict}
+
+
 @app.post("/api/classes")
 def create_class(data: ClassCreate, current_user: dict = Depends(get_current_verified_user)):
     """Create a new class with assignments (Teacher only)
@@ -596,6 +1321,7 @@ def create_class(data: ClassCreate, current_user: dict = Depends(get_current_ver
     - A test record is automatically created
     """
     teacher_id = int(current_user["sub"])
+    check_assignment_ranges(data.assignments)
     conn = get_app_db()
 
     # Validate class_type
@@ -624,6 +1350,7 @@ def create_class(data: ClassCreate, current_user: dict = Depends(get_current_ver
         )
 
     # Add students to the class
+    enrolled = []
     for student_id in data.student_ids:
         # Verify student exists and is in teacher's roster
         cursor = conn.execute(
@@ -635,6 +1362,18 @@ def create_class(data: ClassCreate, current_user: dict = Depends(get_current_ver
                 "INSERT OR IGNORE INTO class_students (class_id, student_id) VALUES (?, ?)",
                 (class_id, student_id)
             )
+            enrolled.append(student_id)
+
+    if data.class_type == "regular":
+        refresh_student_progress(conn, enrolled)
+        # Coverage masks for the new portions, built before anything is committed
+        index = get_quran_index()
+        portion_masks = [
+            (assignment.student_id, assignment.type, index.range_mask(
+                assignment.start_surah, assignment.start_ayah, assignment.end_surah, assignment.end_ayah
+            ))
+            for assignment in data.assignments
+        ]
 
     # For test classes, automatically create a test record
     test_id = None
@@ -647,6 +1386,14 @@ def create_class(data: ClassCreate, current_user: dict = Depends(get_current_ver
 
     conn.commit()
     conn.close()
+    data_versions.bump([teacher_id] + enrolled)
+
+    # Extend loaded coverage bitsets with the new portions
+    if data.class_type == "regular":
+        for student_id in enrolled:
+            for assignment_student_id, portion_type, mask in portion_masks:
+                if assignment_student_id is None or assignment_student_id == student_id:
+                    coverage_cache.add(student_id, data.date, portion_type, mask)
 
     response = {"id": class_id, "message": "Class created"}
     if test_id:
@@ -671,6 +1418,7 @@ def update_class_notes(class_id: int, data: ClassNotesUpdate, current_user: dict
 
     conn.execute("UPDATE classes SET notes = ? WHERE id = ?", (data.notes, class_id))
     conn.commit()
+    data_versions.bump([teacher_id] + class_student_ids(conn, class_id))
     conn.close()
     return {"message": "Notes updated", "notes": data.notes}
 
@@ -679,6 +1427,7 @@ def update_class_notes(class_id: int, data: ClassNotesUpdate, current_user: dict
 def add_class_assignments(class_id: int, assignments: list[AssignmentCreate], current_user: dict = Depends(get_current_verified_user)):
     """Add new assignments to an existing class (Teacher only)"""
     teacher_id = int(current_user["sub"])
+    check_assignment_ranges(assignments)
     conn = get_app_db()
 
     # Verify class exists and user owns it
@@ -698,19 +1447,25 @@ def add_class_assignments(class_id: int, assignments: list[AssignmentCreate], cu
             (class_id, assignment.type, assignment.start_surah, assignment.end_surah, assignment.start_ayah, assignment.end_ayah, assignment.student_id)
         )
 
+    student_ids = class_student_ids(conn, class_id)
+    refresh_student_progress(conn, student_ids)
+
     conn.commit()
     conn.close()
+    coverage_cache.invalidate(student_ids)
     return {"message": f"Added {len(assignments)} assignment(s) to class"}
 
 
 @app.patch("/api/assignments/{assignment_id}")
 def update_assignment(assignment_id: int, assignment: AssignmentCreate):
     """Update an existing assignment"""
+    check_assignment_ranges([assignment])
     conn = get_app_db()
 
     # Verify assignment exists
-    cursor = conn.execute("SELECT id FROM assignments WHERE id = ?", (assignment_id,))
-    if not cursor.fetchone():
+    cursor = conn.execute("SELECT id, class_id FROM assignments WHERE id = ?", (assignment_id,))
+    existing = cursor.fetchone()
+    if not existing:
         conn.close()
         raise HTTPException(status_code=404, detail="Assignment not found")
 
@@ -720,8 +1475,12 @@ def update_assignment(assignment_id: int, assignment: AssignmentCreate):
         (assignment.type, assignment.start_surah, assignment.end_surah, assignment.start_ayah, assignment.end_ayah, assignment_id)
     )
 
+    student_ids = class_student_ids(conn, existing["class_id"])
+    refresh_student_progress(conn, student_ids)
+
     conn.commit()
     conn.close()
+    coverage_cache.invalidate(student_ids)
     return {"message": "Assignment updated"}
 
 
@@ -742,12 +1501,20 @@ def delete_class(class_id: int, current_user: dict = Depends(get_current_verifie
         raise HTTPException(status_code=403, detail="Not authorized to delete this class")
 
     # Delete related data
+    student_ids = class_student_ids(conn, class_id)
     conn.execute("DELETE FROM class_students WHERE class_id = ?", (class_id,))
     conn.execute("DELETE FROM assignments WHERE class_id = ?", (class_id,))
     conn.execute("DELETE FROM classes WHERE id = ?", (class_id,))
 
+    refresh_student_progress(conn, student_ids)
+
     conn.commit()
     conn.close()
+    coverage_cache.invalidate(student_ids)
+    forget_test_history(student_ids)
+    data_versions.bump([teacher_id] + student_ids)
+    forget_completed_tests(class_id)
+    live_tests.drop_class(class_id)
     return {"message": "Class deleted"}
 
 
@@ -781,6 +1548,7 @@ def update_class_performance(class_id: int, data: PerformanceUpdate, current_use
     )
 
     conn.commit()
+    data_versions.bump([teacher_id] + class_student_ids(conn, class_id))
     conn.close()
     return {"message": "Performance updated", "performance": data.performance}
 
@@ -848,6 +1616,17 @@ def update_class_publish(class_id: int, data: PublishUpdate, current_user: dict
     )
 
     conn.commit()
+    # A test class's score appears in (or leaves) the student's own test history
+    cursor = conn.execute("SELECT student_id FROM tests WHERE class_id = ?", (class_id,))
+    published_test_history_cache.invalidate([row["student_id"] for row in cursor.fetchall()])
+    data_versions.bump([teacher_id] + class_student_ids(conn, class_id))
+    # Live tests cache who may see their scores, which depends on is_published
+    live_tests.drop_class(class_id)
+    if event_broker.has_subscribers():
+        event_broker.publish(
+            [teacher_id] + class_student_ids(conn, class_id),
+            "class.published", {"class_id": class_id, "is_published": data.is_published}
+        )
     conn.close()
     return {"message": "Class visibility updated", "is_published": data.is_published}
 
@@ -868,7 +1647,7 @@ def add_students_to_class(class_id: int, student_ids: List[int], current_user: d
         conn.close()
         raise HTTPException(status_code=403, detail="Not authorized to modify this class")
 
-    added = 0
+    added = []
     for student_id in student_ids:
         # Verify student is in teacher's roster
         cursor = conn.execute(
@@ -881,13 +1660,17 @@ def add_students_to_class(class_id: int, student_ids: List[int], current_user: d
                     "INSERT INTO class_students (class_id, student_id) VALUES (?, ?)",
                     (class_id, student_id)
                 )
-                added += 1
+                added.append(student_id)
             except:
                 pass  # Already in class
 
+    refresh_student_progress(conn, added)
+
     conn.commit()
     conn.close()
-    return {"message": f"Added {added} student(s) to class"}
+    coverage_cache.invalidate(added)
+    data_versions.bump(added)
+    return {"message": f"Added {len(added)} student(s) to class"}
 
 
 @app.delete("/api/classes/{class_id}/students/{student_id}")
@@ -915,214 +1698,933 @@ def remove_student_from_class(class_id: int, student_id: int, current_user: dict
         conn.close()
         raise HTTPException(status_code=404, detail="Student not in this class")
 
+    refresh_student_progress(conn, [student_id])
+
     conn.commit()
     conn.close()
+    coverage_cache.invalidate([student_id])
+    data_versions.bump([student_id])
     return {"message": "Student removed from class"}
 
 
-# ============ PROGRESS SUGGESTION ENDPOINT ============
+# ============ STUDENT PROGRESS (MEMORIZATION CURSOR) ============
 
-@app.get("/api/students/{student_id}/suggested-portions")
-def get_suggested_portions(
-    student_id: int,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Get suggested portions for a student based on their last class.
+# assignments.type -> student_progress column prefix
+PROGRESS_PORTIONS = {"hifz": "hifz", "sabqi": "sabqi", "revision": "manzil"}
+PROGRESS_RANGE_FIELDS = ("start_surah", "end_surah", "start_ayah", "end_ayah")
+PROGRESS_COLUMNS = (
+    ["student_id", "last_class_id", "last_class_date", "last_class_day"]
+    + [f"{prefix}_{field}" for prefix in PROGRESS_PORTIONS.values() for field in PROGRESS_RANGE_FIELDS]
+    + ["memorized_ayahs"]
+)
+SQL_CHUNK = 500  # Stay well below SQLite's bound-parameter limit
 
-    Logic:
-    - Hifz: Continue from where they left off (next surah/ayah after last hifz)
-    - Sabqi: Last class's Hifz becomes this class's Sabqi
-    - Manzil: Continue cycling through older portions
 
-    Returns suggested start_surah, end_surah, start_ayah, end_ayah for each type.
+def verify_student_access(conn, current_user: dict, student_id: int) -> None:
+    """Allow teachers to read students in their roster and students to read themselves.
+    Closes the connection before raising."""
+    user_id = int(current_user["sub"])
+    if student_id == user_id:
+        return
+    if not current_user.get("is_verified", False):
+        conn.close()
+        raise HTTPException(status_code=403, detail="You can only view your own data")
+    cursor = conn.execute(
+        "SELECT 1 FROM teacher_student_relationships WHERE teacher_id = ? AND student_id = ?",
+        (user_id, student_id)
+    )
+    if not cursor.fetchone():
+        conn.close()
+        raise HTTPException(status_code=403, detail="Student not in your roster")
+
+
+def class_student_ids(conn, class_id: int) -> list:
+    """IDs of the students enrolled in a class"""
+    cursor = conn.execute("SELECT student_id FROM class_students WHERE class_id = ?", (class_id,))
+    return [row["student_id"] for row in cursor.fetchall()]
+
+
+def merged_span(ranges: list) -> int:
+    """Number of distinct ordinals covered by a list of (first, last) ranges"""
+    total = 0
+    current_first = current_last = None
+    for first, last in sorted(ranges):
+        if current_last is not None and first <= current_last + 1:
+            current_last = max(current_last, last)
+            continue
+        if current_last is not None:
+            total += current_last - current_first + 1
+        current_first, current_last = first, last
+    if current_last is not None:
+        total += current_last - current_first + 1
+    return total
+
+
+def check_assignment_ranges(assignments) -> None:
+    """400 unless every assignment names surahs 1-114 and ayahs within them"""
+    index = get_quran_index()
+    for a in assignments:
+        if not index.valid_range(a.start_surah, a.start_ayah, a.end_surah, a.end_ayah):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid {a.type} range {a.start_surah}:{a.start_ayah or 1} - "
+                       f"{a.end_surah or a.start_surah}:{a.end_ayah or 'end'}"
+            )
+
+
+def refresh_student_progress(conn, student_ids) -> None:
+    """Recompute the memorization cursor for the given students.
+
+    Called (inside the caller's transaction) by every write that can change a
+    student's latest regular class or its assignments, so suggestions and
+    progress views only ever read one student_progress row. Stored ranges
+    outside the Mushaf (from before ranges were validated) are skipped.
     """
-    # Only teachers can get suggestions
-    is_teacher = current_user.get("is_verified", False)
-    if not is_teacher:
-        raise HTTPException(status_code=403, detail="Only teachers can get suggestions")
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    index = get_quran_index()
+
+    for i in range(0, len(student_ids), SQL_CHUNK):
+        chunk = student_ids[i:i + SQL_CHUNK]
+        placeholders = ",".join("?" for _ in chunk)
+        rows = {sid: {column: None for column in PROGRESS_COLUMNS} for sid in chunk}
+        for sid, row in rows.items():
+            row["student_id"] = sid
+            row["memorized_ayahs"] = 0
+
+        # Latest regular class per student, joined to the assignments that apply to them
+        cursor = conn.execute(f"""
+            WITH latest AS (
+                SELECT student_id, class_id, date, day FROM (
+                    SELECT cs.student_id, c.id AS class_id, c.date, c.day,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY cs.student_id ORDER BY c.date DESC, c.id DESC
+                           ) AS rn
+                    FROM class_students cs
+                    JOIN classes c ON c.id = cs.class_id
+                    WHERE cs.student_id IN ({placeholders}) AND c.class_type = 'regular'
+                ) WHERE rn = 1
+            )
+            SELECT l.student_id, l.class_id, l.date, l.day,
+                   a.type, a.start_surah, a.end_surah, a.start_ayah, a.end_ayah
+            FROM latest l
+            LEFT JOIN assignments a
+                ON a.class_id = l.class_id AND (a.student_id IS NULL OR a.student_id = l.student_id)
+            ORDER BY l.student_id, a.type, a.id
+        """, chunk)
+        for a in cursor.fetchall():
+            row = rows[a["student_id"]]
+            row["last_class_id"] = a["class_id"]
+            row["last_class_date"] = a["date"]
+            row["last_class_day"] = a["day"]
+            prefix = PROGRESS_PORTIONS.get(a["type"])
+            if prefix and index.valid_range(a["start_surah"], a["start_ayah"], a["end_surah"], a["end_ayah"]):
+                for field in PROGRESS_RANGE_FIELDS:
+                    row[f"{prefix}_{field}"] = a[field]
+
+        # Total memorized span: union of every hifz portion across regular classes
+        hifz_ranges = {sid: [] for sid in chunk}
+        cursor = conn.execute(f"""
+            SELECT cs.student_id, a.start_surah, a.end_surah, a.start_ayah, a.end_ayah
+            FROM assignments a
+            JOIN class_students cs ON cs.class_id = a.class_id
+            JOIN classes c ON c.id = a.class_id
+            WHERE cs.student_id IN ({placeholders}) AND c.class_type = 'regular' AND a.type = 'hifz'
+              AND (a.student_id IS NULL OR a.student_id = cs.student_id)
+        """, chunk)
+        for a in cursor.fetchall():
+            if not index.valid_range(a["start_surah"], a["start_ayah"], a["end_surah"], a["end_ayah"]):
+                continue
+            hifz_ranges[a["student_id"]].append(
+                index.range_ordinals(a["start_surah"], a["start_ayah"], a["end_surah"], a["end_ayah"])
+            )
+        for sid, ranges in hifz_ranges.items():
+            rows[sid]["memorized_ayahs"] = merged_span(ranges)
+
+        conn.executemany(
+            f"""INSERT OR REPLACE INTO student_progress ({", ".join(PROGRESS_COLUMNS)}, updated_at)
+                VALUES ({", ".join(":" + column for column in PROGRESS_COLUMNS)}, CURRENT_TIMESTAMP)""",
+            list(rows.values())
+        )
+
+
+def progress_portion(progress, prefix: str) -> Optional[dict]:
+    """One portion range from a student_progress row, or None if it was not assigned"""
+    if progress[f"{prefix}_start_surah"] is None:
+        return None
+    return {field: progress[f"{prefix}_{field}"] for field in PROGRESS_RANGE_FIELDS}
+
+
+def progress_to_dict(progress) -> dict:
+    """API shape of a student_progress row"""
+    return {
+        "student_id": progress["student_id"],
+        "last_class": {
+            "id": progress["last_class_id"],
+            "date": progress["last_class_date"],
+            "day": progress["last_class_day"]
+        } if progress["last_class_id"] else None,
+        "hifz": progress_portion(progress, "hifz"),
+        "sabqi": progress_portion(progress, "sabqi"),
+        "manzil": progress_portion(progress, "manzil"),
+        "memorized_ayahs": progress["memorized_ayahs"],
+        "updated_at": progress["updated_at"]
+    }
 
+
+@app.get("/api/students/{student_id}/progress")
+def get_student_progress(student_id: int, current_user: dict = Depends(get_current_user)):
+    """Get a student's memorization cursor: hifz frontier, last sabqi, manzil pointer, memorized span.
+    - Teachers: students in their roster
+    - Students: only themselves
+    """
     conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+
+    cursor = conn.execute("SELECT * FROM student_progress WHERE student_id = ?", (student_id,))
+    progress = cursor.fetchone()
+    conn.close()
 
-    # Get student's most recent class with assignments
+    if not progress:
+        return {"data": {
+            "student_id": student_id, "last_class": None, "hifz": None, "sabqi": None,
+            "manzil": None, "memorized_ayahs": 0, "updated_at": None
+        }}
+    data = progress_to_dict(progress)
+    data["memorized_percent"] = round(100 * data["memorized_ayahs"] / get_quran_index().total_ayahs, 2)
+    return {"data": data}
+
+
+# ============ MEMORIZATION COVERAGE ============
+
+def load_student_coverage(student_id: int) -> StudentCoverage:
+    """Build a student's coverage bitsets from their regular-class assignments"""
+    index = get_quran_index()
+    conn = get_app_db()
     cursor = conn.execute("""
-        SELECT c.id, c.date, c.day
-        FROM classes c
-        JOIN class_students cs ON cs.class_id = c.id
+        SELECT c.date, a.type, a.start_surah, a.end_surah, a.start_ayah, a.end_ayah
+        FROM assignments a
+        JOIN class_students cs ON cs.class_id = a.class_id
+        JOIN classes c ON c.id = a.class_id
         WHERE cs.student_id = ? AND c.class_type = 'regular'
-        ORDER BY c.date DESC, c.id DESC
-        LIMIT 1
+          AND (a.student_id IS NULL OR a.student_id = cs.student_id)
+        ORDER BY c.date
     """, (student_id,))
-    last_class = cursor.fetchone()
+    coverage = StudentCoverage()
+    for a in cursor.fetchall():
+        # Ranges stored before they were validated may lie outside the Mushaf
+        if index.valid_range(a["start_surah"], a["start_ayah"], a["end_surah"], a["end_ayah"]):
+            coverage.add(a["date"], a["type"], index.range_mask(
+                a["start_surah"], a["start_ayah"], a["end_surah"], a["end_ayah"]
+            ))
+    conn.close()
+    return coverage
 
-    suggestions = {
-        "hifz": None,
-        "sabqi": None,
-        "manzil": None,
-        "last_class": None
-    }
 
-    if not last_class:
-        conn.close()
-        # No previous class - return default starting point (Al-Mulk)
-        suggestions["hifz"] = {
-            "start_surah": 67,
-            "end_surah": 67,
-            "start_ayah": 1,
-            "end_ayah": 30,
-            "surah_name": "Al-Mulk",
-            "note": "No previous classes found - starting from Al-Mulk"
-        }
-        return suggestions
+def parse_portion_types(value: str) -> tuple:
+    """'hifz,revision' or 'all' -> tuple of portion types"""
+    if value == "all":
+        return PORTION_TYPES
+    types = tuple(t.strip() for t in value.split(",") if t.strip())
+    if not types or any(t not in PORTION_TYPES for t in types):
+        raise HTTPException(status_code=400, detail=f"Portion types must be 'all' or any of: {', '.join(PORTION_TYPES)}")
+    return types
+
 
-    suggestions["last_class"] = {
-        "id": last_class["id"],
-        "date": last_class["date"],
-        "day": last_class["day"]
+def parse_date_window(since: Optional[str], until: Optional[str],
+                      since_name: str = "since", until_name: str = "until") -> tuple:
+    """Validate an optional YYYY-MM-DD window; returns it as ISO dates, which compare like class dates"""
+    try:
+        since_day = date.fromisoformat(since) if since else None
+        until_day = date.fromisoformat(until) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{since_name} and {until_name} must be dates (YYYY-MM-DD)")
+    if since_day and until_day and since_day > until_day:
+        raise HTTPException(status_code=400, detail=f"{since_name} must not be after {until_name}")
+    return (since_day.isoformat() if since_day else None), (until_day.isoformat() if until_day else None)
+
+
+def coverage_summary(index: QuranIndex, mask: int) -> dict:
+    """Ayah count, percentage and per-juz breakdown of a coverage bitset"""
+    ayahs = mask.bit_count()
+    juz = []
+    for number, juz_mask in enumerate(index.juz_masks, start=1):
+        total = juz_mask.bit_count()
+        covered = (mask & juz_mask).bit_count()
+        juz.append({"juz": number, "ayahs": covered, "total": total, "percent": round(100 * covered / total, 2)})
+    return {
+        "ayahs": ayahs,
+        "percent": round(100 * ayahs / index.total_ayahs, 2),
+        "juz": juz
     }
 
-    # Get assignments from last class for this student
-    cursor = conn.execute("""
-        SELECT type, start_surah, end_surah, start_ayah, end_ayah
-        FROM assignments
-        WHERE class_id = ? AND (student_id IS NULL OR student_id = ?)
-        ORDER BY type
-    """, (last_class["id"], student_id))
-    last_assignments = cursor.fetchall()
-
-    # Parse last assignments
-    last_hifz = None
-    last_sabqi = None
-    last_manzil = None
-
-    for a in last_assignments:
-        if a["type"] == "hifz":
-            last_hifz = dict(a)
-        elif a["type"] == "sabqi":
-            last_sabqi = dict(a)
-        elif a["type"] == "revision":
-            last_manzil = dict(a)
-
-    # Get surah info for name lookup
-    quran_conn = get_quran_db()
 
-    def get_surah_info(surah_num):
-        cursor = quran_conn.execute(
-            "SELECT number, name, englishName, numberOfAyahs FROM surahs WHERE number = ?",
-            (surah_num,)
-        )
-        return cursor.fetchone()
+@app.get("/api/students/{student_id}/coverage")
+def get_student_coverage(
+    student_id: int,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Percentage of the Quran covered by a student's portions, per portion type and per juz.
 
-    def get_prev_surah(surah_num):
-        """Get the previous surah number (going upwards in memorization, wraps 1 -> 114)"""
-        return surah_num - 1 if surah_num > 1 else 114
+    since/until (YYYY-MM-DD) restrict to classes in that window, e.g. "revised this month".
+    """
+    since, until = parse_date_window(since, until)
+    conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+    conn.close()
+
+    index = get_quran_index()
+    coverage = coverage_cache.get_or_build(student_id, lambda: load_student_coverage(student_id))
+
+    portions = {t: coverage_summary(index, coverage.union((t,), since, until)) for t in PORTION_TYPES}
+    portions["all"] = coverage_summary(index, coverage.union(PORTION_TYPES, since, until))
+    return {"data": {
+        "student_id": student_id,
+        "since": since,
+        "until": until,
+        "total_ayahs": index.total_ayahs,
+        "portions": portions
+    }}
+
+
+@app.get("/api/students/{student_id}/coverage/compare")
+def compare_student_coverage(
+    student_id: int,
+    left: str = "hifz",
+    right: str = "revision",
+    op: str = "difference",
+    left_since: Optional[str] = None,
+    left_until: Optional[str] = None,
+    right_since: Optional[str] = None,
+    right_until: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Set operations between two coverage selections of one student.
+
+    left/right are portion types ('hifz', 'sabqi', 'revision', comma-separated, or 'all'),
+    each with its own date window. op is union, intersection or difference (left minus right),
+    e.g. left=hifz&right=revision&right_since=2026-10-01 -> memorized but not revised this month.
+    Returns the size of the result and its ayah ranges.
+    """
+    operations = {
+        "union": lambda a, b: a | b,
+        "intersection": lambda a, b: a & b,
+        "difference": lambda a, b: a & ~b,
+    }
+    if op not in operations:
+        raise HTTPException(status_code=400, detail=f"op must be one of: {', '.join(operations)}")
+    left_types = parse_portion_types(left)
+    right_types = parse_portion_types(right)
+    left_since, left_until = parse_date_window(left_since, left_until, "left_since", "left_until")
+    right_since, right_until = parse_date_window(right_since, right_until, "right_since", "right_until")
+
+    conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+    conn.close()
+
+    index = get_quran_index()
+    coverage = coverage_cache.get_or_build(student_id, lambda: load_student_coverage(student_id))
+    mask = operations[op](
+        coverage.union(left_types, left_since, left_until),
+        coverage.union(right_types, right_since, right_until)
+    )
+    ayahs = mask.bit_count()
+    return {"data": {
+        "student_id": student_id,
+        "op": op,
+        "ayahs": ayahs,
+        "percent": round(100 * ayahs / index.total_ayahs, 2),
+        "ranges": [
+            {"start_surah": r[0], "start_ayah": r[1], "end_surah": r[2], "end_ayah": r[3]}
+            for r in index.mask_ranges(mask)
+        ]
+    }}
+
+
+# ============ MISTAKE HEATMAPS ============
+
+def load_student_heatmaps(student_ids: List[int]) -> Dict[int, MistakeHeatmap]:
+    """Build students' heatmaps from one grouped query per SQL_CHUNK students (one row per mistaken word)"""
+    rows = {student_id: [] for student_id in student_ids}
+    conn = get_app_db()
+    for i in range(0, len(student_ids), SQL_CHUNK):
+        chunk = student_ids[i:i + SQL_CHUNK]
+        cursor = conn.execute(
+            f"""
+            SELECT student_id, surah_number, ayah_number, word_index, SUM(error_count), MAX(word_text)
+            FROM mistakes
+            WHERE student_id IN ({",".join("?" * len(chunk))})
+            GROUP BY student_id, surah_number, ayah_number, word_index
+            """,
+            chunk
+        )
+        for student_id, *word_row in cursor:
+            rows[student_id].append(word_row)
+    conn.close()
+    index = get_quran_index()
+    return {student_id: build_heatmap(index, word_rows) for student_id, word_rows in rows.items()}
+
+
+def load_student_heatmap(student_id: int) -> MistakeHeatmap:
+    """One student's heatmap (see load_student_heatmaps)"""
+    return load_student_heatmaps([student_id])[student_id]
+
+
+@app.get("/api/students/heatmap")
+def get_roster_heatmap(
+    limit: int = 10,
+    include_matrix: bool = False,
+    current_user: dict = Depends(get_current_verified_user)
+):
+    """Mistake heatmap across the teacher's whole roster (Teacher only)
+
+    - pages / page_students: errors and number of students with mistakes per page
+    - weak_spots: the `limit` pages, ayahs and words most students stumble on
+    - matrix (include_matrix=true): one 604-page row per student, in `students` order
+    """
+    teacher_id = int(current_user["sub"])
+    limit = min(max(limit, 1), 100)
+
+    conn = get_app_db()
+    cursor = conn.execute("""
+        SELECT u.id, u.student_id, u.first_name, u.last_name
+        FROM users u
+        JOIN teacher_student_relationships tsr ON u.id = tsr.student_id
+        WHERE tsr.teacher_id = ?
+        ORDER BY u.first_name, u.last_name, u.id
+    """, (teacher_id,))
+    students = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    # Students not cached yet (e.g. after a restart) are loaded together, not one query each
+    student_heatmaps = heatmap_cache.get_or_build_many([student["id"] for student in students], load_student_heatmaps)
+    heatmaps = [(student["id"], student_heatmaps[student["id"]]) for student in students]
+    roster = roster_heatmaps.get_or_build(teacher_id, heatmaps)
+
+    for student, (_, heatmap) in zip(students, heatmaps):
+        student["total_errors"] = heatmap.total_errors
+
+    data = {
+        "students": students,
+        "pages": roster.page_errors,
+        "page_students": roster.page_students,
+        "weak_spots": roster.weak_spots(limit)
+    }
+    if include_matrix:
+        data["matrix"] = roster.matrix
+    return {"data": data}
+
+
+@app.get("/api/students/{student_id}/heatmap")
+def get_student_heatmap(student_id: int, current_user: dict = Depends(get_current_user)):
+    """Mistake heatmap of the whole Mushaf for one student.
+
+    pages (604), juz (30) and surahs (114) hold error counts, index 0 = first;
+    page_words holds the number of distinct mistaken words per page.
+    """
+    conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+    conn.close()
+
+    heatmap = heatmap_cache.get_or_build(student_id, lambda: load_student_heatmap(student_id))
+    return {"data": {"student_id": student_id, **heatmap.to_dict()}}
+
+
+# ============ MISTAKE TIMELINES ============
+
+def timeline_buckets(bucket: str, start: Optional[str], end: Optional[str]):
+    """Validate chart parameters; returns the first day of every bucket to show and the last day"""
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(BUCKETS)}")
+    try:
+        end_day = date.fromisoformat(end) if end else datetime.now(timezone.utc).date()
+        start_day = date.fromisoformat(start) if start else default_start(end_day, bucket)
+    except (ValueError, OverflowError):
+        # OverflowError: the default chart would start before 0001-01-01
+        raise HTTPException(status_code=400, detail="start and end must be dates (YYYY-MM-DD)")
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if bucket_count(start_day, end_day, bucket) > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BUCKETS} {bucket}s per chart")
+    return bucket_starts(start_day, end_day, bucket), end_day
+
+
+@app.get("/api/students/mistakes/timeline")
+def get_roster_mistake_timeline(
+    bucket: str = "week",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_verified_user)
+):
+    """Mistakes per day/week/month across the teacher's roster (Teacher only).
+
+    Dense series from the first bucket touching `start` to the one holding
+    `end` (default: the last 30 days / 12 weeks / 12 months up to today, UTC).
+    """
+    starts, end_day = timeline_buckets(bucket, start, end)
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
+
+    cursor = conn.execute("""
+        SELECT day, occurrences, new_mistakes, repeated_mistakes FROM roster_daily_rollups
+        WHERE teacher_id = ? AND day BETWEEN ? AND ?
+    """, (teacher_id, starts[0].isoformat(), end_day.isoformat()))
+    series = dense_series(cursor.fetchall(), starts, bucket)
+
+    conn.close()
+    return {"data": {"bucket": bucket, "series": series}}
+
+
+@app.get("/api/students/{student_id}/mistakes/timeline")
+def get_student_mistake_timeline(
+    student_id: int,
+    bucket: str = "week",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Mistakes per day/week/month for one student, split into new and repeated"""
+    starts, end_day = timeline_buckets(bucket, start, end)
+    conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+
+    cursor = conn.execute("""
+        SELECT day, occurrences, new_mistakes, repeated_mistakes FROM mistake_daily_rollups
+        WHERE student_id = ? AND day BETWEEN ? AND ?
+    """, (student_id, starts[0].isoformat(), end_day.isoformat()))
+    series = dense_series(cursor.fetchall(), starts, bucket)
+
+    conn.close()
+    return {"data": {"student_id": student_id, "bucket": bucket, "series": series}}
+
+
+# ============ PROGRESS SUGGESTION ENDPOINT ============
+
+MANZIL_SURAH_COUNT = 3  # Default manzil size when sizing by ayahs: 3 surahs
+PORTION_DEFAULTS = {
+    # unit: (hifz amount, manzil amount)
+    "ayahs": (10, MANZIL_SURAH_COUNT),  # ~10 ayahs of hifz, manzil in whole surahs
+    "pages": (1, 20),                   # 1 page of hifz, a juz (20 pages) of manzil
+    "lines": (7, 20),                   # half a page (7 lines) of hifz, manzil still in pages
+}
+
+
+def manzil_range(index: QuranIndex, after_surah: int, unit: str, amount: int):
+    """Next manzil block of whole surahs going upwards from after_surah.
+
+    Sized by surah count for unit='ayahs' and by Mushaf pages otherwise.
+    Returns (start_surah, end_surah) with the higher surah number first.
+    """
+    start_surah = index.prev_surah(after_surah)
+    end_surah = start_surah
+    if unit == "ayahs":
+        for _ in range(amount - 1):
+            end_surah = index.prev_surah(end_surah)
+    else:
+        pages = index.surah_pages(end_surah)
+        while pages < amount and end_surah != 1:
+            end_surah = index.prev_surah(end_surah)
+            pages += index.surah_pages(end_surah)
+
+    # Swap if needed (start should be higher number for display)
+    if start_surah < end_surah:
+        start_surah, end_surah = end_surah, start_surah
+    return start_surah, end_surah
+
+
+def build_portion_suggestions(
+    index: QuranIndex,
+    last_hifz: Optional[dict],
+    last_sabqi: Optional[dict],
+    last_manzil: Optional[dict],
+    unit: str = "ayahs",
+    hifz_amount: Optional[int] = None,
+    manzil_amount: Optional[int] = None,
+) -> dict:
+    """Compute hifz, sabqi and manzil suggestions from a student's last assignments.
+
+    Every lookup goes through the in-memory navigation tables, so this never
+    touches the database.
+    """
+    default_hifz, default_manzil = PORTION_DEFAULTS[unit]
+    hifz_amount = hifz_amount or default_hifz
+    manzil_amount = manzil_amount or default_manzil
+
+    def hifz_end(surah, start_ayah):
+        if unit == "pages":
+            return index.end_ayah_by_pages(surah, start_ayah, hifz_amount)
+        if unit == "lines":
+            return index.end_ayah_by_lines(surah, start_ayah, hifz_amount)
+        return index.end_ayah_by_ayahs(surah, start_ayah, hifz_amount)
+
+    suggestions = {"hifz": None, "sabqi": None, "manzil": None}
 
     # HIFZ suggestion: Continue from where they left off
     if last_hifz:
         last_end_surah = last_hifz["end_surah"]
         last_end_ayah = last_hifz["end_ayah"]
-        surah_info = get_surah_info(last_end_surah)
 
-        if last_end_ayah and surah_info and last_end_ayah < surah_info["numberOfAyahs"]:
+        if last_end_ayah and last_end_ayah < index.ayah_count(last_end_surah):
             # Continue in same surah
             suggestions["hifz"] = {
                 "start_surah": last_end_surah,
                 "end_surah": last_end_surah,
                 "start_ayah": last_end_ayah + 1,
-                "end_ayah": min(last_end_ayah + 10, surah_info["numberOfAyahs"]),  # Suggest ~10 ayahs
-                "surah_name": surah_info["englishName"] if surah_info else None,
+                "end_ayah": hifz_end(last_end_surah, last_end_ayah + 1),
+                "surah_name": index.surah_name(last_end_surah),
                 "note": f"Continue from ayah {last_end_ayah + 1}"
             }
         else:
             # Move to previous surah (upwards memorization - lower surah numbers)
-            prev_surah = get_prev_surah(last_end_surah)
-            prev_surah_info = get_surah_info(prev_surah)
+            prev_surah = index.prev_surah(last_end_surah)
             suggestions["hifz"] = {
                 "start_surah": prev_surah,
                 "end_surah": prev_surah,
                 "start_ayah": 1,
-                "end_ayah": min(10, prev_surah_info["numberOfAyahs"]) if prev_surah_info else 10,
-                "surah_name": prev_surah_info["englishName"] if prev_surah_info else None,
-                "note": f"Start new surah after completing {surah_info['englishName'] if surah_info else 'previous'}"
+                "end_ayah": hifz_end(prev_surah, 1),
+                "surah_name": index.surah_name(prev_surah),
+                "note": f"Start new surah after completing {index.surah_name(last_end_surah) or 'previous'}"
             }
 
     # SABQI suggestion: Last Hifz becomes Sabqi
     if last_hifz:
-        surah_info = get_surah_info(last_hifz["start_surah"])
         suggestions["sabqi"] = {
             "start_surah": last_hifz["start_surah"],
             "end_surah": last_hifz["end_surah"],
             "start_ayah": last_hifz["start_ayah"],
             "end_ayah": last_hifz["end_ayah"],
-            "surah_name": surah_info["englishName"] if surah_info else None,
+            "surah_name": index.surah_name(last_hifz["start_surah"]),
             "note": "Last Hifz portion for recent review"
         }
 
-    # MANZIL suggestion: Larger portion (3 surahs) for revision
-    # Manzil should cover more content than Hifz/Sabqi
-    MANZIL_SURAH_COUNT = 3  # Suggest 3 surahs for revision
-
-    if last_manzil:
-        last_end_surah = last_manzil["end_surah"]
-        # Move to next batch of surahs (going upwards/backwards)
-        start_surah = get_prev_surah(last_end_surah)
-        # Go back 3 surahs for manzil range
-        end_surah = start_surah
-        for _ in range(MANZIL_SURAH_COUNT - 1):
-            end_surah = get_prev_surah(end_surah)
-
-        # Swap if needed (start should be higher number for display)
-        if start_surah < end_surah:
-            start_surah, end_surah = end_surah, start_surah
-
-        start_info = get_surah_info(start_surah)
-        end_info = get_surah_info(end_surah)
+    # MANZIL suggestion: Larger block of whole surahs for revision
+    size_label = f"{manzil_amount} surahs" if unit == "ayahs" else f"{manzil_amount} pages"
+    if last_manzil or last_sabqi:
+        after_surah = (last_manzil or last_sabqi)["end_surah"]
+        start_surah, end_surah = manzil_range(index, after_surah, unit, manzil_amount)
         suggestions["manzil"] = {
             "start_surah": start_surah,
             "end_surah": end_surah,
             "start_ayah": 1,
             "end_ayah": None,  # Full surahs
-            "surah_name": f"{start_info['englishName'] if start_info else ''} - {end_info['englishName'] if end_info else ''}",
-            "note": f"Manzil: {MANZIL_SURAH_COUNT} surahs for revision"
+            "surah_name": f"{index.surah_name(start_surah) or ''} - {index.surah_name(end_surah) or ''}",
+            "note": f"Manzil: {size_label} for revision" if last_manzil else f"Starting Manzil rotation ({size_label})"
         }
-    elif last_sabqi:
-        # If no manzil before, start manzil from 3 surahs before last sabqi
-        start_surah = get_prev_surah(last_sabqi["end_surah"])
-        end_surah = start_surah
-        for _ in range(MANZIL_SURAH_COUNT - 1):
-            end_surah = get_prev_surah(end_surah)
-
-        if start_surah < end_surah:
-            start_surah, end_surah = end_surah, start_surah
-
-        start_info = get_surah_info(start_surah)
-        end_info = get_surah_info(end_surah)
-        suggestions["manzil"] = {
-            "start_surah": start_surah,
-            "end_surah": end_surah,
+
+    # Size of every suggestion in ayahs, words, Mushaf lines and pages
+    for suggestion in suggestions.values():
+        if suggestion:
+            suggestion["workload"] = index.workload(*index.range_ordinals(
+                suggestion["start_surah"], suggestion["start_ayah"], suggestion["end_surah"], suggestion["end_ayah"]
+            ))
+
+    return suggestions
+
+
+def default_portion_suggestions() -> dict:
+    """Suggestions for a student with no previous class - start from Al-Mulk"""
+    return {
+        "hifz": {
+            "start_surah": 67,
+            "end_surah": 67,
             "start_ayah": 1,
-            "end_ayah": None,
-            "surah_name": f"{start_info['englishName'] if start_info else ''} - {end_info['englishName'] if end_info else ''}",
-            "note": f"Starting Manzil rotation ({MANZIL_SURAH_COUNT} surahs)"
-        }
+            "end_ayah": 30,
+            "surah_name": "Al-Mulk",
+            "note": "No previous classes found - starting from Al-Mulk"
+        },
+        "sabqi": None,
+        "manzil": None,
+        "last_class": None
+    }
 
-    quran_conn.close()
+
+@app.get("/api/students/suggested-portions")
+def get_roster_suggested_portions(
+    unit: str = "ayahs",
+    hifz_amount: Optional[int] = None,
+    manzil_amount: Optional[int] = None,
+    current_user: dict = Depends(get_current_verified_user)
+):
+    """Get suggested portions for every student in the teacher's roster (Teacher only)
+
+    Same logic and sizing options as /api/students/{student_id}/suggested-portions.
+    One query reads the roster with every student's memorization cursor; the
+    suggestions are then computed from the in-memory tables.
+    """
+    teacher_id = int(current_user["sub"])
+
+    if unit not in PORTION_DEFAULTS:
+        raise HTTPException(status_code=400, detail=f"unit must be one of: {', '.join(PORTION_DEFAULTS)}")
+
+    conn = get_app_db()
+
+    # Roster joined to each student's memorization cursor
+    cursor = conn.execute(f"""
+        SELECT u.id, u.student_id, u.first_name, u.last_name,
+               {", ".join("sp." + column for column in PROGRESS_COLUMNS[1:])}
+        FROM users u
+        JOIN teacher_student_relationships tsr ON u.id = tsr.student_id
+        LEFT JOIN student_progress sp ON sp.student_id = u.id
+        WHERE tsr.teacher_id = ?
+        ORDER BY u.first_name, u.last_name
+    """, (teacher_id,))
+    rows = cursor.fetchall()
     conn.close()
 
+    index = get_quran_index()
+    results = []
+    for row in rows:
+        student = {"id": row["id"], "student_id": row["student_id"], "first_name": row["first_name"], "last_name": row["last_name"]}
+        if row["last_class_id"] is None:
+            suggestions = default_portion_suggestions()
+        else:
+            suggestions = build_portion_suggestions(
+                index,
+                progress_portion(row, "hifz"),
+                progress_portion(row, "sabqi"),
+                progress_portion(row, "manzil"),
+                unit, hifz_amount, manzil_amount
+            )
+            suggestions["last_class"] = {"id": row["last_class_id"], "date": row["last_class_date"], "day": row["last_class_day"]}
+        results.append({**student, "suggestions": suggestions})
+
+    return {"data": results}
+
+
+@app.get("/api/students/{student_id}/suggested-portions")
+def get_suggested_portions(
+    student_id: int,
+    unit: str = "ayahs",
+    hifz_amount: Optional[int] = None,
+    manzil_amount: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get suggested portions for a student based on their last class
+    (read from the student's memorization cursor).
+
+    Logic:
+    - Hifz: Continue from where they left off (next surah/ayah after last hifz)
+    - Sabqi: Last class's Hifz becomes this class's Sabqi
+    - Manzil: Continue cycling through older portions
+
+    Sizing (unit):
+    - ayahs (default): hifz_amount ayahs (10), manzil_amount surahs (3)
+    - pages: hifz_amount pages (1), manzil_amount pages (20)
+    - lines: hifz_amount Mushaf lines (7), manzil_amount pages (20)
+
+    Every suggestion includes its workload (ayahs, words, lines, pages).
+
+    Returns suggested start_surah, end_surah, start_ayah, end_ayah for each type.
+    """
+    # Only teachers can get suggestions
+    is_teacher = current_user.get("is_verified", False)
+    if not is_teacher:
+        raise HTTPException(status_code=403, detail="Only teachers can get suggestions")
+
+    if unit not in PORTION_DEFAULTS:
+        raise HTTPException(status_code=400, detail=f"unit must be one of: {', '.join(PORTION_DEFAULTS)}")
+
+    conn = get_app_db()
+    cursor = conn.execute("SELECT * FROM student_progress WHERE student_id = ?", (student_id,))
+    progress = cursor.fetchone()
+    conn.close()
+
+    if not progress or progress["last_class_id"] is None:
+        return default_portion_suggestions()
+
+    progress = progress_to_dict(progress)
+    suggestions = build_portion_suggestions(
+        get_quran_index(), progress["hifz"], progress["sabqi"], progress["manzil"],
+        unit, hifz_amount, manzil_amount
+    )
+    suggestions["last_class"] = progress["last_class"]
     return suggestions
 
 
+# ============ LIVE EVENTS ============
+
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+def student_audience(conn, student_id: int) -> list:
+    """A student plus every teacher with them in their roster"""
+    cursor = conn.execute(
+        "SELECT teacher_id FROM teacher_student_relationships WHERE student_id = ?", (student_id,)
+    )
+    return [student_id] + [row["teacher_id"] for row in cursor.fetchall()]
+
+
+def publish_student_event(conn, student_id: int, event_type: str, data: dict) -> None:
+    """Push an event to a student and their teachers (no queries when nobody is connected)"""
+    if not event_broker.has_subscribers():
+        return
+    event_broker.publish(student_audience(conn, student_id), event_type, {"student_id": student_id, **data})
+
+
+def score_audience(conn, student_id: int, class_id: int) -> list:
+    """Who may see a test's scores: the student's teachers, plus the student once the class is published"""
+    audience = student_audience(conn, student_id)
+    cursor = conn.execute("SELECT is_published FROM classes WHERE id = ?", (class_id,))
+    row = cursor.fetchone()
+    return audience if row and row["is_published"] else audience[1:]
+
+
+def publish_test_update(conn, test, **data) -> None:
+    """Push a test's running deductions (plus any extra fields) to whoever may see its scores"""
+    if not event_broker.has_subscribers():
+        return
+    cursor = conn.execute(
+        "SELECT COALESCE(SUM(points_deducted), 0) FROM test_mistakes WHERE test_id = ?", (test["id"],)
+    )
+    event_broker.publish(score_audience(conn, test["student_id"], test["class_id"]), "test.updated", {
+        "student_id": test["student_id"],
+        "test_id": test["id"],
+        "class_id": test["class_id"],
+        "total_deductions": cursor.fetchone()[0],
+        **data
+    })
+
+
+@app.get("/api/events")
+async def stream_events(request: Request, current_user: dict = Depends(get_stream_user)):
+    """Server-Sent Events stream of live updates for the current user.
+
+    Auth via Authorization header or ?access_token= (EventSource cannot send headers).
+    Events: mistake.added, mistake.removed, class.published, test.updated;
+    resync means events were dropped and the client should refetch.
+    """
+    user_id = int(current_user["sub"])
+
+    async def stream():
+        subscription = event_broker.subscribe(user_id)
+        try:
+            yield "event: ready\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield format_comment("keepalive")
+                    continue
+                yield frame
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ============ MISTAKES ENDPOINTS ============
 
+# Add a mistake or bump its count in one statement (see migrate_mistakes_unique_key)
+MISTAKE_UPSERT_SQL = """
+    INSERT INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, char_index, error_count)
+    VALUES (?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT (student_id, surah_number, ayah_number, word_index, COALESCE(char_index, -1))
+    DO UPDATE SET error_count = error_count + 1
+    RETURNING id, error_count
+"""
+
+def mistakes_cursor(conn) -> int:
+    """Latest mistake change sequence (read before the rows, so nothing is skipped)"""
+    cursor = conn.execute("SELECT value FROM change_sequences WHERE name = 'mistakes'")
+    row = cursor.fetchone()
+    return row["value"] if row else 0
+
+
+# Deletions stay visible to incremental syncs for this long; older tombstones
+# are pruned on startup and at most once per TOMBSTONE_PRUNE_INTERVAL by sync pulls
+TOMBSTONE_RETENTION_DAYS = 90
+TOMBSTONE_PRUNE_INTERVAL = timedelta(days=1)
+# (table, time column, change sequence its change_seq comes from)
+TOMBSTONE_TABLES = [
+    ("class_tombstones", "deleted_at", "classes"),
+    ("mistake_tombstones", "deleted_at", "mistakes"),
+    ("roster_tombstones", "removed_at", "mistakes"),
+]
+tombstones_pruned_at = None
+tombstone_prune_lock = threading.Lock()
+
+
+def prune_tombstones(conn) -> None:
+    """Drop tombstones older than TOMBSTONE_RETENTION_DAYS and raise the sync horizons past them"""
+    global tombstones_pruned_at
+    for table, time_column, sequence in TOMBSTONE_TABLES:
+        cursor = conn.execute(
+            f"SELECT MAX(change_seq) FROM {table} WHERE {time_column} < datetime('now', ?)",
+            (f"-{TOMBSTONE_RETENTION_DAYS} days",)
+        )
+        horizon = cursor.fetchone()[0]
+        if horizon is None:
+            continue
+        conn.execute(f"DELETE FROM {table} WHERE change_seq <= ?", (horizon,))
+        conn.execute(
+            "UPDATE sync_horizons SET change_seq = MAX(change_seq, ?) WHERE name = ?", (horizon, sequence)
+        )
+    conn.commit()
+    tombstones_pruned_at = datetime.now()
+
+
+def prune_tombstones_if_due(conn) -> None:
+    with tombstone_prune_lock:
+        if tombstones_pruned_at is not None and datetime.now() - tombstones_pruned_at < TOMBSTONE_PRUNE_INTERVAL:
+            return
+        prune_tombstones(conn)
+
+
+def sync_horizons(conn) -> tuple:
+    """(classes, mistakes): cursors below these may have missed pruned deletions"""
+    cursor = conn.execute("SELECT name, change_seq FROM sync_horizons")
+    values = {row["name"]: row["change_seq"] for row in cursor.fetchall()}
+    return values.get("classes", 0), values.get("mistakes", 0)
+
+
+def usable_mistakes_since(conn, since: Optional[int]) -> Optional[int]:
+    """since, or None (answer with everything) if tombstones after it may have been pruned"""
+    if since is not None and since < sync_horizons(conn)[1]:
+        return None
+    return since
+
+
+def deleted_mistakes_since(conn, student_id: int, since: int, surah: Optional[int] = None) -> list:
+    """Tombstones of a student's mistakes deleted after a cursor"""
+    query = """
+        SELECT mistake_id AS id, surah_number, ayah_number, word_index, char_index, change_seq
+        FROM mistake_tombstones
+        WHERE student_id = ? AND change_seq > ?
+    """
+    params = [student_id, since]
+    if surah:
+        query += " AND surah_number = ?"
+        params.append(surah)
+    cursor = conn.execute(query + " ORDER BY change_seq", params)
+    return [dict(row) for row in cursor.fetchall()]
+
+
 @app.get("/api/mistakes")
 def get_all_mistakes(
     surah: Optional[int] = None,
     student_id: Optional[int] = None,
+    since: Optional[int] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Get mistakes filtered by user role:
     - Teacher: can view any student's mistakes (pass student_id)
     - Student: can only view own mistakes
+
+    The response carries a change cursor. With ?since=<cursor> only mistakes
+    added or changed after it are returned, plus `deleted` tombstones. A cursor
+    older than the tombstone retention gets every mistake and no `deleted`,
+    as if since had not been sent.
     """
     conn = get_app_db()
     user_id = int(current_user["sub"])
@@ -1145,35 +2647,213 @@ def get_all_mistakes(
         # Student can only see own mistakes
         target_student_id = user_id
 
-    # Build query
-    if target_student_id:
-        if surah:
-            cursor = conn.execute(
-                "SELECT * FROM mistakes WHERE student_id = ? AND surah_number = ? ORDER BY ayah_number, word_index",
-                (target_student_id, surah)
-            )
-        else:
-            cursor = conn.execute(
-                "SELECT * FROM mistakes WHERE student_id = ? ORDER BY surah_number, ayah_number, word_index",
-                (target_student_id,)
-            )
-    else:
+    if not target_student_id:
         # Teacher didn't specify student - return empty for now
         conn.close()
         return {"data": []}
 
+    # Build query
+    change_cursor = mistakes_cursor(conn)
+    since = usable_mistakes_since(conn, since)
+    query = "SELECT * FROM mistakes WHERE student_id = ?"
+    params = [target_student_id]
+    if surah:
+        query += " AND surah_number = ?"
+        params.append(surah)
+    if since is not None:
+        query += " AND change_seq > ?"
+        params.append(since)
+    cursor = conn.execute(query + " ORDER BY surah_number, ayah_number, word_index", params)
+
     mistakes = [dict(row) for row in cursor.fetchall()]
+    response = {"data": mistakes, "cursor": change_cursor}
+    if since is not None:
+        response["deleted"] = deleted_mistakes_since(conn, target_student_id, since, surah)
     conn.close()
-    return {"data": mistakes}
+    return response
+
+
+@app.get("/api/mistakes/page/{page_number}")
+def get_page_mistakes(
+    page_number: int,
+    student_id: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get one student's mistakes on a single Mushaf page (for the page renderer).
+
+    The page's word span comes from the Quran index, so this is one range scan
+    over the student's mistakes in Mushaf order.
+    - Teacher: pass student_id (student in roster)
+    - Student: own mistakes
+    """
+    if page_number < 1 or page_number > 604:
+        raise HTTPException(status_code=404, detail="Page not found (must be 1-604)")
+
+    is_teacher = current_user.get("is_verified", False)
+    target_student_id = student_id if is_teacher else int(current_user["sub"])
+    if not target_student_id:
+        return {"data": [], "page": page_number}
+
+    first_word, next_page_word = get_quran_index().page_word_bounds(page_number)
+
+    conn = get_app_db()
+    verify_student_access(conn, current_user, target_student_id)
+    query = """
+        SELECT * FROM mistakes
+        WHERE student_id = ? AND (surah_number, ayah_number, word_index) >= (?, ?, ?)
+    """
+    params = [target_student_id, *first_word]
+    if next_page_word:
+        query += " AND (surah_number, ayah_number, word_index) < (?, ?, ?)"
+        params.extend(next_page_word)
+    query += " ORDER BY surah_number, ayah_number, word_index"
+    cursor = conn.execute(query, params)
+
+    mistakes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return {"data": mistakes, "page": page_number}
+
+
+def encode_id_runs(ids: list) -> list:
+    """Run-length form of sorted unique ids: [gap, length, gap, length, ...],
+    each gap counted from the end of the previous run (the first from 0)"""
+    runs = []
+    previous_end = 0
+    run_start = None
+    for position, word_id in enumerate(ids):
+        if run_start is None:
+            run_start = word_id
+        if position + 1 == len(ids) or ids[position + 1] != word_id + 1:
+            runs.extend((run_start - previous_end, word_id - run_start + 1))
+            previous_end = word_id + 1
+            run_start = None
+    return runs
+
+
+@app.get("/api/mistakes/overlay")
+def get_mistake_overlay(
+    student_id: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a student's whole mistake map keyed by QPC word id, in a few KB.
+
+    - runs: mistaken word ids as [gap, length, ...] runs (see encode_id_runs)
+    - counts: error count per mistaken word, in word id order (character-level
+      mistakes count towards their word)
+    - Teacher: pass student_id (student in roster); Student: own mistakes
+    """
+    is_teacher = current_user.get("is_verified", False)
+    target_student_id = student_id if is_teacher else int(current_user["sub"])
+    index = get_quran_index()
+    if not target_student_id:
+        return {"data": {"max_word_id": index.max_word_id, "words": 0, "runs": [], "counts": []}}
+
+    conn = get_app_db()
+    verify_student_access(conn, current_user, target_student_id)
+    cursor = conn.execute(
+        """
+        SELECT surah_number, ayah_number, word_index, SUM(error_count) AS error_count
+        FROM mistakes
+        WHERE student_id = ?
+        GROUP BY surah_number, ayah_number, word_index
+        """,
+        (target_student_id,)
+    )
+    word_counts = {}
+    for row in cursor.fetchall():
+        word_id = index.word_id(row["surah_number"], row["ayah_number"], row["word_index"])
+        if word_id is not None:
+            word_counts[word_id] = row["error_count"] or 1
+    conn.close()
+
+    word_ids = sorted(word_counts)
+    return {"data": {
+        "max_word_id": index.max_word_id,
+        "words": len(word_ids),
+        "runs": encode_id_runs(word_ids),
+        "counts": [word_counts[word_id] for word_id in word_ids]
+    }}
+
+
+@app.get("/api/mistakes/students")
+def get_students_with_mistakes_at(
+    surah: int,
+    ayah: int,
+    end_ayah: Optional[int] = None,
+    word_index: Optional[int] = None,
+    current_user: dict = Depends(get_current_verified_user)
+):
+    """Which roster students have made mistakes at a word, an ayah or an ayah range (Teacher only)
+
+    Served by the (surah, ayah, word, student) position index, so the cost
+    depends on the mistakes at that position, not on the students' histories.
+    Students are ordered by total errors there, most first.
+    """
+    teacher_id = int(current_user["sub"])
+    end_ayah = end_ayah or ayah
+    if end_ayah < ayah:
+        raise HTTPException(status_code=400, detail="end_ayah must not be before ayah")
+
+    query = """
+        SELECT m.student_id, u.student_id AS student_code, u.first_name, u.last_name,
+               m.ayah_number, m.word_index, m.word_text, m.char_index, m.error_count
+        FROM mistakes m
+        JOIN teacher_student_relationships tsr ON tsr.student_id = m.student_id AND tsr.teacher_id = ?
+        JOIN users u ON u.id = m.student_id
+        WHERE m.surah_number = ? AND m.ayah_number BETWEEN ? AND ?
+    """
+    params = [teacher_id, surah, ayah, end_ayah]
+    if word_index is not None:
+        query += " AND m.word_index = ?"
+        params.append(word_index)
+    query += " ORDER BY m.ayah_number, m.word_index, m.char_index"
+
+    conn = get_app_db()
+    cursor = conn.execute(query, params)
+
+    students = {}
+    for row in cursor.fetchall():
+        student = students.get(row["student_id"])
+        if student is None:
+            student = students[row["student_id"]] = {
+                "id": row["student_id"],
+                "student_id": row["student_code"],
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+                "error_count": 0,
+                "mistakes": []
+            }
+        student["error_count"] += row["error_count"]
+        student["mistakes"].append({
+            "ayah_number": row["ayah_number"],
+            "word_index": row["word_index"],
+            "word_text": row["word_text"],
+            "char_index": row["char_index"],
+            "error_count": row["error_count"]
+        })
+    conn.close()
+
+    ranked = sorted(students.values(), key=lambda student: -student["error_count"])
+    return {"data": ranked, "surah": surah, "ayah": ayah, "end_ayah": end_ayah, "word_index": word_index}
 
 
 @app.get("/api/mistakes/with-occurrences")
 def get_mistakes_with_occurrences(
     surah: Optional[int] = None,
     student_id: Optional[int] = None,
+    occurrence_limit: Optional[int] = None,
+    since: Optional[int] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get mistakes with class occurrence info, filtered by user role"""
+    """Get mistakes with class occurrence info, filtered by user role.
+
+    Two queries whatever the history size: the mistakes, then all their
+    occurrences ordered per mistake. occurrence_limit keeps only the most
+    recent N occurrences per mistake. since works as on /api/mistakes.
+    """
+    if occurrence_limit is not None and occurrence_limit < 1:
+        raise HTTPException(status_code=400, detail="occurrence_limit must be at least 1")
+
     conn = get_app_db()
     user_id = int(current_user["sub"])
     is_teacher = current_user.get("is_verified", False)
@@ -1196,39 +2876,54 @@ def get_mistakes_with_occurrences(
         conn.close()
         return {"data": []}
 
-    # Get mistakes
+    change_cursor = mistakes_cursor(conn)
+    since = usable_mistakes_since(conn, since)
+    filters = "m.student_id = ?"
+    params = [target_student_id]
     if surah:
-        cursor = conn.execute(
-            "SELECT * FROM mistakes WHERE student_id = ? AND surah_number = ? ORDER BY ayah_number, word_index",
-            (target_student_id, surah)
-        )
-    else:
-        cursor = conn.execute(
-            "SELECT * FROM mistakes WHERE student_id = ? ORDER BY surah_number, ayah_number, word_index",
-            (target_student_id,)
-        )
-
+        filters += " AND m.surah_number = ?"
+        params.append(surah)
+    if since is not None:
+        filters += " AND m.change_seq > ?"
+        params.append(since)
+
+    # Mistakes in Mushaf order, then every occurrence of those mistakes (newest class first)
+    # in a second pass. The inner join skips occurrences whose class was deleted.
+    cursor = conn.execute(
+        f"SELECT m.* FROM mistakes m WHERE {filters} ORDER BY surah_number, ayah_number, word_index, id",
+        params
+    )
     mistakes = [dict(row) for row in cursor.fetchall()]
-
-    # For each mistake, get its occurrences with class info
+    occurrences_by_mistake = {}
     for mistake in mistakes:
-        cursor = conn.execute(
-            """
-            SELECT mo.class_id, mo.occurred_at, c.date, c.day
-            FROM mistake_occurrences mo
-            JOIN classes c ON mo.class_id = c.id
-            WHERE mo.mistake_id = ?
-            ORDER BY c.date DESC
-            """,
-            (mistake["id"],)
-        )
-        mistake["occurrences"] = [
-            {"class_id": row[0], "occurred_at": row[1], "class_date": row[2], "class_day": row[3]}
-            for row in cursor.fetchall()
-        ]
+        mistake["occurrences"] = occurrences_by_mistake[mistake["id"]] = []
 
+    cursor = conn.execute(
+        f"""
+        SELECT mo.mistake_id, mo.class_id, mo.occurred_at, c.date, c.day
+        FROM mistakes m
+        JOIN mistake_occurrences mo ON mo.mistake_id = m.id
+        JOIN classes c ON mo.class_id = c.id
+        WHERE {filters}
+        ORDER BY mo.mistake_id, c.date DESC, mo.id DESC
+        """,
+        params
+    )
+    for mistake_id, class_id, occurred_at, class_date, class_day in cursor:
+        occurrences = occurrences_by_mistake[mistake_id]
+        if occurrence_limit is None or len(occurrences) < occurrence_limit:
+            occurrences.append({
+                "class_id": class_id,
+                "occurred_at": occurred_at,
+                "class_date": class_date,
+                "class_day": class_day
+            })
+
+    response = {"data": mistakes, "cursor": change_cursor}
+    if since is not None:
+        response["deleted"] = deleted_mistakes_since(conn, target_student_id, since, surah)
     conn.close()
-    return {"data": mistakes}
+    return response
 
 
 @app.post("/api/mistakes")
@@ -1267,35 +2962,12 @@ def add_or_increment_mistake(data: MistakeCreate, current_user: dict = Depends(g
             # Student marking their own mistake
             student_id = user_id
 
-    # Check if mistake exists for this student (include student_id and char_index in check)
-    if data.char_index is not None:
-        cursor = conn.execute(
-            "SELECT id, error_count FROM mistakes WHERE student_id = ? AND surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index = ?",
-            (student_id, data.surah_number, data.ayah_number, data.word_index, data.char_index)
-        )
-    else:
-        cursor = conn.execute(
-            "SELECT id, error_count FROM mistakes WHERE student_id = ? AND surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index IS NULL",
-            (student_id, data.surah_number, data.ayah_number, data.word_index)
-        )
-    existing = cursor.fetchone()
-
-    if existing:
-        # Mistake exists - increment count
-        mistake_id = existing["id"]
-        conn.execute(
-            "UPDATE mistakes SET error_count = error_count + 1 WHERE id = ?",
-            (mistake_id,)
-        )
-        new_count = existing["error_count"] + 1
-    else:
-        # Create new mistake with student_id
-        cursor = conn.execute(
-            "INSERT INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, char_index, error_count) VALUES (?, ?, ?, ?, ?, ?, 1)",
-            (student_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index)
-        )
-        mistake_id = cursor.lastrowid
-        new_count = 1
+    # Create the mistake or increment its count atomically
+    cursor = conn.execute(
+        MISTAKE_UPSERT_SQL,
+        (student_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index)
+    )
+    mistake_id, new_count = cursor.fetchone()
 
     # Record this occurrence (only if class_id is provided)
     if data.class_id:
@@ -1305,7 +2977,18 @@ def add_or_increment_mistake(data: MistakeCreate, current_user: dict = Depends(g
         )
 
     conn.commit()
+    publish_student_event(conn, student_id, "mistake.added", {
+        "mistake_id": mistake_id,
+        "surah_number": data.surah_number,
+        "ayah_number": data.ayah_number,
+        "word_index": data.word_index,
+        "char_index": data.char_index,
+        "error_count": new_count,
+        "class_id": data.class_id
+    })
     conn.close()
+    heatmap_cache.invalidate([student_id])
+    data_versions.bump([student_id])
     return {"id": mistake_id, "error_count": new_count, "char_index": data.char_index, "class_id": data.class_id, "student_id": data.student_id}
 
 
@@ -1360,83 +3043,323 @@ def decrement_or_delete_mistake(mistake_id: int, current_user: dict = Depends(ge
         new_count = existing["error_count"] - 1
 
     conn.commit()
+    publish_student_event(conn, existing["student_id"], "mistake.removed", {
+        "mistake_id": mistake_id, "error_count": new_count
+    })
     conn.close()
+    heatmap_cache.invalidate([existing["student_id"]])
+    data_versions.bump([existing["student_id"]])
     return {"message": message, "error_count": new_count}
 
 
-# ============ TEST ENDPOINTS ============
+# ============ SCORING RUBRICS ============
+
+def load_rubric(conn, rubric_id: Optional[int]) -> ScoringRubric:
+    """A rubric version by id (Standard if missing)"""
+    row = None
+    if rubric_id is not None:
+        cursor = conn.execute("SELECT * FROM scoring_rubrics WHERE id = ?", (rubric_id,))
+        row = cursor.fetchone()
+    if not row:
+        cursor = conn.execute("SELECT * FROM scoring_rubrics WHERE teacher_id IS NULL ORDER BY version LIMIT 1")
+        row = cursor.fetchone()
+    return ScoringRubric.from_row(row) if row else STANDARD_RUBRIC
+
+
+def current_rubric(conn, teacher_id: int) -> ScoringRubric:
+    """The teacher's latest rubric version, or Standard if they never defined one"""
+    cursor = conn.execute("""
+        SELECT * FROM scoring_rubrics
+        WHERE teacher_id = ? OR teacher_id IS NULL
+        ORDER BY teacher_id IS NULL, version DESC
+        LIMIT 1
+    """, (teacher_id,))
+    row = cursor.fetchone()
+    return ScoringRubric.from_row(row) if row else STANDARD_RUBRIC
+
 
-def calculate_points_deducted(previous_error_count: int, is_tanbeeh: bool = False) -> float:
+def rescore_tests(conn, rubric: ScoringRubric, teacher_id: int, test_id: Optional[int] = None) -> int:
+    """Score the teacher's completed tests (or one of them) under a rubric into test_scores.
+
+    One grouped INSERT ... SELECT over test_mistakes of completed questions,
+    whatever the number of tests. Returns the number of tests scored.
     """
-    Calculate points to deduct based on mistake type and history.
+    deduction, deduction_params = rubric.deduction_sql("tm")
+    filters = ["t.status = 'completed'", "c.teacher_id = ?"]
+    params = [teacher_id]
+    if test_id is not None:
+        filters.append("t.id = ?")
+        params.append(test_id)
+
+    cursor = conn.execute(f"""
+        INSERT INTO test_scores (test_id, rubric_id, total_deductions, total_score, max_score, computed_at)
+        SELECT test_id, ?, deductions, MAX(0, ? - deductions), ?, ?
+        FROM (
+            SELECT t.id AS test_id, COALESCE(SUM({deduction}), 0) AS deductions
+            FROM tests t
+            JOIN classes c ON c.id = t.class_id
+            LEFT JOIN test_questions q ON q.test_id = t.id AND q.status = 'completed'
+            LEFT JOIN test_mistakes tm ON tm.question_id = q.id
+            WHERE {" AND ".join(filters)}
+            GROUP BY t.id
+        )
+        WHERE true
+        ON CONFLICT (test_id, rubric_id) DO UPDATE SET
+            total_deductions = excluded.total_deductions,
+            total_score = excluded.total_score,
+            max_score = excluded.max_score,
+            computed_at = excluded.computed_at
+    """, (rubric.id, rubric.max_score, rubric.max_score, datetime.now().isoformat(), *deduction_params, *params))
+    return cursor.rowcount
+
+
+@app.get("/api/rubrics")
+def list_rubrics(current_user: dict = Depends(get_current_verified_user)):
+    """Standard rubric and all of the teacher's rubric versions (Teacher only)"""
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
+
+    cursor = conn.execute("""
+        SELECT * FROM scoring_rubrics
+        WHERE teacher_id = ? OR teacher_id IS NULL
+        ORDER BY teacher_id IS NOT NULL, version
+    """, (teacher_id,))
+    rubrics = [ScoringRubric.from_row(row).to_dict() for row in cursor.fetchall()]
+    current_id = current_rubric(conn, teacher_id).id
 
-    Tanbeeh (تنبيه) - Teacher warning, student self-corrected:
-    - Always 0.5 points regardless of history
+    conn.close()
+    return {"data": rubrics, "current_id": current_id}
+
+
+@app.post("/api/rubrics")
+def create_rubric(data: RubricCreate, current_user: dict = Depends(get_current_verified_user)):
+    """Create the teacher's next rubric version; tests started from now on use it (Teacher only)"""
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
+
+    cursor = conn.execute("""
+        INSERT INTO scoring_rubrics (teacher_id, version, name, tanbeeh_points, mistake_points, repeat_points, max_mistake_points, max_score)
+        SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?, ?, ?, ?
+        FROM scoring_rubrics WHERE teacher_id = ?
+    """, (teacher_id, data.name, data.tanbeeh_points, data.mistake_points, data.repeat_points,
+          data.max_mistake_points, data.max_score, teacher_id))
+    rubric = load_rubric(conn, cursor.lastrowid)
 
-    Full Mistake - Teacher had to correct the student:
-    - New mistake (0 previous): 1 point
-    - 1x before: 2 points
-    - 2x before: 3 points
-    - 3x before: 4 points
-    - 4x+ before: 5 points (capped)
+    conn.commit()
+    conn.close()
+    return {"data": rubric.to_dict()}
+
+
+@app.post("/api/rubrics/{rubric_id}/rescore")
+def rescore_with_rubric(rubric_id: int, current_user: dict = Depends(get_current_verified_user)):
+    """Re-score all of the teacher's completed tests under a rubric version (Teacher only).
+
+    Scores are stored per rubric in test_scores; each test's own total_score
+    (under the rubric it was taken with) is left as is.
     """
-    if is_tanbeeh:
-        return 0.5
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
 
-    # Full mistake: base 1 point + previous count (capped at 5 total)
-    if previous_error_count >= 4:
-        return 5.0
-    else:
-        return 1.0 + float(previous_error_count)
+    cursor = conn.execute("SELECT * FROM scoring_rubrics WHERE id = ?", (rubric_id,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        raise HTTPException(status_code=404, detail="Rubric not found")
+    if row["teacher_id"] is not None and row["teacher_id"] != teacher_id:
+        conn.close()
+        raise HTTPException(status_code=403, detail="Not authorized")
 
+    rubric = ScoringRubric.from_row(row)
+    tests_scored = rescore_tests(conn, rubric, teacher_id)
 
-@app.get("/api/tests/{test_id}")
-def get_test(test_id: int, current_user: dict = Depends(get_current_verified_user)):
-    """Get a test with its questions and current state (Teacher only)"""
+    conn.commit()
+    conn.close()
+    return {"rubric_id": rubric.id, "version": rubric.version, "tests_scored": tests_scored}
+
+
+@app.get("/api/tests/{test_id}/scores")
+def get_test_scores(test_id: int, current_user: dict = Depends(get_current_verified_user)):
+    """A completed test's score under every rubric version it was scored with (Teacher only)"""
     teacher_id = int(current_user["sub"])
     conn = get_app_db()
 
-    # Get test and verify ownership via class
     cursor = conn.execute("""
-        SELECT t.*, c.teacher_id, c.date, c.day
-        FROM tests t
+        SELECT t.rubric_id, c.teacher_id FROM tests t
         JOIN classes c ON t.class_id = c.id
         WHERE t.id = ?
     """, (test_id,))
     test = cursor.fetchone()
-
     if not test:
         conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
-
     if test["teacher_id"] != teacher_id:
         conn.close()
         raise HTTPException(status_code=403, detail="Not authorized to access this test")
 
-    test_dict = dict(test)
-
-    # Get questions for this test
     cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE test_id = ? ORDER BY question_number
+        SELECT s.rubric_id, r.version, r.name, r.teacher_id IS NULL AS is_standard,
+               s.total_deductions, s.total_score, s.max_score, s.computed_at
+        FROM test_scores s
+        JOIN scoring_rubrics r ON r.id = s.rubric_id
+        WHERE s.test_id = ?
+        ORDER BY r.teacher_id IS NOT NULL, r.version
     """, (test_id,))
-    questions = [dict(q) for q in cursor.fetchall()]
+    scores = [dict(row) for row in cursor.fetchall()]
+
+    conn.close()
+    return {"test_id": test_id, "rubric_id": test["rubric_id"], "data": scores}
+
+
+# ============ TEST ENDPOINTS ============
+
+# Completed tests never change once no question is open: test_id -> aggregate
+# (without student, which is read fresh so profile edits show up). Least
+# recently read tests are dropped past MAX_COMPLETED_TESTS.
+MAX_COMPLETED_TESTS = 1024
+completed_tests: "OrderedDict[int, dict]" = OrderedDict()
+completed_tests_lock = threading.Lock()
 
-    # Get mistakes for each question
-    for q in questions:
+
+def forget_completed_tests(class_id: Optional[int] = None) -> None:
+    """Drop cached tests of a deleted class (or all of them)"""
+    with completed_tests_lock:
+        if class_id is None:
+            completed_tests.clear()
+            return
+        for test_id in [tid for tid, test in completed_tests.items() if test["class_id"] == class_id]:
+            del completed_tests[test_id]
+
+
+def load_test_aggregate(conn, test_id: int) -> Optional[dict]:
+    """A test with its class fields (teacher_id, date, day), student, and questions
+    each carrying their mistakes, in a constant number of queries.
+
+    Finished tests (completed, no question still open) come from the cache and
+    cost one query for the student. Returns None if the test or its class is gone.
+    """
+    with completed_tests_lock:
+        cached = completed_tests.get(test_id)
+        if cached is not None:
+            completed_tests.move_to_end(test_id)
+
+    if cached is None:
         cursor = conn.execute("""
-            SELECT * FROM test_mistakes WHERE question_id = ? ORDER BY id
-        """, (q["id"],))
-        q["mistakes"] = [dict(m) for m in cursor.fetchall()]
+            SELECT t.*, c.teacher_id, c.date, c.day
+            FROM tests t
+            JOIN classes c ON t.class_id = c.id
+            WHERE t.id = ?
+        """, (test_id,))
+        test = cursor.fetchone()
+        if not test:
+            return None
+        aggregate = dict(test)
 
-    test_dict["questions"] = questions
+        cursor = conn.execute(
+            "SELECT * FROM test_questions WHERE test_id = ? ORDER BY question_number", (test_id,)
+        )
+        questions = [dict(q) for q in cursor.fetchall()]
+        question_mistakes = {q["id"]: [] for q in questions}
+        cursor = conn.execute("SELECT * FROM test_mistakes WHERE test_id = ? ORDER BY id", (test_id,))
+        for m in cursor.fetchall():
+            if m["question_id"] in question_mistakes:
+                question_mistakes[m["question_id"]].append(dict(m))
+        for q in questions:
+            q["mistakes"] = question_mistakes[q["id"]]
+        aggregate["questions"] = questions
+
+        if aggregate["status"] == "completed" and all(q["status"] != "in_progress" for q in questions):
+            with completed_tests_lock:
+                completed_tests[test_id] = aggregate
+                completed_tests.move_to_end(test_id)
+                while len(completed_tests) > MAX_COMPLETED_TESTS:
+                    completed_tests.popitem(last=False)
+    else:
+        aggregate = cached
 
-    # Get student info
-    cursor = conn.execute("""
-        SELECT id, student_id, first_name, last_name FROM users WHERE id = ?
-    """, (test_dict["student_id"],))
+    test_dict = dict(aggregate)
+    cursor = conn.execute(
+        "SELECT id, student_id, first_name, last_name FROM users WHERE id = ?", (test_dict["student_id"],)
+    )
     student = cursor.fetchone()
     if student:
         test_dict["student"] = dict(student)
+    return test_dict
+
+
+# Tests being taken (see live_tests.py): mistake taps check and update these in
+# memory and write through the group-commit writer
+live_tests = LiveTestRegistry()
+test_writer = GroupCommitWriter(get_app_db)
+
+
+def load_live_test(test_id: int) -> Optional[LiveTest]:
+    """Load a test's owner, rubric, open questions, deductions so far and event audiences"""
+    conn = get_app_db()
+    cursor = conn.execute("""
+        SELECT t.id, t.class_id, t.student_id, t.rubric_id, c.teacher_id FROM tests t
+        JOIN classes c ON t.class_id = c.id
+        WHERE t.id = ?
+    """, (test_id,))
+    test = cursor.fetchone()
+    if not test:
+        conn.close()
+        return None
+    rubric = load_rubric(conn, test["rubric_id"])
+
+    cursor = conn.execute(
+        "SELECT id FROM test_questions WHERE test_id = ? AND status = 'in_progress'", (test_id,)
+    )
+    open_questions = {row["id"] for row in cursor.fetchall()}
+    cursor = conn.execute(
+        "SELECT question_id, SUM(points_deducted) FROM test_mistakes WHERE test_id = ? GROUP BY question_id",
+        (test_id,)
+    )
+    question_deductions = {row[0]: row[1] for row in cursor.fetchall()}
+    audience = student_audience(conn, test["student_id"])
+    scores_audience = score_audience(conn, test["student_id"], test["class_id"])
+    conn.close()
+    return LiveTest(dict(test), open_questions, question_deductions, audience, scores_audience, rubric)
+
+
+def get_live_test(test_id: int, teacher_id: int) -> LiveTest:
+    """Live state of a test owned by the teacher (404/403 otherwise)"""
+    live = live_tests.get_or_load(test_id, lambda: load_live_test(test_id))
+    if live is None:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if live.teacher_id != teacher_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return live
+
+
+def publish_live_test_event(live: LiveTest, event_type: str, data: dict) -> None:
+    if event_broker.has_subscribers():
+        event_broker.publish(live.audience, event_type, {"student_id": live.student_id, **data})
+
+
+def publish_live_test_update(live: LiveTest, total_deductions: float, question_id: int) -> None:
+    """test.updated for a tap; carries the running score, so only to live.score_audience"""
+    if event_broker.has_subscribers():
+        event_broker.publish(live.score_audience, "test.updated", {
+            "student_id": live.student_id, "test_id": live.test_id, "class_id": live.class_id,
+            "total_deductions": total_deductions, "question_id": question_id
+        })
+
+
+@app.get("/api/tests/{test_id}")
+def get_test(test_id: int, current_user: dict = Depends(get_current_verified_user)):
+    """Get a test with its questions and current state (Teacher only)"""
+    teacher_id = int(current_user["sub"])
+    conn = get_app_db()
+
+    test_dict = load_test_aggregate(conn, test_id)
+
+    if not test_dict:
+        conn.close()
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    if test_dict["teacher_id"] != teacher_id:
+        conn.close()
+        raise HTTPException(status_code=403, detail="Not authorized to access this test")
 
     conn.close()
     return {"data": test_dict}
@@ -1448,8 +3371,13 @@ def get_test_by_class(class_id: int, current_user: dict = Depends(get_current_ve
     teacher_id = int(current_user["sub"])
     conn = get_app_db()
 
-    # Verify class ownership
-    cursor = conn.execute("SELECT teacher_id, class_type FROM classes WHERE id = ?", (class_id,))
+    # Verify class ownership (and find its test)
+    cursor = conn.execute("""
+        SELECT c.teacher_id, c.class_type, t.id AS test_id
+        FROM classes c
+        LEFT JOIN tests t ON t.class_id = c.id
+        WHERE c.id = ?
+    """, (class_id,))
     cls = cursor.fetchone()
 
     if not cls:
@@ -1464,39 +3392,12 @@ def get_test_by_class(class_id: int, current_user: dict = Depends(get_current_ve
         conn.close()
         raise HTTPException(status_code=400, detail="This is not a test class")
 
-    # Get test
-    cursor = conn.execute("SELECT * FROM tests WHERE class_id = ?", (class_id,))
-    test = cursor.fetchone()
+    test_dict = load_test_aggregate(conn, cls["test_id"]) if cls["test_id"] else None
 
-    if not test:
+    if not test_dict:
         conn.close()
         raise HTTPException(status_code=404, detail="Test not found for this class")
 
-    test_dict = dict(test)
-
-    # Get questions
-    cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE test_id = ? ORDER BY question_number
-    """, (test_dict["id"],))
-    questions = [dict(q) for q in cursor.fetchall()]
-
-    # Get mistakes for each question
-    for q in questions:
-        cursor = conn.execute("""
-            SELECT * FROM test_mistakes WHERE question_id = ? ORDER BY id
-        """, (q["id"],))
-        q["mistakes"] = [dict(m) for m in cursor.fetchall()]
-
-    test_dict["questions"] = questions
-
-    # Get student info
-    cursor = conn.execute("""
-        SELECT id, student_id, first_name, last_name FROM users WHERE id = ?
-    """, (test_dict["student_id"],))
-    student = cursor.fetchone()
-    if student:
-        test_dict["student"] = dict(student)
-
     conn.close()
     return {"data": test_dict}
 
@@ -1527,11 +3428,12 @@ def start_test(test_id: int, current_user: dict = Depends(get_current_verified_u
         conn.close()
         raise HTTPException(status_code=400, detail=f"Test is already {test['status']}")
 
-    # Start the test
+    # Start the test under the teacher's current rubric
     started_at = datetime.now().isoformat()
+    rubric = current_rubric(conn, teacher_id)
     conn.execute("""
-        UPDATE tests SET status = 'in_progress', started_at = ? WHERE id = ?
-    """, (started_at, test_id))
+        UPDATE tests SET status = 'in_progress', started_at = ?, rubric_id = ? WHERE id = ?
+    """, (started_at, rubric.id, test_id))
 
     conn.commit()
     conn.close()
@@ -1572,18 +3474,26 @@ def complete_test(test_id: int, current_user: dict = Depends(get_current_verifie
     """, (test_id,))
     total_deductions = cursor.fetchone()["total_deductions"]
 
-    # Final score is 100 minus deductions, minimum 0
-    max_score = 100
-    total_score = max(0, max_score - total_deductions)
+    # Final score is the rubric's max score minus deductions, minimum 0
+    rubric = load_rubric(conn, test["rubric_id"])
+    max_score = rubric.max_score
+    total_score = rubric.score(total_deductions)
 
     # Complete the test
     completed_at = datetime.now().isoformat()
     conn.execute("""
-        UPDATE tests SET status = 'completed', completed_at = ?, total_score = ?, max_score = ?
+        UPDATE tests SET status = 'completed', completed_at = ?, total_score = ?, max_score = ?, rubric_id = ?
         WHERE id = ?
-    """, (completed_at, total_score, max_score, test_id))
+    """, (completed_at, total_score, max_score, rubric.id, test_id))
+    conn.execute("""
+        INSERT OR REPLACE INTO test_scores (test_id, rubric_id, total_deductions, total_score, max_score, computed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (test_id, rubric.id, total_deductions, total_score, max_score, completed_at))
 
     conn.commit()
+    live_tests.drop(test_id)
+    forget_test_history([test["student_id"]])
+    publish_test_update(conn, test, status="completed", total_score=total_score, max_score=max_score)
     conn.close()
     return {
         "message": "Test completed",
@@ -1644,6 +3554,7 @@ def start_question(test_id: int, data: QuestionStart, current_user: dict = Depen
 
     conn.commit()
     conn.close()
+    live_tests.drop(test_id)
     return {
         "id": question_id,
         "question_number": question_number,
@@ -1656,57 +3567,52 @@ def start_question(test_id: int, data: QuestionStart, current_user: dict = Depen
 
 @app.patch("/api/tests/{test_id}/questions/{question_id}/end")
 def end_question(test_id: int, question_id: int, data: QuestionEnd, current_user: dict = Depends(get_current_verified_user)):
-    """End a question and calculate its score"""
-    teacher_id = int(current_user["sub"])
-    conn = get_app_db()
+    """End a question and calculate its score
 
-    # Get test and verify
-    cursor = conn.execute("""
-        SELECT t.*, c.teacher_id FROM tests t
-        JOIN classes c ON t.class_id = c.id
-        WHERE t.id = ?
-    """, (test_id,))
-    test = cursor.fetchone()
+    The question is closed to new taps first, then ended through the
+    group-commit writer, so every tap queued before it is counted and any
+    tap queued after it is rejected.
+    """
+    live = get_live_test(test_id, int(current_user["sub"]))
+    with live.lock:
+        live.open_questions.discard(question_id)
 
-    if not test:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Test not found")
+    completed_at = datetime.now().isoformat()
 
-    if test["teacher_id"] != teacher_id:
-        conn.close()
-        raise HTTPException(status_code=403, detail="Not authorized")
+    def close(conn):
+        cursor = conn.execute("SELECT status FROM test_questions WHERE id = ? AND test_id = ?", (question_id, test_id))
+        question = cursor.fetchone()
 
-    # Get question
-    cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE id = ? AND test_id = ?
-    """, (question_id, test_id))
-    question = cursor.fetchone()
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
 
-    if not question:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Question not found")
+        if question["status"] != "in_progress":
+            raise HTTPException(status_code=400, detail="Question is not in progress")
 
-    if question["status"] != "in_progress":
-        conn.close()
-        raise HTTPException(status_code=400, detail="Question is not in progress")
+        # Get total deductions for this question (for display)
+        cursor = conn.execute("""
+            SELECT COALESCE(SUM(points_deducted), 0) as total_deducted
+            FROM test_mistakes WHERE question_id = ?
+        """, (question_id,))
+        total_deducted = cursor.fetchone()["total_deducted"]
 
-    # Get total deductions for this question (for display)
-    cursor = conn.execute("""
-        SELECT COALESCE(SUM(points_deducted), 0) as total_deducted
-        FROM test_mistakes WHERE question_id = ?
-    """, (question_id,))
-    total_deducted = cursor.fetchone()["total_deducted"]
+        # Complete the question - store deductions, not per-question score
+        # Final score will be calculated as 100 - total_deductions when test ends
+        conn.execute("""
+            UPDATE test_questions
+            SET status = 'completed', end_surah = ?, end_ayah = ?, points_earned = ?, points_possible = ?, completed_at = ?
+            WHERE id = ?
+        """, (data.end_surah, data.end_ayah, total_deducted, 0, completed_at, question_id))
+        return total_deducted
 
-    # Complete the question - store deductions, not per-question score
-    # Final score will be calculated as 100 - total_deductions when test ends
-    completed_at = datetime.now().isoformat()
-    conn.execute("""
-        UPDATE test_questions
-        SET status = 'completed', end_surah = ?, end_ayah = ?, points_earned = ?, points_possible = ?, completed_at = ?
-        WHERE id = ?
-    """, (data.end_surah, data.end_ayah, total_deducted, 0, completed_at, question_id))
+    try:
+        total_deducted = test_writer.run(close)
+    finally:
+        live_tests.drop(test_id)
 
-    conn.commit()
+    conn = get_app_db()
+    test = {"id": test_id, "class_id": live.class_id, "student_id": live.student_id}
+    publish_test_update(conn, test, question_id=question_id, question_status="completed")
     conn.close()
     return {
         "id": question_id,
@@ -1720,217 +3626,186 @@ def end_question(test_id: int, question_id: int, data: QuestionEnd, current_user
 
 @app.patch("/api/tests/{test_id}/questions/{question_id}/cancel")
 def cancel_question(test_id: int, question_id: int, current_user: dict = Depends(get_current_verified_user)):
-    """Cancel a question (doesn't count toward score)"""
-    teacher_id = int(current_user["sub"])
-    conn = get_app_db()
-
-    # Get test and verify
-    cursor = conn.execute("""
-        SELECT t.*, c.teacher_id FROM tests t
-        JOIN classes c ON t.class_id = c.id
-        WHERE t.id = ?
-    """, (test_id,))
-    test = cursor.fetchone()
-
-    if not test:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Test not found")
+    """Cancel a question (doesn't count toward score)
 
-    if test["teacher_id"] != teacher_id:
-        conn.close()
-        raise HTTPException(status_code=403, detail="Not authorized")
+    Closed to taps and written through the group-commit writer, like end_question.
+    """
+    live = get_live_test(test_id, int(current_user["sub"]))
+    with live.lock:
+        live.open_questions.discard(question_id)
 
-    # Get question
-    cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE id = ? AND test_id = ?
-    """, (question_id, test_id))
-    question = cursor.fetchone()
+    def cancel(conn):
+        cursor = conn.execute("SELECT status FROM test_questions WHERE id = ? AND test_id = ?", (question_id, test_id))
+        question = cursor.fetchone()
 
-    if not question:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Question not found")
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
 
-    if question["status"] != "in_progress":
-        conn.close()
-        raise HTTPException(status_code=400, detail="Question is not in progress")
+        if question["status"] != "in_progress":
+            raise HTTPException(status_code=400, detail="Question is not in progress")
 
-    # Delete mistakes for this question (don't add to global mistakes)
-    conn.execute("DELETE FROM test_mistakes WHERE question_id = ?", (question_id,))
+        # Delete mistakes for this question (don't add to global mistakes)
+        conn.execute("DELETE FROM test_mistakes WHERE question_id = ?", (question_id,))
 
-    # Mark as cancelled
-    conn.execute("""
-        UPDATE test_questions SET status = 'cancelled' WHERE id = ?
-    """, (question_id,))
+        # Mark as cancelled
+        conn.execute("""
+            UPDATE test_questions SET status = 'cancelled' WHERE id = ?
+        """, (question_id,))
 
-    conn.commit()
-    conn.close()
+    try:
+        test_writer.run(cancel)
+    finally:
+        live_tests.drop(test_id)
     return {"message": "Question cancelled", "id": question_id}
 
 
-@app.post("/api/tests/{test_id}/mistakes")
-def add_test_mistake(test_id: int, data: TestMistakeCreate, current_user: dict = Depends(get_current_verified_user)):
-    """Record a mistake during a test - also adds to global mistake history"""
-    teacher_id = int(current_user["sub"])
-    conn = get_app_db()
-
-    # Get test and verify
-    cursor = conn.execute("""
-        SELECT t.*, c.teacher_id FROM tests t
-        JOIN classes c ON t.class_id = c.id
-        WHERE t.id = ?
-    """, (test_id,))
-    test = cursor.fetchone()
-
-    if not test:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Test not found")
-
-    if test["teacher_id"] != teacher_id:
-        conn.close()
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Verify question is in progress
-    cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE id = ? AND test_id = ? AND status = 'in_progress'
-    """, (data.question_id, test_id))
-    question = cursor.fetchone()
-
-    if not question:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Question not found or not in progress")
-
-    student_id = test["student_id"]
+@app.post("/api/tests/{test_id}/mistakes")
+def add_test_mistake(test_id: int, data: TestMistakeCreate, current_user: dict = Depends(get_current_verified_user)):
+    """Record a mistake during a test - also adds to global mistake history
 
-    # Check if this mistake already exists in global mistakes for this student
-    if data.char_index is not None:
-        cursor = conn.execute("""
-            SELECT id, error_count FROM mistakes
-            WHERE student_id = ? AND surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index = ?
-        """, (student_id, data.surah_number, data.ayah_number, data.word_index, data.char_index))
-    else:
-        cursor = conn.execute("""
-            SELECT id, error_count FROM mistakes
-            WHERE student_id = ? AND surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index IS NULL
-        """, (student_id, data.surah_number, data.ayah_number, data.word_index))
+    Ownership and the open question are checked against the live test; the
+    writes go through the group-commit writer and are durable on return.
+    """
+    live = get_live_test(test_id, int(current_user["sub"]))
 
-    existing = cursor.fetchone()
+    # Verify question is in progress
+    if data.question_id not in live.open_questions:
+        raise HTTPException(status_code=400, detail="Question not found or not in progress")
 
-    if existing:
-        # This is a repeated mistake
-        mistake_id = existing["id"]
-        previous_error_count = existing["error_count"]
-        is_repeated = True
+    student_id = live.student_id
 
-        # Only increment global error count for FULL mistakes, NOT for Tanbeeh
-        # Tanbeeh = student self-corrected, so shouldn't count against them
-        if not data.is_tanbeeh:
-            conn.execute("UPDATE mistakes SET error_count = error_count + 1 WHERE id = ?", (mistake_id,))
-    else:
-        # This is a new mistake
-        previous_error_count = 0
-        is_repeated = False
+    def record(conn):
+        # The question may have been ended or cancelled while this tap was queued
+        cursor = conn.execute(
+            "SELECT 1 FROM test_questions WHERE id = ? AND test_id = ? AND status = 'in_progress'",
+            (data.question_id, test_id)
+        )
+        if not cursor.fetchone():
+            raise HTTPException(status_code=400, detail="Question not found or not in progress")
 
-        # Only create global mistake record for FULL mistakes, NOT for Tanbeeh
-        # Tanbeeh = student self-corrected, so shouldn't be highlighted on Quran page
         if not data.is_tanbeeh:
-            cursor = conn.execute("""
-                INSERT INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, char_index, error_count)
-                VALUES (?, ?, ?, ?, ?, ?, 1)
-            """, (student_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index))
-            mistake_id = cursor.lastrowid
+            # Full mistake: create the global mistake or increment it in one statement;
+            # the count before this increment is the student's history for scoring
+            cursor = conn.execute(
+                MISTAKE_UPSERT_SQL,
+                (student_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index)
+            )
+            mistake_id, error_count = cursor.fetchone()
+            previous_error_count = error_count - 1
         else:
-            mistake_id = None  # Tanbeeh doesn't create a global mistake
+            # Tanbeeh = student self-corrected: never creates or increments a global
+            # mistake (so it isn't highlighted on the Quran page), only reads history
+            cursor = conn.execute("""
+                SELECT id, error_count FROM mistakes
+                WHERE student_id = ? AND surah_number = ? AND ayah_number = ? AND word_index = ?
+                  AND COALESCE(char_index, -1) = COALESCE(?, -1)
+            """, (student_id, data.surah_number, data.ayah_number, data.word_index, data.char_index))
+            existing = cursor.fetchone()
+            mistake_id = existing["id"] if existing else None
+            previous_error_count = existing["error_count"] if existing else 0
+        is_repeated = previous_error_count > 0
 
-    # Record occurrence in the class (only for full mistakes)
-    if mistake_id is not None:
-        conn.execute("""
-            INSERT INTO mistake_occurrences (mistake_id, class_id) VALUES (?, ?)
-        """, (mistake_id, test["class_id"]))
+        # Record occurrence in the class (a tanbeeh only on a word that already has a mistake)
+        if mistake_id is not None:
+            conn.execute("""
+                INSERT INTO mistake_occurrences (mistake_id, class_id) VALUES (?, ?)
+            """, (mistake_id, live.class_id))
 
-    # Calculate points to deduct (tanbeeh = 0.5, full mistake = 1+ based on history)
-    points_deducted = calculate_points_deducted(previous_error_count, data.is_tanbeeh)
+        # Points to deduct under the test's rubric (tanbeeh flat, full mistake grows with history)
+        points_deducted = live.rubric.points(previous_error_count, data.is_tanbeeh)
 
-    # Record in test_mistakes
-    cursor = conn.execute("""
-        INSERT INTO test_mistakes (test_id, question_id, mistake_id, surah_number, ayah_number, word_index, word_text, char_index, is_tanbeeh, is_repeated, previous_error_count, points_deducted)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (test_id, data.question_id, mistake_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index, data.is_tanbeeh, is_repeated, previous_error_count, points_deducted))
-    test_mistake_id = cursor.lastrowid
+        # Record in test_mistakes
+        cursor = conn.execute("""
+            INSERT INTO test_mistakes (test_id, question_id, mistake_id, surah_number, ayah_number, word_index, word_text, char_index, is_tanbeeh, is_repeated, previous_error_count, points_deducted)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (test_id, data.question_id, mistake_id, data.surah_number, data.ayah_number, data.word_index, data.word_text, data.char_index, data.is_tanbeeh, is_repeated, previous_error_count, points_deducted))
+        return cursor.lastrowid, mistake_id, is_repeated, previous_error_count, points_deducted
 
-    conn.commit()
-    conn.close()
+    test_mistake_id, mistake_id, is_repeated, previous_error_count, points_deducted = test_writer.run(record)
+    with live.lock:
+        live.add_deduction(data.question_id, points_deducted)
+        total_deductions = live.total_deductions
+
+    if mistake_id is not None:
+        # Any recorded occurrence changes the student's stats
+        data_versions.bump([student_id])
+    if not data.is_tanbeeh:
+        heatmap_cache.invalidate([student_id])
+        publish_live_test_event(live, "mistake.added", {
+            "mistake_id": mistake_id,
+            "surah_number": data.surah_number,
+            "ayah_number": data.ayah_number,
+            "word_index": data.word_index,
+            "char_index": data.char_index,
+            "error_count": previous_error_count + 1,
+            "class_id": live.class_id
+        })
+    publish_live_test_update(live, total_deductions, data.question_id)
     return {
         "id": test_mistake_id,
         "mistake_id": mistake_id,
         "is_tanbeeh": data.is_tanbeeh,
         "is_repeated": is_repeated,
         "previous_error_count": previous_error_count,
-        "points_deducted": points_deducted
+        "points_deducted": points_deducted,
+        "total_deductions": total_deductions
     }
 
 
 @app.delete("/api/tests/{test_id}/mistakes/{test_mistake_id}")
 def remove_test_mistake(test_id: int, test_mistake_id: int, current_user: dict = Depends(get_current_verified_user)):
     """Remove a mistake from the current test (also decrements global count)"""
-    teacher_id = int(current_user["sub"])
-    conn = get_app_db()
-
-    # Get test and verify
-    cursor = conn.execute("""
-        SELECT t.*, c.teacher_id FROM tests t
-        JOIN classes c ON t.class_id = c.id
-        WHERE t.id = ?
-    """, (test_id,))
-    test = cursor.fetchone()
-
-    if not test:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Test not found")
-
-    if test["teacher_id"] != teacher_id:
-        conn.close()
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Get test mistake
-    cursor = conn.execute("""
-        SELECT tm.*, tq.status as question_status FROM test_mistakes tm
-        JOIN test_questions tq ON tm.question_id = tq.id
-        WHERE tm.id = ? AND tm.test_id = ?
-    """, (test_mistake_id, test_id))
-    test_mistake = cursor.fetchone()
-
-    if not test_mistake:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Test mistake not found")
-
-    if test_mistake["question_status"] != "in_progress":
-        conn.close()
-        raise HTTPException(status_code=400, detail="Cannot remove mistake from completed question")
-
-    # Decrement global mistake count
-    mistake_id = test_mistake["mistake_id"]
-    cursor = conn.execute("SELECT error_count FROM mistakes WHERE id = ?", (mistake_id,))
-    mistake = cursor.fetchone()
-
-    if mistake:
-        if mistake["error_count"] <= 1:
-            # Delete the mistake entirely
-            conn.execute("DELETE FROM mistakes WHERE id = ?", (mistake_id,))
-        else:
-            # Decrement
-            conn.execute("UPDATE mistakes SET error_count = error_count - 1 WHERE id = ?", (mistake_id,))
+    live = get_live_test(test_id, int(current_user["sub"]))
 
-        # Delete the most recent occurrence
-        conn.execute("""
-            DELETE FROM mistake_occurrences
-            WHERE id = (SELECT id FROM mistake_occurrences WHERE mistake_id = ? ORDER BY occurred_at DESC LIMIT 1)
-        """, (mistake_id,))
-
-    # Delete test mistake
-    conn.execute("DELETE FROM test_mistakes WHERE id = ?", (test_mistake_id,))
-
-    conn.commit()
-    conn.close()
+    def remove(conn):
+        # Get test mistake
+        cursor = conn.execute("""
+            SELECT tm.question_id, tm.mistake_id, tm.points_deducted, q.status FROM test_mistakes tm
+            JOIN test_questions q ON q.id = tm.question_id
+            WHERE tm.id = ? AND tm.test_id = ?
+        """, (test_mistake_id, test_id))
+        test_mistake = cursor.fetchone()
+
+        if not test_mistake:
+            raise HTTPException(status_code=404, detail="Test mistake not found")
+
+        if test_mistake["status"] != "in_progress":
+            raise HTTPException(status_code=400, detail="Cannot remove mistake from completed question")
+
+        # Decrement global mistake count
+        mistake_id = test_mistake["mistake_id"]
+        cursor = conn.execute("SELECT error_count FROM mistakes WHERE id = ?", (mistake_id,))
+        mistake = cursor.fetchone()
+
+        if mistake:
+            if mistake["error_count"] <= 1:
+                # Delete the mistake entirely
+                conn.execute("DELETE FROM mistakes WHERE id = ?", (mistake_id,))
+            else:
+                # Decrement
+                conn.execute("UPDATE mistakes SET error_count = error_count - 1 WHERE id = ?", (mistake_id,))
+
+            # Delete the most recent occurrence
+            conn.execute("""
+                DELETE FROM mistake_occurrences
+                WHERE id = (SELECT id FROM mistake_occurrences WHERE mistake_id = ? ORDER BY occurred_at DESC LIMIT 1)
+            """, (mistake_id,))
+
+        # Delete test mistake
+        conn.execute("DELETE FROM test_mistakes WHERE id = ?", (test_mistake_id,))
+        remaining = max(mistake["error_count"] - 1, 0) if mistake else None
+        return test_mistake["question_id"], mistake_id, remaining, test_mistake["points_deducted"]
+
+    question_id, mistake_id, remaining, points_deducted = test_writer.run(remove)
+    with live.lock:
+        live.add_deduction(question_id, -points_deducted)
+        total_deductions = live.total_deductions
+
+    if remaining is not None:
+        heatmap_cache.invalidate([live.student_id])
+        data_versions.bump([live.student_id])
+        publish_live_test_event(live, "mistake.removed", {"mistake_id": mistake_id, "error_count": remaining})
+    publish_live_test_update(live, total_deductions, question_id)
     return {"message": "Test mistake removed"}
 
 
@@ -1940,50 +3815,16 @@ def get_test_results(test_id: int, current_user: dict = Depends(get_current_veri
     teacher_id = int(current_user["sub"])
     conn = get_app_db()
 
-    # Get test and verify
-    cursor = conn.execute("""
-        SELECT t.*, c.teacher_id, c.date, c.day FROM tests t
-        JOIN classes c ON t.class_id = c.id
-        WHERE t.id = ?
-    """, (test_id,))
-    test = cursor.fetchone()
+    test_dict = load_test_aggregate(conn, test_id)
 
-    if not test:
+    if not test_dict:
         conn.close()
         raise HTTPException(status_code=404, detail="Test not found")
 
-    if test["teacher_id"] != teacher_id:
+    if test_dict["teacher_id"] != teacher_id:
         conn.close()
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    test_dict = dict(test)
-
-    # Get student info
-    cursor = conn.execute("""
-        SELECT id, student_id, first_name, last_name FROM users WHERE id = ?
-    """, (test_dict["student_id"],))
-    student = cursor.fetchone()
-    if student:
-        test_dict["student"] = dict(student)
-
-    # Get questions with their mistakes
-    cursor = conn.execute("""
-        SELECT * FROM test_questions WHERE test_id = ? ORDER BY question_number
-    """, (test_id,))
-    questions = []
-    for q in cursor.fetchall():
-        q_dict = dict(q)
-
-        # Get mistakes for this question
-        cursor2 = conn.execute("""
-            SELECT * FROM test_mistakes WHERE question_id = ? ORDER BY created_at
-        """, (q_dict["id"],))
-        q_dict["mistakes"] = [dict(m) for m in cursor2.fetchall()]
-
-        questions.append(q_dict)
-
-    test_dict["questions"] = questions
-
     conn.close()
     return {"data": test_dict}
 
@@ -2022,24 +3863,105 @@ def get_test_mistakes(test_id: int, current_user: dict = Depends(get_current_ver
     return {"data": mistakes}
 
 
-# ============ STATS ENDPOINT ============
+def load_test_history(student_id: int, published_only: bool) -> dict:
+    """A student's completed tests in order, with mistake breakdown and running trends.
 
-@app.get("/api/stats")
-def get_stats(
-    role: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get dashboard statistics for the current user.
-    - role=student: stats as a student (classes attended, own mistakes)
-    - role=teacher: stats as a teacher (classes created, students' mistakes)
-    Default is based on is_verified flag.
+    One query: per-test question and mistake aggregates joined to the tests,
+    then window functions for the change since the previous test, a 3-test
+    moving average and the best score so far.
     """
     conn = get_app_db()
-    user_id = int(current_user["sub"])
-    is_teacher = current_user.get("is_verified", False)
+    cursor = conn.execute("""
+        WITH student_tests AS (
+            SELECT t.id, t.class_id, c.date, c.day, t.completed_at, t.rubric_id,
+                   t.total_score, t.max_score,
+                   100.0 * t.total_score / NULLIF(t.max_score, 0) AS percent
+            FROM tests t
+            JOIN classes c ON c.id = t.class_id
+            WHERE t.student_id = ? AND t.status = 'completed' AND (c.is_published = 1 OR NOT ?)
+        ),
+        questions AS (
+            SELECT q.test_id, COUNT(*) AS question_count
+            FROM test_questions q
+            WHERE q.test_id IN (SELECT id FROM student_tests) AND q.status = 'completed'
+            GROUP BY q.test_id
+        ),
+        test_mistake_totals AS (
+            SELECT tm.test_id,
+                   SUM(tm.is_tanbeeh) AS tanbeeh_count,
+                   SUM(NOT tm.is_tanbeeh AND NOT tm.is_repeated) AS new_count,
+                   SUM(NOT tm.is_tanbeeh AND tm.is_repeated) AS repeated_count,
+                   SUM(CASE WHEN tm.is_tanbeeh THEN tm.points_deducted ELSE 0 END) AS tanbeeh_points,
+                   SUM(CASE WHEN NOT tm.is_tanbeeh AND NOT tm.is_repeated THEN tm.points_deducted ELSE 0 END) AS new_points,
+                   SUM(CASE WHEN NOT tm.is_tanbeeh AND tm.is_repeated THEN tm.points_deducted ELSE 0 END) AS repeated_points
+            FROM test_mistakes tm
+            JOIN test_questions q ON q.id = tm.question_id AND q.status = 'completed'
+            WHERE tm.test_id IN (SELECT id FROM student_tests)
+            GROUP BY tm.test_id
+        )
+        SELECT st.id AS test_id, st.class_id, st.date, st.day, st.completed_at, st.rubric_id,
+               st.total_score, st.max_score, st.percent,
+               COALESCE(q.question_count, 0) AS question_count,
+               COALESCE(m.tanbeeh_count, 0) AS tanbeeh_count,
+               COALESCE(m.new_count, 0) AS new_count,
+               COALESCE(m.repeated_count, 0) AS repeated_count,
+               COALESCE(m.tanbeeh_points, 0) AS tanbeeh_points,
+               COALESCE(m.new_points, 0) AS new_points,
+               COALESCE(m.repeated_points, 0) AS repeated_points,
+               1.0 * m.repeated_count / NULLIF(m.new_count + m.repeated_count, 0) AS repeated_ratio,
+               ROW_NUMBER() OVER w AS test_number,
+               st.percent - LAG(st.percent) OVER w AS change,
+               AVG(st.percent) OVER (w ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) AS moving_average,
+               MAX(st.percent) OVER (w ROWS UNBOUNDED PRECEDING) AS best_so_far
+        FROM student_tests st
+        LEFT JOIN questions q ON q.test_id = st.id
+        LEFT JOIN test_mistake_totals m ON m.test_id = st.id
+        WINDOW w AS (ORDER BY st.completed_at, st.id)
+        ORDER BY st.completed_at, st.id
+    """, (student_id, published_only))
+    tests = [dict(row) for row in cursor.fetchall()]
+    conn.close()
 
-    # Determine which view
-    show_student_view = (role == "student") or (role is None and not is_teacher)
+    new_count = sum(test["new_count"] for test in tests)
+    repeated_count = sum(test["repeated_count"] for test in tests)
+    summary = {
+        "tests": len(tests),
+        "average_percent": sum(test["percent"] for test in tests) / len(tests) if tests else None,
+        "best_percent": tests[-1]["best_so_far"] if tests else None,
+        "latest_percent": tests[-1]["percent"] if tests else None,
+        "recent_average": tests[-1]["moving_average"] if tests else None,
+        "tanbeeh_count": sum(test["tanbeeh_count"] for test in tests),
+        "new_count": new_count,
+        "repeated_count": repeated_count,
+        "repeated_ratio": repeated_count / (new_count + repeated_count) if new_count + repeated_count else None,
+    }
+    return {"tests": tests, "summary": summary}
+
+
+@app.get("/api/students/{student_id}/tests/history")
+def get_student_test_history(student_id: int, current_user: dict = Depends(get_current_user)):
+    """A student's completed test scores over time.
+
+    Each test carries deductions by mistake type (tanbeeh / new / repeated),
+    the repeated-versus-new ratio, the change since the previous test, a
+    3-test moving average and the best score so far (percentages of max score).
+    Students see tests of published classes only.
+    """
+    conn = get_app_db()
+    verify_student_access(conn, current_user, student_id)
+    conn.close()
+
+    published_only = int(current_user["sub"]) == student_id
+    cache = published_test_history_cache if published_only else test_history_cache
+    history = cache.get_or_build(student_id, lambda: load_test_history(student_id, published_only))
+    return {"data": {"student_id": student_id, **history}}
+
+
+# ============ STATS ENDPOINT ============
+
+def load_dashboard_stats(user_id: int, show_student_view: bool):
+    """Dashboard statistics, plus the users whose data they were computed from"""
+    conn = get_app_db()
 
     if show_student_view:
         # STUDENT STATS - show only the user's own data as a student
@@ -2098,9 +4020,13 @@ def get_stats(
         """, (user_id,))
         top_repeated_mistakes = [dict(row) for row in cursor.fetchall()]
 
+        source_user_ids = [user_id]
+
     else:
         # TEACHER STATS - This could show aggregate stats for all students
         # For now, just return the teacher's own teaching stats
+        cursor = conn.execute("SELECT student_id FROM teacher_student_relationships WHERE teacher_id = ?", (user_id,))
+        source_user_ids = [user_id] + [row["student_id"] for row in cursor.fetchall()]
 
         # Total classes created
         cursor = conn.execute("SELECT COUNT(*) as count FROM classes WHERE teacher_id = ?", (user_id,))
@@ -2165,7 +4091,7 @@ def get_stats(
 
     conn.close()
 
-    return {
+    return source_user_ids, {
         "total_classes": total_classes,
         "total_unique_mistakes": total_unique_mistakes,
         "repeated_mistakes": repeated_mistakes,
@@ -2176,6 +4102,29 @@ def get_stats(
     }
 
 
+@app.get("/api/stats")
+def get_stats(
+    role: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get dashboard statistics for the current user.
+    - role=student: stats as a student (classes attended, own mistakes)
+    - role=teacher: stats as a teacher (classes created, students' mistakes)
+    Default is based on is_verified flag.
+
+    Served from memory until the user's (or, for teachers, a roster student's)
+    data changes; see versioned_cache.py.
+    """
+    user_id = int(current_user["sub"])
+    is_teacher = current_user.get("is_verified", False)
+
+    # Determine which view
+    show_student_view = (role == "student") or (role is None and not is_teacher)
+
+    view = "student" if show_student_view else "teacher"
+    return stats_cache.get_or_compute((user_id, view), lambda: load_dashboard_stats(user_id, show_student_view))
+
+
 # ============ SYNC ENDPOINTS ============
 
 class SyncPullRequest(BaseModel):
@@ -2203,6 +4152,7 @@ class SyncPushMistake(BaseModel):
     word_text: str
     char_index: Optional[int] = None
     error_count: int = 1
+    student_id: Optional[int] = None  # required from teachers for new mistakes; students push their own
     device_id: Optional[str] = None
     updated_at: Optional[str] = None
     is_deleted: bool = False
@@ -2214,155 +4164,467 @@ class SyncPushPayload(BaseModel):
     mistakes: list[SyncPushMistake] = []
 
 
-@app.post("/api/sync/pull")
-def sync_pull(request: SyncPullRequest):
-    """Pull all changes from server since last_sync_at"""
-    conn = get_app_db()
+def sync_sequences(conn) -> tuple:
+    """Current (classes, mistakes) change sequences"""
+    cursor = conn.execute("SELECT name, value FROM change_sequences WHERE name IN ('classes', 'mistakes')")
+    values = {row["name"]: row["value"] for row in cursor.fetchall()}
+    return values.get("classes", 0), values.get("mistakes", 0)
 
-    # Get all classes (simple sync - returns everything)
-    cursor = conn.execute(
-        "SELECT id, date, day, notes, created_at FROM classes ORDER BY id"
-    )
-    classes = []
-    for row in cursor.fetchall():
-        class_dict = dict(row)
-        class_dict["updated_at"] = class_dict.get("created_at")  # Use created_at as fallback
-        class_dict["device_id"] = None
-        # Get assignments for this class
-        assign_cursor = conn.execute(
-            "SELECT id, type, start_surah, end_surah, start_ayah, end_ayah FROM assignments WHERE class_id = ?",
-            (class_dict["id"],)
+
+def parse_sync_cursor(conn, value: Optional[str]):
+    """(classes, mistakes) sequences of a "<classes>:<mistakes>" cursor, or None for a full sync
+    (no or old-style value, or older than the tombstone retention)"""
+    try:
+        class_seq, mistake_seq = (value or "").split(":")
+        since = int(class_seq), int(mistake_seq)
+    except ValueError:
+        return None
+    class_horizon, mistake_horizon = sync_horizons(conn)
+    if since[0] < class_horizon or since[1] < mistake_horizon:
+        return None
+    return since
+
+
+def sync_pull_records(conn, user_id: int, is_teacher: bool, since):
+    """(type, payload) records of a pull: "class" and "mistake" rows changed in
+    the user's scope since the cursor, "deleted" ids (only with a cursor), then
+    "end" with the next cursor. See sync_pull for the scopes.
+
+    Everything is read in change_seq pages bounded by the sequences at the
+    start, so each row is sent at most once and anything written meanwhile
+    comes with the next pull.
+    """
+    class_upto, mistake_upto = sync_sequences(conn)
+    class_since, mistake_since = since or (0, 0)
+
+    def fetch(sql: str, owner_id: int, *upper_bound):
+        """fetch_page for change_pages; sql takes (owner_id, after, *upper_bound, limit)"""
+        return lambda after: conn.execute(sql, (owner_id, after, *upper_bound, PAGE_SIZE)).fetchall()
+
+    # Changed classes in scope; a student's class that was unpublished counts as deleted
+    if is_teacher:
+        class_pages = change_pages(fetch("""
+            SELECT id, date, day, notes, created_at, updated_at, change_seq, 1 AS visible FROM classes
+            WHERE teacher_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq LIMIT ?
+        """, user_id, class_upto), class_since)
+    else:
+        class_pages = change_pages(fetch("""
+            SELECT c.id, c.date, c.day, c.notes, c.created_at, c.updated_at, c.change_seq,
+                   c.is_published AS visible
+            FROM class_students cs
+            JOIN classes c ON c.id = cs.class_id
+            WHERE cs.student_id = ? AND c.change_seq > ? AND c.change_seq <= ? ORDER BY c.change_seq LIMIT ?
+        """, user_id, class_upto), class_since)
+    for page in class_pages:
+        classes_by_id = {}
+        for row in page:
+            class_dict = dict(row)
+            del class_dict["change_seq"]
+            if not class_dict.pop("visible"):
+                if since is not None:
+                    yield "deleted", {"table": "classes", "id": class_dict["id"]}
+                continue
+            class_dict["device_id"] = None
+            class_dict["assignments"] = []
+            classes_by_id[class_dict["id"]] = class_dict
+        if not classes_by_id:
+            continue
+
+        # Their assignments (students see shared ones and their own)
+        placeholders = ",".join("?" * len(classes_by_id))
+        cursor = conn.execute(f"""
+            SELECT class_id, id, type, start_surah, end_surah, start_ayah, end_ayah, student_id
+            FROM assignments
+            WHERE class_id IN ({placeholders}) AND (? OR student_id IS NULL OR student_id = ?)
+            ORDER BY class_id, id
+        """, (*classes_by_id, is_teacher, user_id))
+        for row in cursor.fetchall():
+            assignment = dict(row)
+            classes_by_id[assignment.pop("class_id")]["assignments"].append(assignment)
+        for class_dict in classes_by_id.values():
+            yield "class", class_dict
+
+    # Changed mistakes, student by student. A student added to the roster since
+    # the cursor has all their mistakes sent, not only the changed ones.
+    if is_teacher:
+        cursor = conn.execute(
+            "SELECT student_id, change_seq FROM teacher_student_relationships WHERE teacher_id = ? AND change_seq <= ?",
+            (user_id, mistake_upto)
         )
-        class_dict["assignments"] = [dict(a) for a in assign_cursor.fetchall()]
-        classes.append(class_dict)
+        scope = [(row["student_id"], 0 if row["change_seq"] > mistake_since else mistake_since)
+                 for row in cursor.fetchall()]
+    else:
+        scope = [(user_id, mistake_since)]
+    for student_id, student_since in scope:
+        for page in change_pages(fetch("""
+            SELECT id, student_id, surah_number, ayah_number, word_index, word_text,
+                   char_index, error_count, updated_at, change_seq
+            FROM mistakes
+            WHERE student_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq LIMIT ?
+        """, student_id, mistake_upto), student_since):
+            for row in page:
+                mistake = dict(row)
+                del mistake["change_seq"]
+                mistake["device_id"] = None
+                yield "mistake", mistake
+
+    if since is not None:
+        # Deleted classes, and classes a student was removed from (unless enrolled again)
+        if is_teacher:
+            tombstone_pages = change_pages(fetch("""
+                SELECT class_id, change_seq FROM class_tombstones
+                WHERE teacher_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq LIMIT ?
+            """, user_id, class_upto), class_since)
+        else:
+            tombstone_pages = change_pages(fetch("""
+                SELECT t.class_id, t.change_seq FROM class_tombstones t
+                WHERE t.student_id = ? AND t.change_seq > ? AND t.change_seq <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM class_students cs JOIN classes c ON c.id = cs.class_id
+                      WHERE cs.class_id = t.class_id AND cs.student_id = t.student_id AND c.is_published = 1
+                  )
+                ORDER BY t.change_seq LIMIT ?
+            """, user_id, class_upto), class_since)
+        for page in tombstone_pages:
+            for row in page:
+                yield "deleted", {"table": "classes", "id": row["class_id"]}
+
+        # Deleted mistakes of every student in scope, and of students removed
+        # from the roster (who are not back on it), whose remaining mistakes
+        # are all gone from the teacher's scope as well
+        removed = []
+        if is_teacher:
+            cursor = conn.execute("""
+                SELECT DISTINCT student_id FROM roster_tombstones
+                WHERE teacher_id = ? AND change_seq > ? AND change_seq <= ?
+                  AND student_id NOT IN (
+                      SELECT student_id FROM teacher_student_relationships WHERE teacher_id = ? AND change_seq <= ?
+                  )
+            """, (user_id, mistake_since, mistake_upto, user_id, mistake_upto))
+            removed = [row["student_id"] for row in cursor.fetchall()]
+        for student_id in [student_id for student_id, _ in scope] + removed:
+            for page in change_pages(fetch("""
+                SELECT mistake_id, change_seq FROM mistake_tombstones
+                WHERE student_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq LIMIT ?
+            """, student_id, mistake_upto), mistake_since):
+                for row in page:
+                    yield "deleted", {"table": "mistakes", "id": row["mistake_id"]}
+        for student_id in removed:
+            for page in change_pages(fetch("""
+                SELECT id, change_seq FROM mistakes
+                WHERE student_id = ? AND change_seq > ? ORDER BY change_seq LIMIT ?
+            """, student_id), 0):
+                for row in page:
+                    yield "deleted", {"table": "mistakes", "id": row["id"]}
+
+    cursor_value = f"{class_upto}:{mistake_upto}"
+    yield "end", {
+        "cursor": cursor_value,
+        "server_timestamp": cursor_value,
+        "server_time": datetime.now().isoformat(),
+        "full": since is None,
+    }
 
-    # Get all mistakes
-    cursor = conn.execute(
-        "SELECT id, surah_number, ayah_number, word_index, word_text, char_index, error_count FROM mistakes ORDER BY id"
-    )
-    mistakes = []
-    for row in cursor.fetchall():
-        m = dict(row)
-        m["updated_at"] = None
-        m["device_id"] = None
-        mistakes.append(m)
 
+@app.post("/api/sync/pull")
+def sync_pull(request: SyncPullRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    """Pull the current user's changes since the cursor in last_sync_at.
+
+    Teachers receive their own classes and their roster students' mistakes;
+    students their published classes (shared and own assignments only) and
+    their own mistakes.
+
+    last_sync_at is the `cursor` of the previous pull (also returned as
+    server_timestamp); without one (or with an old timestamp, or a cursor
+    older than the tombstone retention) everything is returned and `full` is
+    true. With one, only classes and mistakes changed since, plus under
+    `deleted` the ids that were deleted or left the user's scope since.
+
+    With `Accept: application/x-ndjson` (preferred over application/json) the
+    records are streamed as they are read (see sync_stream.py), gzip-compressed
+    if the client accepts it, and server memory stays at one page whatever the
+    size of the pull. Otherwise they are collected into one JSON object.
+    """
+    user_id = int(current_user["sub"])
+    is_teacher = current_user.get("is_verified", False)
+    # A stream is read from threadpool threads, one page at a time
+    conn = get_app_db(check_same_thread=False)
+    prune_tombstones_if_due(conn)
+    since = parse_sync_cursor(conn, request.last_sync_at)
+
+    if wants_ndjson(http_request.headers.get("accept", "")):
+        compress = accepts_gzip(http_request.headers.get("accept-encoding", ""))
+
+        def stream():
+            try:
+                yield from ndjson_chunks(sync_pull_records(conn, user_id, is_teacher, since), compress)
+            finally:
+                conn.close()
+
+        return StreamingResponse(
+            stream(),
+            media_type="application/x-ndjson",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept, Accept-Encoding"} if compress
+            else {"Vary": "Accept, Accept-Encoding"}
+        )
+
+    response = {"classes": [], "mistakes": []}
+    deleted = {"classes": set(), "mistakes": set()}
+    for record_type, payload in sync_pull_records(conn, user_id, is_teacher, since):
+        if record_type == "class":
+            response["classes"].append(payload)
+        elif record_type == "mistake":
+            response["mistakes"].append(payload)
+        elif record_type == "deleted":
+            deleted[payload["table"]].add(payload["id"])
+        else:
+            response.update(payload)
     conn.close()
 
-    # Get current server time for next sync
-    server_time = datetime.now().isoformat()
+    if since is not None:
+        response["deleted"] = {table: sorted(ids) for table, ids in deleted.items()}
+    return response
 
-    return {
-        "classes": classes,
-        "mistakes": mistakes,
-        "server_time": server_time
-    }
+
+# Staging tables for a push. TEMP tables belong to the request's connection,
+# so concurrent pushes never see each other's rows.
+SYNC_PUSH_TABLES = """
+    CREATE TEMP TABLE push_classes (
+        seq INTEGER PRIMARY KEY,  -- position in the payload
+        local_id INTEGER,
+        server_id INTEGER,
+        date TEXT,
+        day TEXT,
+        notes TEXT,
+        is_deleted BOOLEAN,
+        has_assignments BOOLEAN,
+        class_id INTEGER,  -- server class a new entry resolved to
+        created BOOLEAN DEFAULT 0  -- this entry created class_id
+    );
+    CREATE TEMP TABLE push_assignments (
+        class_seq INTEGER,
+        type TEXT,
+        start_surah INTEGER,
+        end_surah INTEGER,
+        start_ayah INTEGER,
+        end_ayah INTEGER
+    );
+    CREATE TEMP TABLE push_mistakes (
+        seq INTEGER PRIMARY KEY,
+        local_id INTEGER,
+        server_id INTEGER,
+        student_id INTEGER,
+        surah_number INTEGER,
+        ayah_number INTEGER,
+        word_index INTEGER,
+        word_text TEXT,
+        char_index INTEGER,
+        error_count INTEGER,
+        is_deleted BOOLEAN
+    );
+    CREATE TEMP TABLE push_students (student_id INTEGER PRIMARY KEY);
+"""
+
+# Resolve new class entries to the teacher's class on the same date and day
+LINK_PUSHED_CLASSES_SQL = """
+    UPDATE push_classes SET class_id = c.id
+    FROM (SELECT date, day, MIN(id) AS id FROM classes WHERE teacher_id = ? GROUP BY date, day) c
+    WHERE push_classes.server_id IS NULL AND NOT push_classes.is_deleted AND push_classes.has_assignments
+      AND push_classes.class_id IS NULL
+      AND c.date = push_classes.date AND c.day = push_classes.day
+"""
+
+
+def apply_class_push(conn, teacher_id: int) -> dict:
+    """Apply the staged push_classes to the teacher's classes; returns local_id -> server_id.
+
+    An entry with a server_id updates or deletes that class (the last entry
+    for a class wins; other teachers' classes are ignored). A new entry with
+    assignments links to the teacher's class on the same date and day, or
+    creates it, once per date and day. Progress of the students enrolled in
+    deleted or updated classes is refreshed in the same transaction.
+    """
+    conn.execute("""
+        DELETE FROM push_classes
+        WHERE server_id IS NOT NULL
+          AND (server_id NOT IN (SELECT id FROM classes WHERE teacher_id = ?)
+               OR seq NOT IN (SELECT MAX(seq) FROM push_classes WHERE server_id IS NOT NULL GROUP BY server_id))
+    """, (teacher_id,))
+
+    # Students whose latest class or its assignments may change (read before the deletes)
+    cursor = conn.execute("""
+        SELECT DISTINCT cs.student_id FROM push_classes p
+        JOIN class_students cs ON cs.class_id = p.server_id
+    """)
+    affected_students = [row["student_id"] for row in cursor.fetchall()]
+
+    deleted = "SELECT server_id FROM push_classes WHERE is_deleted"
+    conn.execute(f"DELETE FROM assignments WHERE class_id IN ({deleted})")
+    conn.execute(f"DELETE FROM class_students WHERE class_id IN ({deleted})")
+    conn.execute(f"DELETE FROM classes WHERE id IN ({deleted})")
+
+    conn.execute("""
+        UPDATE classes SET date = p.date, day = p.day, notes = p.notes
+        FROM push_classes p
+        WHERE p.server_id = classes.id AND NOT p.is_deleted
+    """)
+    conn.execute("""
+        DELETE FROM assignments
+        WHERE class_id IN (SELECT server_id FROM push_classes WHERE server_id IS NOT NULL AND NOT is_deleted)
+    """)
+
+    # New entries: link to existing classes, create the rest, then link again to pick up the new ids
+    conn.execute(LINK_PUSHED_CLASSES_SQL, (teacher_id,))
+    conn.execute("""
+        UPDATE push_classes SET created = 1
+        WHERE seq IN (
+            SELECT MIN(seq) FROM push_classes
+            WHERE server_id IS NULL AND NOT is_deleted AND has_assignments AND class_id IS NULL
+            GROUP BY date, day
+        )
+    """)
+    conn.execute("""
+        INSERT INTO classes (date, day, notes, teacher_id)
+        SELECT date, day, notes, ? FROM push_classes WHERE created ORDER BY seq
+    """, (teacher_id,))
+    conn.execute(LINK_PUSHED_CLASSES_SQL, (teacher_id,))
+
+    # Assignments of updated and created classes
+    conn.execute("""
+        INSERT INTO assignments (class_id, type, start_surah, end_surah, start_ayah, end_ayah)
+        SELECT COALESCE(p.server_id, p.class_id), a.type, a.start_surah, a.end_surah, a.start_ayah, a.end_ayah
+        FROM push_assignments a
+        JOIN push_classes p ON p.seq = a.class_seq
+        WHERE NOT p.is_deleted AND (p.server_id IS NOT NULL OR p.created)
+        ORDER BY a.rowid
+    """)
+    refresh_student_progress(conn, affected_students)
+
+    cursor = conn.execute("""
+        SELECT local_id, COALESCE(server_id, class_id) AS server_id FROM push_classes
+        WHERE local_id IS NOT NULL AND NOT is_deleted AND COALESCE(server_id, class_id) IS NOT NULL
+    """)
+    return {row["local_id"]: row["server_id"] for row in cursor.fetchall()}
+
+
+def apply_mistake_push(conn) -> dict:
+    """Apply the staged push_mistakes to the mistakes of push_students; returns local_id -> server_id.
+
+    An entry with a server_id deletes that mistake or raises its count to the
+    pushed one (ids of other students' mistakes are ignored). New entries are
+    summed per student and word, then added to the mistake already there or
+    inserted.
+    """
+    conn.execute("""
+        DELETE FROM push_mistakes
+        WHERE server_id IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM mistakes m JOIN push_students s ON s.student_id = m.student_id
+            WHERE m.id = push_mistakes.server_id
+        )
+    """)
+
+    deleted = "SELECT server_id FROM push_mistakes WHERE is_deleted"
+    conn.execute(f"DELETE FROM mistake_occurrences WHERE mistake_id IN ({deleted})")
+    conn.execute(f"DELETE FROM mistakes WHERE id IN ({deleted})")
+
+    conn.execute("""
+        UPDATE mistakes SET error_count = p.error_count
+        FROM (
+            SELECT server_id, MAX(error_count) AS error_count FROM push_mistakes
+            WHERE server_id IS NOT NULL AND NOT is_deleted
+            GROUP BY server_id
+        ) p
+        WHERE mistakes.id = p.server_id AND p.error_count > mistakes.error_count
+    """)
+
+    conn.execute("""
+        INSERT INTO mistakes (student_id, surah_number, ayah_number, word_index, word_text, char_index, error_count)
+        SELECT student_id, surah_number, ayah_number, word_index, word_text, char_index, SUM(error_count)
+        FROM push_mistakes
+        WHERE server_id IS NULL AND NOT is_deleted
+        GROUP BY student_id, surah_number, ayah_number, word_index, COALESCE(char_index, -1)
+        ORDER BY MIN(seq)
+        ON CONFLICT (student_id, surah_number, ayah_number, word_index, COALESCE(char_index, -1))
+        DO UPDATE SET error_count = error_count + excluded.error_count
+    """)
+
+    cursor = conn.execute("""
+        SELECT p.local_id, m.id AS server_id
+        FROM push_mistakes p
+        JOIN mistakes m ON m.student_id = p.student_id AND m.surah_number = p.surah_number
+            AND m.ayah_number = p.ayah_number AND m.word_index = p.word_index
+            AND COALESCE(m.char_index, -1) = COALESCE(p.char_index, -1)
+        WHERE p.server_id IS NULL AND NOT p.is_deleted AND p.local_id IS NOT NULL
+        UNION ALL
+        SELECT local_id, server_id FROM push_mistakes
+        WHERE server_id IS NOT NULL AND NOT is_deleted AND local_id IS NOT NULL
+    """)
+    return {row["local_id"]: row["server_id"] for row in cursor.fetchall()}
 
 
 @app.post("/api/sync/push")
-def sync_push(payload: SyncPushPayload):
-    """Push local changes to server - simplified without sync columns"""
-    conn = get_app_db()
+def sync_push(payload: SyncPushPayload, current_user: dict = Depends(get_current_user)):
+    """Push local changes to server.
 
-    class_id_mapping = {}  # local_id -> server_id
-    mistake_id_mapping = {}  # local_id -> server_id
-
-    # Process classes
-    for cls in payload.classes:
-        if cls.is_deleted:
-            if cls.server_id:
-                conn.execute("DELETE FROM assignments WHERE class_id = ?", (cls.server_id,))
-                conn.execute("DELETE FROM classes WHERE id = ?", (cls.server_id,))
-        elif cls.server_id:
-            # Update existing class
-            conn.execute(
-                "UPDATE classes SET date = ?, day = ?, notes = ? WHERE id = ?",
-                (cls.date, cls.day, cls.notes, cls.server_id)
-            )
-            # Delete and recreate assignments
-            conn.execute("DELETE FROM assignments WHERE class_id = ?", (cls.server_id,))
-            for assignment in cls.assignments:
-                conn.execute(
-                    "INSERT INTO assignments (class_id, type, start_surah, end_surah, start_ayah, end_ayah) VALUES (?, ?, ?, ?, ?, ?)",
-                    (cls.server_id, assignment.type, assignment.start_surah, assignment.end_surah, assignment.start_ayah, assignment.end_ayah)
-                )
-            if cls.local_id:
-                class_id_mapping[cls.local_id] = cls.server_id
-        else:
-            # Only create new class if it has assignments (skip empty classes)
-            if not cls.assignments:
-                continue
+    Only rows in the user's scope are touched: classes can only be pushed by
+    teachers and belong to them; a teacher's mistakes name a roster student
+    (student_id), a student's are their own. Server ids outside the scope
+    are treated as not existing.
 
-            # Check if class with same date already exists (prevent duplicates)
-            existing = conn.execute(
-                "SELECT id FROM classes WHERE date = ? AND day = ?",
-                (cls.date, cls.day)
-            ).fetchone()
-            if existing:
-                # Link to existing class instead of creating duplicate
-                if cls.local_id:
-                    class_id_mapping[cls.local_id] = existing["id"]
-                continue
+    The payload is staged in temp tables and applied with a fixed number of
+    set-based statements in one transaction (see apply_class_push and
+    apply_mistake_push), whatever its size.
+    """
+    user_id = int(current_user["sub"])
+    is_teacher = current_user.get("is_verified", False)
+    check_assignment_ranges([a for cls in payload.classes if not cls.is_deleted for a in cls.assignments])
+    conn = get_app_db()
 
-            # Create new class
-            cursor = conn.execute(
-                "INSERT INTO classes (date, day, notes) VALUES (?, ?, ?)",
-                (cls.date, cls.day, cls.notes)
-            )
-            new_id = cursor.lastrowid
-            if cls.local_id:
-                class_id_mapping[cls.local_id] = new_id
-            # Create assignments
-            for assignment in cls.assignments:
-                conn.execute(
-                    "INSERT INTO assignments (class_id, type, start_surah, end_surah, start_ayah, end_ayah) VALUES (?, ?, ?, ?, ?, ?)",
-                    (new_id, assignment.type, assignment.start_surah, assignment.end_surah, assignment.start_ayah, assignment.end_ayah)
-                )
+    if payload.classes and not is_teacher:
+        conn.close()
+        raise HTTPException(status_code=403, detail="Only teachers can sync classes")
+
+    if is_teacher:
+        cursor = conn.execute("SELECT student_id FROM teacher_student_relationships WHERE teacher_id = ?", (user_id,))
+        scope_students = {row["student_id"] for row in cursor.fetchall()}
+    else:
+        scope_students = {user_id}
 
-    # Process mistakes
     for mistake in payload.mistakes:
-        if mistake.is_deleted:
-            if mistake.server_id:
-                conn.execute("DELETE FROM mistake_occurrences WHERE mistake_id = ?", (mistake.server_id,))
-                conn.execute("DELETE FROM mistakes WHERE id = ?", (mistake.server_id,))
-        elif mistake.server_id:
-            # Update existing mistake
-            cursor = conn.execute("SELECT id, error_count FROM mistakes WHERE id = ?", (mistake.server_id,))
-            existing = cursor.fetchone()
-            if existing:
-                new_count = max(existing["error_count"], mistake.error_count)
-                conn.execute("UPDATE mistakes SET error_count = ? WHERE id = ?", (new_count, mistake.server_id))
-            if mistake.local_id:
-                mistake_id_mapping[mistake.local_id] = mistake.server_id
-        else:
-            # Check if mistake already exists by location
-            if mistake.char_index is not None:
-                cursor = conn.execute(
-                    "SELECT id, error_count FROM mistakes WHERE surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index = ?",
-                    (mistake.surah_number, mistake.ayah_number, mistake.word_index, mistake.char_index)
-                )
-            else:
-                cursor = conn.execute(
-                    "SELECT id, error_count FROM mistakes WHERE surah_number = ? AND ayah_number = ? AND word_index = ? AND char_index IS NULL",
-                    (mistake.surah_number, mistake.ayah_number, mistake.word_index)
-                )
-            existing = cursor.fetchone()
+        if mistake.student_id is None and is_teacher and not mistake.server_id:
+            conn.close()
+            raise HTTPException(status_code=400, detail="student_id is required for new mistakes")
+        if mistake.student_id is not None and mistake.student_id not in scope_students:
+            conn.close()
+            raise HTTPException(status_code=403, detail="Student not in your roster")
 
-            if existing:
-                new_count = existing["error_count"] + mistake.error_count
-                conn.execute("UPDATE mistakes SET error_count = ? WHERE id = ?", (new_count, existing["id"]))
-                if mistake.local_id:
-                    mistake_id_mapping[mistake.local_id] = existing["id"]
-            else:
-                cursor = conn.execute(
-                    "INSERT INTO mistakes (surah_number, ayah_number, word_index, word_text, char_index, error_count) VALUES (?, ?, ?, ?, ?, ?)",
-                    (mistake.surah_number, mistake.ayah_number, mistake.word_index, mistake.word_text, mistake.char_index, mistake.error_count)
-                )
-                if mistake.local_id:
-                    mistake_id_mapping[mistake.local_id] = cursor.lastrowid
+    conn.executescript(SYNC_PUSH_TABLES)
+    conn.executemany(
+        "INSERT INTO push_classes (seq, local_id, server_id, date, day, notes, is_deleted, has_assignments) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(seq, cls.local_id, cls.server_id, cls.date, cls.day, cls.notes, cls.is_deleted, bool(cls.assignments))
+         for seq, cls in enumerate(payload.classes)]
+    )
+    conn.executemany(
+        "INSERT INTO push_assignments (class_seq, type, start_surah, end_surah, start_ayah, end_ayah) VALUES (?, ?, ?, ?, ?, ?)",
+        [(seq, a.type, a.start_surah, a.end_surah, a.start_ayah, a.end_ayah)
+         for seq, cls in enumerate(payload.classes) for a in cls.assignments]
+    )
+    conn.executemany(
+        """INSERT INTO push_mistakes (seq, local_id, server_id, student_id, surah_number, ayah_number, word_index,
+                                      word_text, char_index, error_count, is_deleted)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(seq, m.local_id, m.server_id, m.student_id if m.student_id is not None else user_id, m.surah_number,
+          m.ayah_number, m.word_index, m.word_text, m.char_index, m.error_count, m.is_deleted)
+         for seq, m in enumerate(payload.mistakes)]
+    )
+    conn.executemany("INSERT INTO push_students (student_id) VALUES (?)", [(s,) for s in scope_students])
+
+    class_id_mapping = apply_class_push(conn, user_id) if is_teacher else {}
+    mistake_id_mapping = apply_mistake_push(conn)
 
     conn.commit()
     conn.close()
+    clear_student_caches()
 
     server_time = datetime.now().isoformat()
     return {
@@ -2387,9 +4649,13 @@ def clear_all_data():
     conn.execute("DELETE FROM refresh_tokens")
     conn.execute("DELETE FROM teacher_student_relationships")
     conn.execute("DELETE FROM users")
+    conn.execute("DELETE FROM mistake_daily_rollups")
+    conn.execute("DELETE FROM roster_daily_rollups")
+    conn.execute("DELETE FROM student_progress")
 
     conn.commit()
     conn.close()
+    clear_student_caches()
 
     return {"message": "All data cleared successfully (including users)"}
 
@@ -2479,6 +4745,7 @@ def restore_backup(request: RestoreRequest):
         conn = get_app_db()
         conn.execute("SELECT COUNT(*) FROM classes")
         conn.close()
+        clear_student_caches()
 
         return {"message": "Database restored successfully"}
     except Exception as e:
@@ -0,0 +1,309 @@
+"""
+In-memory Quran navigation tables.
+
+Built once from quran.db (surah list) and the QPC page files (word and line positions),
+then shared by every request. Every ayah gets a global ordinal in Mushaf order
+(0 = Al-Fatiha 1, 6235 = An-Nas 6), and all tables are plain lists indexed by
+that ordinal, so navigation, range sizes and page/juz/hizb lookups are O(1).
+"""
+
+import json
+from bisect import bisect_right
+from pathlib import Path
+from typing import Optional, Tuple
+
+TOTAL_PAGES = 604
+
+# First ayah of each hizb (Madani Mushaf). Juz n starts at hizb 2n - 1.
+HIZB_STARTS = [
+    (1, 1), (2, 75), (2, 142), (2, 203), (2, 253), (3, 15), (3, 93), (3, 171),
+    (4, 24), (4, 88), (4, 148), (5, 27), (5, 82), (6, 36), (6, 111), (7, 1),
+    (7, 88), (7, 171), (8, 41), (9, 34), (9, 93), (10, 26), (11, 6), (11, 84),
+    (12, 53), (13, 19), (15, 1), (16, 51), (17, 1), (17, 99), (18, 75), (20, 1),
+    (21, 1), (22, 1), (23, 1), (24, 21), (25, 21), (26, 111), (27, 56), (28, 51),
+    (29, 46), (31, 22), (33, 31), (34, 24), (36, 28), (37, 145), (39, 32), (40, 41),
+    (41, 47), (43, 24), (46, 1), (48, 18), (51, 31), (55, 1), (58, 1), (62, 1),
+    (67, 1), (72, 1), (78, 1), (87, 1),
+]
+
+
+class QuranIndex:
+    """Navigation tables over all 6,236 ayahs, keyed by global ayah ordinal"""
+
+    def __init__(self, surahs: list, pages_dir: Path):
+        # Surah metadata and the ordinal of each surah's first ayah (index 0 unused)
+        self.surahs = {s["number"]: s for s in surahs}
+        self.surah_offsets = [0] * 116
+        for number in range(1, 115):
+            self.surah_offsets[number + 1] = self.surah_offsets[number] + self.surahs[number]["numberOfAyahs"]
+        self.total_ayahs = self.surah_offsets[115]
+
+        # Per-ayah tables
+        self.ayah_surah = [0] * self.total_ayahs
+        self.ayah_number = [0] * self.total_ayahs
+        for number in range(1, 115):
+            for ayah in range(1, self.surahs[number]["numberOfAyahs"] + 1):
+                ordinal = self.surah_offsets[number] + ayah - 1
+                self.ayah_surah[ordinal] = number
+                self.ayah_number[ordinal] = ayah
+
+        self.ayah_words = [0] * self.total_ayahs
+        self.ayah_word_ids = [[] for _ in range(self.total_ayahs)]  # QPC word id by word_index
+        self.ayah_first_page = [0] * self.total_ayahs
+        self.ayah_last_page = [0] * self.total_ayahs
+
+        # Mushaf line tables. Each printed line is owned by the first ayah on it:
+        # ayah_owned_lines[i] = lines ayah i starts, ayah_carried_lines[i] = lines it
+        # shares with earlier ayahs, ayah_line_share[i] = its fraction of each line it
+        # touches (by glyph count), summed.
+        self.ayah_owned_lines = [0] * self.total_ayahs
+        self.ayah_carried_lines = [0] * self.total_ayahs
+        self.ayah_line_share = [0.0] * self.total_ayahs
+
+        # Per-page tables (index 0 unused): first and last ayah starting on each page,
+        # and the (surah, ayah, word_index) of the first word printed on it
+        self.page_first_ayah = [0] * (TOTAL_PAGES + 1)
+        self.page_last_ayah = [0] * (TOTAL_PAGES + 1)
+        self.page_first_word = [(0, 0, 0)] * (TOTAL_PAGES + 1)
+
+        for page in range(1, TOTAL_PAGES + 1):
+            with open(pages_dir / f"page_{page:03d}.json", 'r', encoding='utf-8') as f:
+                words = json.load(f)
+            ordinals = []
+            lines = {}  # line number -> {ordinal: glyphs on that line}
+            if words:
+                self.page_first_word[page] = (words[0]["s"], words[0]["a"], words[0]["p"] - 1)
+            for word in words:
+                ordinal = self.ordinal(word["s"], word["a"])
+                if not self.ayah_first_page[ordinal]:
+                    self.ayah_first_page[ordinal] = page
+                    ordinals.append(ordinal)
+                self.ayah_last_page[ordinal] = page
+                self.ayah_word_ids[ordinal].append(word["id"])
+                if word["ct"] == "word":
+                    self.ayah_words[ordinal] += 1
+                glyphs = lines.setdefault(word["l"], {})
+                glyphs[ordinal] = glyphs.get(ordinal, 0) + 1
+
+            for glyphs in lines.values():
+                owner = min(glyphs)
+                line_total = sum(glyphs.values())
+                for ordinal, count in glyphs.items():
+                    if ordinal == owner:
+                        self.ayah_owned_lines[ordinal] += 1
+                    else:
+                        self.ayah_carried_lines[ordinal] += 1
+                    self.ayah_line_share[ordinal] += count / line_total
+            self.page_first_ayah[page] = ordinals[0] if ordinals else self.page_first_ayah[page - 1]
+            self.page_last_ayah[page] = ordinals[-1] if ordinals else self.page_last_ayah[page - 1]
+
+        self.max_word_id = max(ids[-1] for ids in self.ayah_word_ids if ids)
+
+        # Prefix sums: x_prefix[i] = total of x over ayahs before ordinal i
+        self.word_prefix = [0] * (self.total_ayahs + 1)
+        self.line_prefix = [0] * (self.total_ayahs + 1)
+        self.line_share_prefix = [0.0] * (self.total_ayahs + 1)
+        for ordinal in range(self.total_ayahs):
+            self.word_prefix[ordinal + 1] = self.word_prefix[ordinal] + self.ayah_words[ordinal]
+            self.line_prefix[ordinal + 1] = self.line_prefix[ordinal] + self.ayah_owned_lines[ordinal]
+            self.line_share_prefix[ordinal + 1] = self.line_share_prefix[ordinal] + self.ayah_line_share[ordinal]
+
+        # Hizb and juz boundaries as ordinals, plus per-ayah membership
+        self.hizb_starts = [self.ordinal(s, a) for s, a in HIZB_STARTS]
+        self.juz_starts = self.hizb_starts[::2]
+        self.ayah_hizb = [bisect_right(self.hizb_starts, i) for i in range(self.total_ayahs)]
+        self.ayah_juz = [(hizb + 1) // 2 for hizb in self.ayah_hizb]
+
+        # Bitset masks (bit i = ayah ordinal i) for whole-Quran and per-juz coverage queries
+        self.all_mask = (1 << self.total_ayahs) - 1
+        juz_ends = self.juz_starts[1:] + [self.total_ayahs]
+        self.juz_masks = [
+            self.mask_between(first, last - 1) for first, last in zip(self.juz_starts, juz_ends)
+        ]
+
+    # ---- Ordinals ----
+
+    def ordinal(self, surah: int, ayah: int) -> int:
+        """Global 0-based ordinal of an ayah in Mushaf order"""
+        return self.surah_offsets[surah] + ayah - 1
+
+    def ayah_at(self, ordinal: int) -> Tuple[int, int]:
+        """(surah, ayah) for a global ordinal"""
+        return self.ayah_surah[ordinal], self.ayah_number[ordinal]
+
+    def ayah_count(self, surah: int) -> int:
+        return self.surahs[surah]["numberOfAyahs"]
+
+    def word_id(self, surah: int, ayah: int, word_index: int) -> Optional[int]:
+        """Global QPC word id of a word (word_index is 0-based), None if out of range"""
+        if not 1 <= surah <= 114 or not 1 <= ayah <= self.ayah_count(surah):
+            return None
+        ids = self.ayah_word_ids[self.ordinal(surah, ayah)]
+        return ids[word_index] if 0 <= word_index < len(ids) else None
+
+    def surah_name(self, surah: int) -> Optional[str]:
+        info = self.surahs.get(surah)
+        return info["englishName"] if info else None
+
+    # ---- Navigation ----
+
+    def next_ayah(self, surah: int, ayah: int) -> Optional[Tuple[int, int]]:
+        """The ayah after (surah, ayah) in Mushaf order, None after An-Nas"""
+        ordinal = self.ordinal(surah, ayah) + 1
+        return self.ayah_at(ordinal) if ordinal < self.total_ayahs else None
+
+    def prev_ayah(self, surah: int, ayah: int) -> Optional[Tuple[int, int]]:
+        """The ayah before (surah, ayah) in Mushaf order, None before Al-Fatiha"""
+        ordinal = self.ordinal(surah, ayah) - 1
+        return self.ayah_at(ordinal) if ordinal >= 0 else None
+
+    @staticmethod
+    def prev_surah(surah: int) -> int:
+        """Previous surah number (memorization goes upwards, wraps 1 -> 114)"""
+        return surah - 1 if surah > 1 else 114
+
+    # ---- Range sizes ----
+
+    def valid_range(self, start_surah: int, start_ayah: Optional[int],
+                    end_surah: Optional[int], end_ayah: Optional[int]) -> bool:
+        """Whether an assignment-style range names real surahs and ayahs within them"""
+        for surah, ayah in ((start_surah, start_ayah), (end_surah or start_surah, end_ayah)):
+            if surah is None or not 1 <= surah <= 114:
+                return False
+            if ayah is not None and not 1 <= ayah <= self.ayah_count(surah):
+                return False
+        return True
+
+    def range_ordinals(self, start_surah: int, start_ayah: Optional[int],
+                       end_surah: Optional[int], end_ayah: Optional[int]) -> Tuple[int, int]:
+        """First and last ordinal covered by an assignment-style range.
+
+        Missing ayahs mean whole surahs. Ranges written high-to-low (manzil,
+        e.g. 80 -> 78) cover the whole surahs between them.
+        """
+        end_surah = end_surah or start_surah
+        if end_surah < start_surah:
+            return self.surah_offsets[end_surah], self.surah_offsets[start_surah + 1] - 1
+
+        start_ayah = min(max(start_ayah or 1, 1), self.ayah_count(start_surah))
+        end_ayah = min(end_ayah or self.ayah_count(end_surah), self.ayah_count(end_surah))
+        first = self.ordinal(start_surah, start_ayah)
+        last = self.ordinal(end_surah, end_ayah)
+        return (first, last) if first <= last else (last, first)
+
+    def ayahs_between(self, start_surah: int, start_ayah: int, end_surah: int, end_ayah: int) -> int:
+        """Number of ayahs in an inclusive range"""
+        return self.ordinal(end_surah, end_ayah) - self.ordinal(start_surah, start_ayah) + 1
+
+    def words_between(self, start_surah: int, start_ayah: int, end_surah: int, end_ayah: int) -> int:
+        """Number of words (excluding ayah end markers) in an inclusive range"""
+        return (self.word_prefix[self.ordinal(end_surah, end_ayah) + 1]
+                - self.word_prefix[self.ordinal(start_surah, start_ayah)])
+
+    def lines_between_ordinals(self, first: int, last: int) -> int:
+        """Number of distinct Mushaf lines touched by ayah ordinals first..last"""
+        return self.line_prefix[last + 1] - self.line_prefix[first] + self.ayah_carried_lines[first]
+
+    def workload(self, first: int, last: int) -> dict:
+        """Size of ayah ordinals first..last: ayahs, words, lines and page span"""
+        first_page = self.ayah_first_page[first]
+        last_page = self.ayah_last_page[last]
+        return {
+            "ayahs": last - first + 1,
+            "words": self.word_prefix[last + 1] - self.word_prefix[first],
+            "lines": self.lines_between_ordinals(first, last),
+            "line_equivalent": round(self.line_share_prefix[last + 1] - self.line_share_prefix[first], 2),
+            "first_page": first_page,
+            "last_page": last_page,
+            "pages": last_page - first_page + 1
+        }
+
+    def surah_pages(self, surah: int) -> int:
+        """Number of Mushaf pages a surah spans"""
+        first = self.surah_offsets[surah]
+        last = self.surah_offsets[surah + 1] - 1
+        return self.ayah_last_page[last] - self.ayah_first_page[first] + 1
+
+    # ---- Ayah bitsets ----
+
+    @staticmethod
+    def mask_between(first: int, last: int) -> int:
+        """Bitset with ordinals first..last (inclusive) set"""
+        return ((1 << (last - first + 1)) - 1) << first
+
+    def range_mask(self, start_surah: int, start_ayah: Optional[int],
+                   end_surah: Optional[int], end_ayah: Optional[int]) -> int:
+        """Bitset of the ayahs covered by an assignment-style range"""
+        return self.mask_between(*self.range_ordinals(start_surah, start_ayah, end_surah, end_ayah))
+
+    def mask_ranges(self, mask: int) -> list:
+        """Run-length form of a bitset: [(start_surah, start_ayah, end_surah, end_ayah), ...]"""
+        ranges = []
+        bits = bin(mask)[:1:-1]  # LSB first, so position == ordinal
+        position = bits.find("1")
+        while position != -1:
+            end = bits.find("0", position)
+            end = len(bits) if end == -1 else end
+            ranges.append(self.ayah_at(position) + self.ayah_at(end - 1))
+            position = bits.find("1", end)
+        return ranges
+
+    # ---- Page / juz / hizb ----
+
+    def page_of(self, surah: int, ayah: int) -> int:
+        """Page on which an ayah starts"""
+        return self.ayah_first_page[self.ordinal(surah, ayah)]
+
+    def page_word_bounds(self, page: int) -> Tuple[Tuple[int, int, int], Optional[Tuple[int, int, int]]]:
+        """(surah, ayah, word_index) of the first word on a page and of the first word
+        on the next page (None after the last page). Words on the page sort in between."""
+        following = self.page_first_word[page + 1] if page < TOTAL_PAGES else None
+        return self.page_first_word[page], following
+
+    def word_page(self, surah: int, ayah: int, word_index: int) -> int:
+        """Page on which a word is printed (ayahs can run over a page break)"""
+        ordinal = self.ordinal(surah, ayah)
+        page = self.ayah_first_page[ordinal]
+        while page < self.ayah_last_page[ordinal] and (surah, ayah, word_index) >= self.page_first_word[page + 1]:
+            page += 1
+        return page
+
+    def juz_of(self, surah: int, ayah: int) -> int:
+        return self.ayah_juz[self.ordinal(surah, ayah)]
+
+    def hizb_of(self, surah: int, ayah: int) -> int:
+        return self.ayah_hizb[self.ordinal(surah, ayah)]
+
+    def end_ayah_by_ayahs(self, surah: int, start_ayah: int, count: int) -> int:
+        """Last ayah of a portion of `count` ayahs, kept inside the surah"""
+        return min(start_ayah + max(count, 1) - 1, self.ayah_count(surah))
+
+    def end_ayah_by_pages(self, surah: int, start_ayah: int, pages: int) -> int:
+        """Last ayah of a portion running to the end of the `pages`-th page, kept inside the surah"""
+        target_page = min(self.page_of(surah, start_ayah) + max(pages, 1) - 1, TOTAL_PAGES)
+        last = self.page_last_ayah[target_page]
+        if last >= self.surah_offsets[surah + 1]:
+            return self.ayah_count(surah)
+        return max(self.ayah_number[last], start_ayah)
+
+    def end_ayah_by_lines(self, surah: int, start_ayah: int, lines: int) -> int:
+        """Last ayah of a portion touching at most `lines` Mushaf lines (at least one ayah),
+        kept inside the surah. Binary search over the O(1) line counts."""
+        first = self.ordinal(surah, start_ayah)
+        low, high = first, self.surah_offsets[surah + 1] - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.lines_between_ordinals(first, middle) <= max(lines, 1):
+                low = middle
+            else:
+                high = middle - 1
+        return self.ayah_number[low]
+
+
+def build_quran_index(quran_conn, pages_dir: Path) -> QuranIndex:
+    """Build the navigation tables from an open quran.db connection and the page files"""
+    cursor = quran_conn.execute(
+        "SELECT number, name, englishName, numberOfAyahs FROM surahs ORDER BY number"
+    )
+    surahs = [dict(row) for row in cursor.fetchall()]
+    return QuranIndex(surahs, pages_dir)
@@ -0,0 +1,91 @@
+"""
+Test scoring rubrics.
+
+A rubric decides how many points each test mistake costs and what a test is
+scored out of. Rubrics are versioned per teacher and never edited: changing
+the rules creates the next version, so every stored score can name the exact
+rules it was computed with. A test is taken under the teacher's latest
+version at the time it starts (tests.rubric_id); the built-in Standard rubric
+(teacher_id NULL) is the original fixed rule and the fallback for teachers
+without their own.
+
+Because a mistake's cost depends only on the rubric, whether it was a
+tanbeeh and the error count recorded when it was made, any completed test
+can be re-scored from test_mistakes alone. deduction_sql() expresses the
+rule as one SQL expression so a batch re-score is a single grouped
+INSERT ... SELECT over all tests (see rescore_tests in main.py).
+"""
+
+from typing import Optional, Tuple
+
+
+class ScoringRubric:
+    """
+    Tanbeeh (تنبيه) - student self-corrected after a warning:
+    - Always `tanbeeh_points` regardless of history
+
+    Full mistake - teacher had to correct the student:
+    - `mistake_points` + `repeat_points` per previous error, capped at `max_mistake_points`
+      (Standard: new 1, 1x before 2, 2x before 3, 3x before 4, 4x+ before 5)
+
+    Test score = max(0, max_score - total deductions)
+    """
+
+    def __init__(
+        self,
+        id: Optional[int] = None,
+        teacher_id: Optional[int] = None,
+        version: int = 1,
+        name: str = "Standard",
+        tanbeeh_points: float = 0.5,
+        mistake_points: float = 1.0,
+        repeat_points: float = 1.0,
+        max_mistake_points: float = 5.0,
+        max_score: float = 100.0,
+    ):
+        self.id = id
+        self.teacher_id = teacher_id
+        self.version = version
+        self.name = name
+        self.tanbeeh_points = tanbeeh_points
+        self.mistake_points = mistake_points
+        self.repeat_points = repeat_points
+        self.max_mistake_points = max_mistake_points
+        self.max_score = max_score
+
+    @classmethod
+    def from_row(cls, row) -> "ScoringRubric":
+        return cls(**{key: row[key] for key in row.keys() if key != "created_at"})
+
+    def points(self, previous_error_count: int, is_tanbeeh: bool = False) -> float:
+        """Points to deduct for one mistake"""
+        if is_tanbeeh:
+            return float(self.tanbeeh_points)
+        return float(min(self.mistake_points + self.repeat_points * previous_error_count, self.max_mistake_points))
+
+    def score(self, total_deductions: float) -> float:
+        return max(0, self.max_score - total_deductions)
+
+    def deduction_sql(self, alias: str = "tm") -> Tuple[str, tuple]:
+        """SQL expression (and its parameters) for points() of a test_mistakes row"""
+        return (
+            f"CASE WHEN {alias}.is_tanbeeh THEN ? "
+            f"ELSE MIN(? + ? * COALESCE({alias}.previous_error_count, 0), ?) END",
+            (self.tanbeeh_points, self.mistake_points, self.repeat_points, self.max_mistake_points),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "teacher_id": self.teacher_id,
+            "version": self.version,
+            "name": self.name,
+            "tanbeeh_points": self.tanbeeh_points,
+            "mistake_points": self.mistake_points,
+            "repeat_points": self.repeat_points,
+            "max_mistake_points": self.max_mistake_points,
+            "max_score": self.max_score,
+        }
+
+
+STANDARD_RUBRIC = ScoringRubric()
@@ -0,0 +1,84 @@
+"""
+Thread-safe per-student cache for derived data (coverage bitsets, heatmaps, ...).
+
+Values are built lazily from the database on first read and dropped when the
+student's underlying rows change. Every change bumps the student's generation,
+so a build that raced with a write is returned to its caller but never stored.
+With max_entries, the least recently used students are dropped past that many.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StudentCache(Generic[T]):
+    """Map of student_id -> derived value, invalidated per student"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self._students: "OrderedDict[int, T]" = OrderedDict()
+        self._max_entries = max_entries
+        self._generations = {}
+        self._epoch = 0  # bumped by clear()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, student_id: int, build: Callable[[], T]) -> T:
+        with self._lock:
+            value = self._students.get(student_id)
+            if value is not None:
+                self._students.move_to_end(student_id)
+            generation = (self._epoch, self._generations.get(student_id, 0))
+        if value is not None:
+            return value
+
+        value = build()
+        with self._lock:
+            if (self._epoch, self._generations.get(student_id, 0)) == generation:
+                self._store(student_id, value)
+        return value
+
+    def get_or_build_many(self, student_ids: List[int], build_many: Callable[[List[int]], Dict[int, T]]) -> Dict[int, T]:
+        """Values for several students; the missing ones come from a single build_many(missing) call"""
+        with self._lock:
+            values = {student_id: self._students.get(student_id) for student_id in student_ids}
+            for student_id, value in values.items():
+                if value is not None:
+                    self._students.move_to_end(student_id)
+            missing = [student_id for student_id, value in values.items() if value is None]
+            generations = {student_id: (self._epoch, self._generations.get(student_id, 0)) for student_id in missing}
+        if not missing:
+            return values
+
+        built = build_many(missing)
+        with self._lock:
+            for student_id in missing:
+                if (self._epoch, self._generations.get(student_id, 0)) == generations[student_id]:
+                    self._store(student_id, built[student_id])
+        values.update(built)
+        return values
+
+    def invalidate(self, student_ids: Iterable[int]) -> None:
+        with self._lock:
+            for student_id in student_ids:
+                self._bump(student_id)
+                self._students.pop(student_id, None)
+
+    def clear(self) -> None:
+        """Drop every student (bulk writes where the affected students are unknown)"""
+        with self._lock:
+            self._epoch += 1
+            self._students.clear()
+
+    def _store(self, student_id: int, value: T) -> None:
+        """Cache a value as the most recently used, evicting past max_entries (caller holds the lock)"""
+        self._students[student_id] = value
+        self._students.move_to_end(student_id)
+        if self._max_entries is not None:
+            while len(self._students) > self._max_entries:
+                self._students.popitem(last=False)
+
+    def _bump(self, student_id: int) -> None:
+        """Start a new generation for a student (caller holds the lock)"""
+        self._generations[student_id] = self._generations.get(student_id, 0) + 1
@@ -0,0 +1,88 @@
+"""
+Paging, framing and compression for streamed sync pulls.
+
+A streamed pull is NDJSON: one JSON object per line, each with a "type"
+("class", "mistake", "deleted", and a final "end" carrying the cursor).
+A client only stores the cursor once it has read the "end" line, so a
+dropped connection just repeats the pull.
+
+Rows are read in keyset pages of PAGE_SIZE ordered by change_seq. Each page
+is a short statement that has finished before its rows are sent, so memory
+holds one page and no read lock is kept while a slow client downloads.
+Lines are gathered into chunks of about CHUNK_BYTES and, when the client
+accepts gzip, compressed incrementally with a sync flush per chunk so the
+client can decode as it receives.
+
+Both are negotiated from q-values: a pull streams only if Accept ranks
+application/x-ndjson above zero and no lower than application/json, and is
+compressed only if Accept-Encoding gives gzip (or *) a q above zero.
+"""
+
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+PAGE_SIZE = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def header_qualities(header: str) -> Dict[str, float]:
+    """Lower-cased values of an Accept-style header mapped to their q-values (default 1)"""
+    qualities = {}
+    for entry in header.split(","):
+        value, *params = [part.strip() for part in entry.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = min(max(float(number), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        qualities[value.lower()] = max(quality, qualities.get(value.lower(), 0.0))
+    return qualities
+
+
+def wants_ndjson(accept: str) -> bool:
+    qualities = header_qualities(accept)
+    ndjson = qualities.get("application/x-ndjson", 0.0)
+    return ndjson > 0 and ndjson >= qualities.get("application/json", 0.0)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    qualities = header_qualities(accept_encoding)
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+def change_pages(fetch_page: Callable[[int], List], after: int) -> Iterator[List]:
+    """Pages of fetch_page(after), each starting past the change_seq of the previous page's last row.
+
+    fetch_page must order by change_seq and return at most PAGE_SIZE rows.
+    """
+    while True:
+        page = fetch_page(after)
+        if page:
+            yield page
+        if len(page) < PAGE_SIZE:
+            return
+        after = page[-1]["change_seq"]
+
+
+def ndjson_chunks(records: Iterable[Tuple[str, dict]], compress: bool = False) -> Iterator[bytes]:
+    """Encode (type, payload) records as NDJSON, optionally as one gzip stream"""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits 31: gzip container
+    lines = []
+    size = 0
+    for record_type, payload in records:
+        line = json.dumps({"type": record_type, **payload}, separators=(",", ":")).encode() + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            chunk = b"".join(lines)
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+            lines = []
+            size = 0
+    chunk = b"".join(lines)
+    yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
@@ -0,0 +1,48 @@
+"""
+Fixtures for the API tests: the app against a fresh app.db per test.
+
+Run from quran_backend with `python -m pytest tests` (needs pytest and httpx).
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.app_fixture import create_user, main, use_temp_app_db  # noqa: E402
+
+TEACHER_ID = 1
+
+
+@pytest.fixture
+def db(tmp_path):
+    conn = use_temp_app_db(tmp_path)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def teacher(db):
+    """Authorization headers for a teacher"""
+    return create_user(db, TEACHER_ID, teacher=True)
+
+
+@pytest.fixture
+def add_student(db):
+    """add_student(user_id) creates a student on the teacher's roster; returns their headers"""
+    def add(user_id: int) -> dict:
+        headers = create_user(db, user_id)
+        db.execute("INSERT INTO teacher_student_relationships (teacher_id, student_id) VALUES (?, ?)",
+                   (TEACHER_ID, user_id))
+        db.commit()
+        return headers
+    return add
@@ -0,0 +1,62 @@
+import pytest
+
+from conftest import TEACHER_ID, main
+
+HIFZ = {"type": "hifz", "start_surah": 2, "end_surah": 2, "start_ayah": 1, "end_ayah": 5}
+
+
+def create_class(client, teacher, student_ids, assignments, date="2024-01-01"):
+    return client.post("/api/classes", headers=teacher, json={
+        "date": date, "day": "Monday", "student_ids": student_ids, "assignments": assignments
+    })
+
+
+@pytest.mark.parametrize("bad", [
+    {"start_surah": 115, "end_surah": 115},
+    {"start_surah": 0, "end_surah": 2},
+    {"start_surah": 1, "end_surah": 1, "start_ayah": 1, "end_ayah": 8},
+    {"start_surah": 1, "end_surah": 1, "start_ayah": 0},
+])
+def test_out_of_range_portions_are_rejected_without_holding_the_database(client, db, teacher, add_student, bad):
+    add_student(2)
+    response = create_class(client, teacher, [2], [{**HIFZ, **bad}])
+    assert response.status_code == 400
+    assert db.execute("SELECT COUNT(*) FROM classes").fetchone()[0] == 0
+
+    class_id = create_class(client, teacher, [2], [HIFZ]).json()["id"]
+    assert client.post(f"/api/classes/{class_id}/assignments", headers=teacher,
+                       json=[{**HIFZ, **bad}]).status_code == 400
+    assignment_id = db.execute("SELECT id FROM assignments").fetchone()[0]
+    assert client.patch(f"/api/assignments/{assignment_id}", headers=teacher,
+                        json={**HIFZ, **bad}).status_code == 400
+    push = {"classes": [{"local_id": 1, "date": "2024-01-02", "day": "Tuesday", "assignments": [{**HIFZ, **bad}]}]}
+    assert client.post("/api/sync/push", headers=teacher, json=push).status_code == 400
+
+    # Nothing left a write transaction open
+    response = client.post("/api/mistakes", headers=teacher, json={
+        "student_id": 2, "surah_number": 1, "ayah_number": 1, "word_index": 0, "word_text": "word"
+    })
+    assert response.status_code == 200
+
+
+def test_stored_out_of_range_portions_are_skipped_by_progress(client, db, teacher, add_student):
+    add_student(2)
+    cursor = db.execute(
+        "INSERT INTO classes (date, day, teacher_id, class_type) VALUES ('2024-01-01', 'Monday', ?, 'regular')",
+        (TEACHER_ID,)
+    )
+    class_id = cursor.lastrowid
+    db.execute("INSERT INTO class_students (class_id, student_id) VALUES (?, 2)", (class_id,))
+    db.executemany(
+        "INSERT INTO assignments (class_id, type, start_surah, end_surah, start_ayah, end_ayah) VALUES (?, ?, ?, ?, ?, ?)",
+        [(class_id, "hifz", 0, 0, 1, 5), (class_id, "hifz", 2, 2, 1, 5), (class_id, "sabqi", 115, 115, None, None)]
+    )
+    db.execute("DELETE FROM student_progress")
+    db.commit()
+
+    main.init_app_db()  # backfills the missing progress row
+
+    progress = db.execute("SELECT * FROM student_progress WHERE student_id = 2").fetchone()
+    assert progress["memorized_ayahs"] == 5
+    assert progress["hifz_start_surah"] == 2 and progress["sabqi_start_surah"] is None
+    assert client.get("/api/students/2/suggested-portions", headers=teacher).status_code == 200
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from conftest import TEACHER_ID
+from coverage import CoverageCache, StudentCoverage
+
+
+@pytest.mark.parametrize("query, status", [
+    ("", 200),
+    ("?since=2026-01-01&until=2026-01-31", 200),
+    ("?since=2026-1-5", 400),
+    ("?until=yesterday", 400),
+    ("?since=2026-02-01&until=2026-01-01", 400),
+])
+def test_coverage_window_is_validated(client, teacher, add_student, query, status):
+    add_student(2)
+    assert client.get(f"/api/students/2/coverage{query}", headers=teacher).status_code == status
+
+
+def test_compare_windows_are_validated(client, teacher, add_student):
+    add_student(2)
+    url = "/api/students/2/coverage/compare"
+    assert client.get(f"{url}?right_since=2026-10-01", headers=teacher).status_code == 200
+    response = client.get(f"{url}?left_until=2026-13-01", headers=teacher)
+    assert response.status_code == 400 and "left_since and left_until" in response.json()["detail"]
+    response = client.get(f"{url}?right_since=2026-10-02&right_until=2026-10-01", headers=teacher)
+    assert response.status_code == 400 and response.json()["detail"] == "right_since must not be after right_until"
+
+
+def test_folded_union_matches_every_window():
+    rng = random.Random(7)
+    entries = [(f"2026-01-{rng.randint(1, 28):02d}", rng.choice(("hifz", "sabqi")), 1 << rng.randrange(64))
+               for _ in range(200)]
+    coverage = StudentCoverage()
+    for entry in entries:
+        coverage.add(*entry)
+    windows = [(None, None), ("2026-01-01", None), (None, "2026-01-14"), ("2026-01-10", "2026-01-20"),
+               ("2026-01-15", "2026-01-15"), ("2026-02-01", None)]
+    for since, until in windows:
+        for types in (("hifz",), ("sabqi",), ("hifz", "sabqi", "revision")):
+            expected = 0
+            for date, portion_type, mask in entries:
+                if portion_type in types and (not since or date >= since) and (not until or date <= until):
+                    expected |= mask
+            assert coverage.union(types, since, until) == expected
+
+
+def test_coverage_cache_keeps_the_most_recently_used_students():
+    cache = CoverageCache(max_entries=2)
+    built = []
+
+    def build(student_id):
+        built.append(student_id)
+        return StudentCoverage()
+
+    for student_id in (1, 2, 1, 3, 1, 2):
+        cache.get_or_build(student_id, lambda: build(student_id))
+    assert built == [1, 2, 3, 2]  # 2 was evicted by 3; 1 stayed warm
+
+
+def test_stored_out_of_range_portions_are_skipped_by_coverage(client, db, teacher, add_student):
+    add_student(2)
+    class_id = db.execute(
+        "INSERT INTO classes (date, day, teacher_id, class_type) VALUES ('2024-01-01', 'Monday', ?, 'regular')",
+        (TEACHER_ID,)
+    ).lastrowid
+    db.execute("INSERT INTO class_students (class_id, student_id) VALUES (?, 2)", (class_id,))
+    db.executemany(
+        "INSERT INTO assignments (class_id, type, start_surah, end_surah, start_ayah, end_ayah) VALUES (?, ?, ?, ?, ?, ?)",
+        [(class_id, "hifz", 115, 115, None, None), (class_id, "hifz", 1, 1, 1, 7)]
+    )
+    db.commit()
+
+    response = client.get("/api/students/2/coverage", headers=teacher)
+    assert response.status_code == 200
+    assert response.json()["data"]["portions"]["hifz"]["ayahs"] == 7
@@ -0,0 +1,51 @@
+from conftest import main
+from heatmap import RosterHeatmapCache
+
+
+def mark(client, headers, student_id, surah, ayah, word_index, times=1):
+    for _ in range(times):
+        response = client.post("/api/mistakes", headers=headers, json={
+            "student_id": student_id, "surah_number": surah, "ayah_number": ayah,
+            "word_index": word_index, "word_text": "word"
+        })
+        assert response.status_code == 200
+
+
+def test_roster_heatmap_loads_uncached_students_together(client, teacher, add_student, monkeypatch):
+    for student_id in (2, 3, 4, 5):
+        add_student(student_id)
+    mark(client, teacher, 2, 1, 1, 0, times=2)
+    mark(client, teacher, 3, 1, 1, 0)
+    mark(client, teacher, 3, 2, 255, 1, times=3)
+    mark(client, teacher, 4, 114, 6, 0)
+    main.clear_student_caches()
+
+    loads = []
+    load_student_heatmaps = main.load_student_heatmaps
+    monkeypatch.setattr(main, "load_student_heatmaps", lambda ids: loads.append(sorted(ids)) or load_student_heatmaps(ids))
+    roster = client.get("/api/students/heatmap", headers=teacher).json()["data"]
+
+    assert loads == [[2, 3, 4, 5]]
+    totals = {student["id"]: student["total_errors"] for student in roster["students"]}
+    assert totals == {2: 2, 3: 4, 4: 1, 5: 0}
+    for student_id in totals:
+        heatmap = client.get(f"/api/students/{student_id}/heatmap", headers=teacher).json()["data"]
+        assert heatmap["total_errors"] == totals[student_id]
+    assert loads == [[2, 3, 4, 5]]  # the per-student reads above were served from the cache
+    assert roster["weak_spots"]["words"][0]["students"] == 2
+
+    # A change to one student reloads only that student
+    mark(client, teacher, 5, 1, 1, 0)
+    roster = client.get("/api/students/heatmap", headers=teacher).json()["data"]
+    assert loads == [[2, 3, 4, 5], [5]]
+    assert roster["weak_spots"]["words"][0]["students"] == 3
+
+
+def test_roster_heatmap_cache_is_bounded():
+    cache = RosterHeatmapCache(max_entries=2)
+    first = cache.get_or_build(1, [])
+    cache.get_or_build(2, [])
+    assert cache.get_or_build(1, []) is first  # 1 is now the most recently used
+    cache.get_or_build(3, [])
+    assert cache.get_or_build(1, []) is first
+    assert len(cache._rosters) == 2 and 2 not in cache._rosters
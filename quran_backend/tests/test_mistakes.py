@@ -0,0 +1,84 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import TEACHER_ID, main
+
+WORD = {"surah_number": 2, "ayah_number": 255, "word_index": 3, "word_text": "word"}
+
+
+def test_parallel_marks_of_one_word_all_count(client, db, teacher, add_student):
+    """Concurrent taps on the same word end up as one mistake whose count and occurrences match the taps"""
+    student_id = 2
+    add_student(student_id)
+    cursor = db.execute(
+        "INSERT INTO classes (date, day, teacher_id, class_type) VALUES ('2024-01-01', 'Monday', ?, 'regular')",
+        (TEACHER_ID,)
+    )
+    class_id = cursor.lastrowid
+    db.commit()
+    taps = 40
+
+    def tap(_):
+        return client.post("/api/mistakes", headers=teacher,
+                           json={**WORD, "student_id": student_id, "class_id": class_id})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(tap, range(taps)))
+
+    assert [response.status_code for response in responses] == [200] * taps
+    assert sorted(response.json()["error_count"] for response in responses) == list(range(1, taps + 1))
+    rows = db.execute("SELECT id, error_count FROM mistakes WHERE student_id = ?", (student_id,)).fetchall()
+    assert len(rows) == 1
+    assert rows[0]["error_count"] == taps
+    cursor = db.execute("SELECT COUNT(*) FROM mistake_occurrences WHERE mistake_id = ?", (rows[0]["id"],))
+    assert cursor.fetchone()[0] == taps
+
+
+def test_character_and_whole_word_marks_stay_separate(client, db, add_student):
+    headers = add_student(2)
+    for char_index in (None, 1, None, 1, 2):
+        response = client.post("/api/mistakes", headers=headers, json={**WORD, "char_index": char_index})
+        assert response.status_code == 200
+
+    cursor = db.execute("SELECT char_index, error_count FROM mistakes ORDER BY char_index")
+    assert [tuple(row) for row in cursor.fetchall()] == [(None, 2), (1, 2), (2, 1)]
+
+
+def test_migration_merges_duplicate_words_including_unowned_rows(tmp_path):
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE mistakes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            surah_number INTEGER NOT NULL,
+            ayah_number INTEGER NOT NULL,
+            word_index INTEGER NOT NULL,
+            word_text TEXT NOT NULL,
+            char_index INTEGER,
+            error_count INTEGER DEFAULT 1,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            device_id TEXT,
+            UNIQUE(surah_number, ayah_number, word_index, char_index)
+        );
+        ALTER TABLE mistakes ADD COLUMN student_id INTEGER;
+        CREATE TABLE mistake_occurrences (id INTEGER PRIMARY KEY AUTOINCREMENT, mistake_id INTEGER, class_id INTEGER);
+        CREATE TABLE test_mistakes (id INTEGER PRIMARY KEY AUTOINCREMENT, mistake_id INTEGER);
+    """)
+    # NULL char_index never collided under the old key, so whole-word marks could repeat
+    conn.executemany(
+        "INSERT INTO mistakes (id, student_id, surah_number, ayah_number, word_index, word_text, error_count) "
+        "VALUES (?, ?, 1, 1, 0, 'word', ?)",
+        [(1, 2, 2), (2, 2, 3), (3, None, 1), (4, None, 4), (5, 3, 1)]
+    )
+    conn.executemany("INSERT INTO mistake_occurrences (mistake_id, class_id) VALUES (?, 1)", [(2,), (4,)])
+    conn.execute("INSERT INTO test_mistakes (mistake_id) VALUES (2)")
+    conn.commit()
+
+    main.migrate_mistakes_unique_key(conn)
+
+    cursor = conn.execute("SELECT id, student_id, error_count FROM mistakes ORDER BY id")
+    assert [tuple(row) for row in cursor.fetchall()] == [(1, 2, 5), (3, None, 5), (5, 3, 1)]
+    cursor = conn.execute("SELECT mistake_id FROM mistake_occurrences ORDER BY id")
+    assert [row[0] for row in cursor.fetchall()] == [1, 3]
+    assert conn.execute("SELECT mistake_id FROM test_mistakes").fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,178 @@
+import json
+
+import pytest
+
+from conftest import create_user, main
+from sync_stream import accepts_gzip, wants_ndjson
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/x-ndjson", True),
+    ("application/x-ndjson, application/json;q=0.5", True),
+    ("Application/X-NDJSON; q=1", True),
+    ("application/json, application/x-ndjson;q=0.1", False),
+    ("application/x-ndjson;q=0", False),
+    ("*/*", False),
+    ("", False),
+])
+def test_wants_ndjson(accept, expected):
+    assert wants_ndjson(accept) is expected
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", True),
+    ("br, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0.000", False),
+    ("*", True),
+    ("*, gzip;q=0", False),
+    ("identity", False),
+    ("gzip;q=oops", False),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    assert accepts_gzip(accept_encoding) is expected
+
+
+def pull(client, headers, accept, accept_encoding):
+    return client.post("/api/sync/pull", json={}, headers={
+        **headers, "Accept": accept, "Accept-Encoding": accept_encoding
+    })
+
+
+def test_pull_negotiates_stream_and_compression(client, add_student):
+    headers = add_student(2)
+    client.post("/api/mistakes", headers=headers,
+                json={"surah_number": 1, "ayah_number": 1, "word_index": 0, "word_text": "word"})
+
+    response = pull(client, headers, "application/x-ndjson", "gzip;q=0")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in response.headers
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["mistake", "end"]
+
+    response = pull(client, headers, "application/x-ndjson", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    compressed = [json.loads(line) for line in response.text.splitlines()]  # decoded by the client
+    assert compressed[0] == records[0] and compressed[1]["cursor"] == records[1]["cursor"]
+
+    response = pull(client, headers, "application/x-ndjson;q=0, application/json", "gzip")
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()["mistakes"]) == 1
+
+
+def test_cursors_older_than_pruned_tombstones_get_a_full_sync(client, db, add_student):
+    headers = add_student(2)
+    word = {"surah_number": 1, "ayah_number": 1, "word_text": "word"}
+    for word_index in (0, 1, 2):
+        client.post("/api/mistakes", headers=headers, json={**word, "word_index": word_index})
+    mistake_ids = [row[0] for row in db.execute("SELECT id FROM mistakes ORDER BY word_index")]
+    old_cursor = client.post("/api/sync/pull", json={}, headers=headers).json()["cursor"]
+    old_since = client.get("/api/mistakes", headers=headers).json()["cursor"]
+
+    client.delete(f"/api/mistakes/{mistake_ids[0]}", headers=headers)
+    db.execute("UPDATE mistake_tombstones SET deleted_at = datetime('now', '-91 days')")
+    db.commit()
+    recent_cursor = client.post("/api/sync/pull", json={}, headers=headers).json()["cursor"]
+    client.delete(f"/api/mistakes/{mistake_ids[1]}", headers=headers)
+
+    main.prune_tombstones(db)
+    assert [row[0] for row in db.execute("SELECT mistake_id FROM mistake_tombstones")] == [mistake_ids[1]]
+
+    # The first deletion can no longer be reported: start over
+    response = client.post("/api/sync/pull", json={"last_sync_at": old_cursor}, headers=headers).json()
+    assert response["full"] is True and "deleted" not in response
+    assert [mistake["id"] for mistake in response["mistakes"]] == [mistake_ids[2]]
+    response = client.get(f"/api/mistakes?since={old_since}", headers=headers).json()
+    assert "deleted" not in response and [mistake["id"] for mistake in response["data"]] == [mistake_ids[2]]
+
+    # A cursor taken after the pruned deletion is still incremental
+    response = client.post("/api/sync/pull", json={"last_sync_at": recent_cursor}, headers=headers).json()
+    assert response["full"] is False
+    assert response["deleted"]["mistakes"] == [mistake_ids[1]] and response["mistakes"] == []
+
+
+HIFZ = {"type": "hifz", "start_surah": 2, "end_surah": 2, "start_ayah": 1, "end_ayah": 5}
+
+
+def push(client, headers, classes=(), mistakes=()):
+    response = client.post("/api/sync/push", headers=headers, json={"classes": list(classes), "mistakes": list(mistakes)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_new_classes_on_one_date_and_day_share_a_server_id(client, db, teacher, add_student):
+    add_student(2)
+    existing = client.post("/api/classes", headers=teacher, json={
+        "date": "2024-01-01", "day": "Monday", "student_ids": [2], "assignments": [HIFZ]
+    }).json()["id"]
+    monday = {"date": "2024-01-01", "day": "Monday", "assignments": [HIFZ]}
+    tuesday = {"date": "2024-01-02", "day": "Tuesday", "assignments": [HIFZ]}
+
+    mapping = push(client, teacher, classes=[
+        {**monday, "local_id": 1}, {**tuesday, "local_id": 2}, {**monday, "local_id": 3}, {**tuesday, "local_id": 4}
+    ])["class_id_mapping"]
+
+    created = db.execute("SELECT id FROM classes WHERE date = '2024-01-02'").fetchall()
+    assert len(created) == 1
+    assert mapping == {"1": existing, "2": created[0][0], "3": existing, "4": created[0][0]}
+
+
+def test_new_mistakes_are_summed_and_merged_into_the_existing_word(client, db, add_student):
+    student = add_student(2)
+    word = {"surah_number": 1, "ayah_number": 2, "word_index": 3, "word_text": "word"}
+
+    mapping = push(client, student, mistakes=[
+        {**word, "local_id": 1, "error_count": 1}, {**word, "local_id": 2, "error_count": 2},
+        {**word, "word_index": 4, "local_id": 3}
+    ])["mistake_id_mapping"]
+    rows = db.execute("SELECT id, word_index, error_count FROM mistakes ORDER BY word_index").fetchall()
+    assert [(row["word_index"], row["error_count"]) for row in rows] == [(3, 3), (4, 1)]
+    assert mapping == {"1": rows[0]["id"], "2": rows[0]["id"], "3": rows[1]["id"]}
+
+    mapping = push(client, student, mistakes=[{**word, "local_id": 4, "error_count": 2}])["mistake_id_mapping"]
+    assert mapping == {"4": rows[0]["id"]}
+    assert db.execute("SELECT error_count FROM mistakes WHERE id = ?", (rows[0]["id"],)).fetchone()[0] == 5
+
+
+def test_server_ids_outside_the_scope_are_ignored(client, db, teacher, add_student):
+    student = add_student(2)
+    other_student = add_student(3)
+    other_teacher = create_user(db, 4, teacher=True)
+    class_id = client.post("/api/classes", headers=teacher, json={
+        "date": "2024-01-01", "day": "Monday", "student_ids": [2], "assignments": [HIFZ]
+    }).json()["id"]
+    word = {"surah_number": 1, "ayah_number": 2, "word_index": 3, "word_text": "word"}
+    push(client, other_student, mistakes=[{**word, "local_id": 1}])
+    mistake_id = db.execute("SELECT id FROM mistakes").fetchone()[0]
+
+    push(client, student, mistakes=[
+        {**word, "server_id": mistake_id, "is_deleted": True},
+        {**word, "server_id": mistake_id, "error_count": 10}
+    ])
+    push(client, other_teacher, classes=[
+        {"server_id": class_id, "date": "2024-01-01", "day": "Monday", "is_deleted": True},
+        {"server_id": class_id, "date": "2024-02-01", "day": "Thursday", "assignments": [HIFZ]}
+    ])
+
+    assert db.execute("SELECT error_count FROM mistakes WHERE id = ?", (mistake_id,)).fetchone()[0] == 1
+    assert db.execute("SELECT date FROM classes WHERE id = ?", (class_id,)).fetchone()[0] == "2024-01-01"
+    assert db.execute("SELECT COUNT(*) FROM assignments WHERE class_id = ?", (class_id,)).fetchone()[0] == 1
+
+
+def test_updated_and_deleted_classes_refresh_progress(client, db, teacher, add_student):
+    add_student(2)
+    class_id = client.post("/api/classes", headers=teacher, json={
+        "date": "2024-01-01", "day": "Monday", "student_ids": [2], "assignments": [HIFZ]
+    }).json()["id"]
+
+    def memorized():
+        return db.execute("SELECT memorized_ayahs FROM student_progress WHERE student_id = 2").fetchone()[0]
+
+    assert memorized() == 5
+
+    monday = {"server_id": class_id, "date": "2024-01-01", "day": "Monday"}
+    push(client, teacher, classes=[{**monday, "assignments": [{**HIFZ, "end_ayah": 10}]}])
+    assert memorized() == 10
+
+    push(client, teacher, classes=[{**monday, "is_deleted": True}])
+    assert not memorized()
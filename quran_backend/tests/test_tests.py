@@ -0,0 +1,42 @@
+from conftest import TEACHER_ID, main
+
+
+def create_completed_test(db, student_id: int, date: str) -> int:
+    class_id = db.execute(
+        "INSERT INTO classes (date, day, teacher_id, class_type) VALUES (?, 'Monday', ?, 'test')",
+        (date, TEACHER_ID)
+    ).lastrowid
+    db.execute("INSERT INTO class_students (class_id, student_id) VALUES (?, ?)", (class_id, student_id))
+    test_id = db.execute(
+        "INSERT INTO tests (class_id, student_id, status) VALUES (?, ?, 'completed')", (class_id, student_id)
+    ).lastrowid
+    db.commit()
+    return test_id
+
+
+def test_completed_tests_cache_keeps_the_most_recently_read(client, db, teacher, add_student, monkeypatch):
+    monkeypatch.setattr(main, "MAX_COMPLETED_TESTS", 2)
+    add_student(2)
+    first, second, third = (create_completed_test(db, 2, f"2024-01-0{day}") for day in (1, 2, 3))
+
+    for test_id in (first, second, first, third):
+        assert client.get(f"/api/tests/{test_id}", headers=teacher).status_code == 200
+    assert list(main.completed_tests) == [first, third]
+
+
+def test_tanbeeh_on_a_known_mistake_refreshes_stats(client, teacher, add_student):
+    student = add_student(2)
+    test_id = client.post("/api/classes", headers=teacher, json={
+        "date": "2024-01-01", "day": "Monday", "student_ids": [2], "assignments": [], "class_type": "test"
+    }).json()["test_id"]
+    assert client.patch(f"/api/tests/{test_id}/start", headers=teacher).status_code == 200
+    question_id = client.post(f"/api/tests/{test_id}/questions/start", headers=teacher,
+                              json={"start_surah": 1, "start_ayah": 1}).json()["id"]
+    mistake = {"question_id": question_id, "surah_number": 1, "ayah_number": 2, "word_index": 0, "word_text": "word"}
+
+    assert client.post(f"/api/tests/{test_id}/mistakes", headers=teacher, json=mistake).status_code == 200
+    assert client.get("/api/stats", headers=student).json()["total_occurrences"] == 1
+
+    response = client.post(f"/api/tests/{test_id}/mistakes", headers=teacher, json={**mistake, "is_tanbeeh": True})
+    assert response.status_code == 200 and response.json()["mistake_id"] is not None
+    assert client.get("/api/stats", headers=student).json()["total_occurrences"] == 2
@@ -0,0 +1,83 @@
+"""
+Dense time series of mistakes for progress charts.
+
+The daily rollup tables (mistake_daily_rollups, roster_daily_rollups; see
+init_app_db) hold one row per student or teacher per day with mistakes.
+Weekly and monthly charts are derived here by summing the days of each
+bucket, so a chart costs one range scan over at most the days it shows,
+however long the history behind it.
+
+Buckets are named by their first day: weeks start on Monday, months on the
+1st. Days are UTC calendar days (occurred_at is stored as UTC).
+"""
+
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+BUCKETS = ("day", "week", "month")
+DEFAULT_BUCKET_COUNT = {"day": 30, "week": 12, "month": 12}
+MAX_BUCKETS = 400
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def default_start(end: date, bucket: str) -> date:
+    """First day of the bucket that makes the default chart length end at `end`"""
+    start = bucket_start(end, bucket)
+    for _ in range(DEFAULT_BUCKET_COUNT[bucket] - 1):
+        start = bucket_start(start - timedelta(days=1), bucket)
+    return start
+
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    """How many buckets bucket_starts(start, end, bucket) returns, without building them"""
+    if bucket == "week":
+        return (bucket_start(end, bucket) - bucket_start(start, bucket)).days // 7 + 1
+    if bucket == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def bucket_starts(start: date, end: date, bucket: str) -> List[date]:
+    """Every bucket from the one holding `start` to the one holding `end`.
+
+    Never steps past the last bucket, so an `end` in year 9999 cannot overflow.
+    """
+    starts = [bucket_start(start, bucket)]
+    for _ in range(bucket_count(start, end, bucket) - 1):
+        starts.append(next_bucket(starts[-1], bucket))
+    return starts
+
+
+def dense_series(rows: Iterable[Tuple[str, int, int, int]], starts: List[date], bucket: str) -> List[dict]:
+    """Sum (day, occurrences, new, repeated) rows into buckets, zero-filling empty ones"""
+    totals = {start: [0, 0, 0] for start in starts}
+    for day, occurrences, new_mistakes, repeated_mistakes in rows:
+        counts = totals.get(bucket_start(date.fromisoformat(day), bucket))
+        if counts is not None:
+            counts[0] += occurrences
+            counts[1] += new_mistakes
+            counts[2] += repeated_mistakes
+    return [
+        {
+            "period": start.isoformat(),
+            "occurrences": totals[start][0],
+            "new_mistakes": totals[start][1],
+            "repeated_mistakes": totals[start][2],
+        }
+        for start in starts
+    ]
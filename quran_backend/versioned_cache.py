@@ -0,0 +1,92 @@
+"""
+Per-user data versions and a cache of values derived from several users' data.
+
+Every write to a user's classes, mistakes or roster bumps that user's version
+(after the commit). A cached value records which users it was computed from
+and the version clock when the computation started; it is served from memory
+until any of those users is bumped again. Comparing against the start of the
+computation means a write that lands while a value is being computed always
+makes that value stale.
+
+Recomputation is single-flight: while one request recomputes a stale entry,
+concurrent requests for the same key wait for its result instead of
+running the same queries.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Iterable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class DataVersions:
+    """user_id -> clock value of the user's last change"""
+
+    def __init__(self):
+        self._clock = 0
+        self._changed: Dict[int, int] = {}
+        self._all_changed = 0  # clock of the last bump_all()
+        self._lock = threading.Lock()
+
+    def now(self) -> int:
+        with self._lock:
+            return self._clock
+
+    def bump(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._clock += 1
+            for user_id in user_ids:
+                self._changed[user_id] = self._clock
+
+    def bump_all(self) -> None:
+        """Every user changed (bulk writes where the affected users are unknown)"""
+        with self._lock:
+            self._clock += 1
+            self._all_changed = self._clock
+
+    def changed_since(self, user_ids: Iterable[int], clock: int) -> bool:
+        with self._lock:
+            if self._all_changed > clock:
+                return True
+            return any(self._changed.get(user_id, 0) > clock for user_id in user_ids)
+
+
+class VersionedCache(Generic[T]):
+    """key -> value computed from the data of a set of users.
+
+    compute() returns (user_ids the value depends on, value).
+    """
+
+    def __init__(self, versions: DataVersions):
+        self._versions = versions
+        self._entries: Dict[Hashable, Tuple[int, tuple, T]] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Tuple[Iterable[int], T]]) -> T:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._versions.changed_since(entry[1], entry[0]):
+                return entry[2]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+
+        if not leader:
+            return flight.result()
+
+        try:
+            started = self._versions.now()
+            user_ids, value = compute()
+            with self._lock:
+                self._entries[key] = (started, tuple(user_ids), value)
+            flight.set_result(value)
+            return value
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]